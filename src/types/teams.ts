@@ -365,11 +365,11 @@ export interface FollowUpStep {
 export interface FollowUpMessage {
   id: string;
   user_id: string;
-  sequence_id: string;
+  sequence_id: string | null;
   contact_id: string;
   call_id: string | null;
   channel: FollowUpChannel;
-  status: "pending" | "sent" | "failed" | "cancelled";
+  status: "pending" | "sending" | "sent" | "failed" | "cancelled";
   subject: string | null;
   body: string;
   send_at: string;
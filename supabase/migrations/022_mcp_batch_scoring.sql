@@ -0,0 +1,43 @@
+-- ===========================================
+-- MCP Batch Lead Scoring
+-- ===========================================
+-- Set-based helpers for the MCP server's score_leads_batch tool.
+-- Without them the server falls back to paged reads and grouped updates.
+
+-- Activity count per contact in one grouped query
+CREATE OR REPLACE FUNCTION public.mcp_activity_counts(
+  p_user_id UUID,
+  p_contact_ids UUID[] DEFAULT NULL
+)
+RETURNS TABLE (contact_id UUID, activity_count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+  SELECT a.contact_id, count(*)::BIGINT
+  FROM public.activities a
+  WHERE a.user_id = p_user_id
+    AND (p_contact_ids IS NULL OR a.contact_id = ANY(p_contact_ids))
+  GROUP BY a.contact_id;
+$$;
+
+-- Bulk lead_score write from parallel id/score arrays (updates only, never inserts)
+CREATE OR REPLACE FUNCTION public.mcp_set_lead_scores(
+  p_user_id UUID,
+  p_contact_ids UUID[],
+  p_scores INTEGER[]
+)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  WITH updated AS (
+    UPDATE public.contacts c
+    SET lead_score = s.score
+    FROM unnest(p_contact_ids, p_scores) AS s(id, score)
+    WHERE c.id = s.id AND c.user_id = p_user_id
+    RETURNING 1
+  )
+  SELECT count(*)::INTEGER FROM updated;
+$$;
+
+-- Permissions
+GRANT EXECUTE ON FUNCTION public.mcp_activity_counts(UUID, UUID[]) TO service_role;
+GRANT EXECUTE ON FUNCTION public.mcp_set_lead_scores(UUID, UUID[], INTEGER[]) TO service_role;
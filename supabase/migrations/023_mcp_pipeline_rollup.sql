@@ -0,0 +1,39 @@
+-- ===========================================
+-- MCP Pipeline Rollup (aggregation push-down)
+-- ===========================================
+-- Grouped contact counts and deal value for the MCP server's get_pipeline
+-- and get_analytics tools. Returns a few dozen aggregate rows instead of
+-- every contact; the user_id predicate is served by idx_contacts_user_stage.
+-- Without it the server falls back to streaming contacts.
+
+CREATE OR REPLACE FUNCTION public.mcp_contact_rollup(p_user_id UUID)
+RETURNS TABLE (
+  deal_stage TEXT,
+  source TEXT,
+  score_bucket TEXT,
+  enriched BOOLEAN,
+  contacts BIGINT,
+  total_value NUMERIC
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    c.deal_stage,
+    c.source,
+    CASE
+      WHEN coalesce(c.lead_score, 0) <= 20 THEN '0-20'
+      WHEN c.lead_score <= 40 THEN '21-40'
+      WHEN c.lead_score <= 60 THEN '41-60'
+      WHEN c.lead_score <= 80 THEN '61-80'
+      ELSE '81-100'
+    END AS score_bucket,
+    coalesce(c.enrichment_status = 'enriched', false) AS enriched,
+    count(*)::BIGINT AS contacts,
+    coalesce(sum(c.deal_value), 0) AS total_value
+  FROM public.contacts c
+  WHERE c.user_id = p_user_id
+  GROUP BY 1, 2, 3, 4;
+$$;
+
+-- Permissions
+GRANT EXECUTE ON FUNCTION public.mcp_contact_rollup(UUID) TO service_role;
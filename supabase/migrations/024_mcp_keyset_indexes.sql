@@ -0,0 +1,20 @@
+-- ===========================================
+-- MCP Keyset Pagination Indexes
+-- ===========================================
+-- list_contacts pages with `ORDER BY <sort> DESC NULLS LAST, id DESC` and a
+-- `(sort, id) < (last sort, last id)` cursor predicate; get_contact pages a
+-- contact's activities the same way on created_at. These indexes match
+-- that order so every page is an index range scan of `limit` rows, however
+-- deep the cursor is.
+
+CREATE INDEX IF NOT EXISTS idx_contacts_user_created_keyset
+  ON public.contacts(user_id, created_at DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS idx_contacts_user_score_keyset
+  ON public.contacts(user_id, lead_score DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS idx_contacts_user_value_keyset
+  ON public.contacts(user_id, deal_value DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS idx_contacts_user_contacted_keyset
+  ON public.contacts(user_id, last_contacted_at DESC NULLS LAST, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_activities_contact_keyset
+  ON public.activities(contact_id, created_at DESC NULLS LAST, id DESC);
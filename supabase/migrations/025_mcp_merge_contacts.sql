@@ -0,0 +1,49 @@
+-- ===========================================
+-- MCP Contact Merge
+-- ===========================================
+-- Used by the MCP server's merge_contacts tool once it has written the merged
+-- fields onto the primary contact: re-points everything that references the
+-- duplicates (one set-based UPDATE per table) and deletes them, in a single
+-- transaction. Without it the server issues the same statements one by one.
+
+CREATE OR REPLACE FUNCTION public.mcp_merge_contacts(
+  p_user_id UUID,
+  p_primary_id UUID,
+  p_duplicate_ids UUID[]
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_ids UUID[];
+  v_moved INTEGER;
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM public.contacts WHERE id = p_primary_id AND user_id = p_user_id
+  ) THEN
+    RAISE EXCEPTION 'contact % not found', p_primary_id USING ERRCODE = 'P0002';
+  END IF;
+
+  -- Only the caller's own contacts, never the primary itself
+  SELECT coalesce(array_agg(id), '{}') INTO v_ids
+  FROM public.contacts
+  WHERE user_id = p_user_id AND id = ANY(p_duplicate_ids) AND id <> p_primary_id;
+
+  UPDATE public.activities SET contact_id = p_primary_id
+  WHERE user_id = p_user_id AND contact_id = ANY(v_ids);
+  GET DIAGNOSTICS v_moved = ROW_COUNT;
+
+  UPDATE public.follow_up_messages SET contact_id = p_primary_id
+  WHERE user_id = p_user_id AND contact_id = ANY(v_ids);
+  UPDATE public.deal_stage_history SET contact_id = p_primary_id
+  WHERE user_id = p_user_id AND contact_id = ANY(v_ids);
+  UPDATE public.notifications SET contact_id = p_primary_id
+  WHERE user_id = p_user_id AND contact_id = ANY(v_ids);
+
+  DELETE FROM public.contacts WHERE id = ANY(v_ids);
+  RETURN v_moved;
+END;
+$$;
+
+-- Permissions
+GRANT EXECUTE ON FUNCTION public.mcp_merge_contacts(UUID, UUID, UUID[]) TO service_role;
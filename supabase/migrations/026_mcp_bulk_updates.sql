@@ -0,0 +1,96 @@
+-- ===========================================
+-- MCP Bulk Contact Updates
+-- ===========================================
+-- Set-based writes for the MCP server's bulk_update_deal_stage and
+-- bulk_update_contacts tools. Each call is one statement that also hands
+-- back the pre-update values the server needs (activity titles, aggregate
+-- deltas), so no separate read is needed. Without these functions the
+-- server reads the old rows first, then issues grouped updates.
+
+-- Move contacts to a stage. Returns every owned contact among p_contact_ids
+-- with its previous stage and dashboard columns; `changed` is false for
+-- contacts that were already in p_new_stage (those are left untouched).
+CREATE OR REPLACE FUNCTION public.mcp_set_deal_stage(
+  p_user_id UUID,
+  p_contact_ids UUID[],
+  p_new_stage TEXT
+)
+RETURNS TABLE (
+  id UUID,
+  first_name TEXT,
+  last_name TEXT,
+  old_stage TEXT,
+  deal_value NUMERIC,
+  lead_score INTEGER,
+  source TEXT,
+  enrichment_status TEXT,
+  changed BOOLEAN
+)
+LANGUAGE sql
+AS $$
+  WITH target AS (
+    -- Every CTE sees the same snapshot, so these are the pre-update values
+    SELECT c.id, c.first_name, c.last_name, c.deal_stage, c.deal_value,
+           c.lead_score, c.source, c.enrichment_status
+    FROM public.contacts c
+    WHERE c.user_id = p_user_id AND c.id = ANY(p_contact_ids)
+    FOR UPDATE
+  ),
+  moved AS (
+    UPDATE public.contacts c
+    SET deal_stage = p_new_stage
+    FROM target t
+    WHERE c.id = t.id AND t.deal_stage IS DISTINCT FROM p_new_stage
+    RETURNING c.id
+  )
+  SELECT t.id, t.first_name, t.last_name, t.deal_stage, t.deal_value,
+         t.lead_score, t.source, t.enrichment_status,
+         EXISTS (SELECT 1 FROM moved m WHERE m.id = t.id)
+  FROM target t;
+$$;
+
+-- Apply per-contact patches: p_updates is a JSON array of objects with an
+-- "id" plus the columns to change (columns a patch omits keep their value).
+-- Returns each updated row and the dashboard columns it had before.
+CREATE OR REPLACE FUNCTION public.mcp_update_contacts(
+  p_user_id UUID,
+  p_updates JSONB
+)
+RETURNS TABLE (contact JSONB, old JSONB)
+LANGUAGE sql
+AS $$
+  WITH patch AS (
+    SELECT (e.item ->> 'id')::UUID AS id, e.item - 'id' - 'user_id' AS data
+    FROM jsonb_array_elements(p_updates) AS e(item)
+  ),
+  target AS (
+    SELECT c.*, p.data
+    FROM public.contacts c
+    JOIN patch p ON p.id = c.id
+    WHERE c.user_id = p_user_id
+    FOR UPDATE OF c
+  )
+  UPDATE public.contacts c
+  SET (first_name, last_name, email, phone, company, title, deal_stage, deal_value,
+       probability, lead_score, source, do_not_call, do_not_email, last_contacted_at,
+       next_follow_up_at, expected_close_date, tags, custom_fields, notes,
+       enrichment_data, enrichment_status, enriched_at, external_id, external_provider) =
+    (SELECT r.first_name, r.last_name, r.email, r.phone, r.company, r.title, r.deal_stage,
+            r.deal_value, r.probability, r.lead_score, r.source, r.do_not_call,
+            r.do_not_email, r.last_contacted_at, r.next_follow_up_at, r.expected_close_date,
+            r.tags, r.custom_fields, r.notes, r.enrichment_data, r.enrichment_status,
+            r.enriched_at, r.external_id, r.external_provider
+     FROM jsonb_populate_record(c, t.data) r)
+  FROM target t
+  WHERE c.id = t.id
+  RETURNING to_jsonb(c.*),
+    jsonb_build_object(
+      'id', t.id, 'deal_stage', t.deal_stage, 'deal_value', t.deal_value,
+      'lead_score', t.lead_score, 'source', t.source,
+      'enrichment_status', t.enrichment_status
+    );
+$$;
+
+-- Permissions
+GRANT EXECUTE ON FUNCTION public.mcp_set_deal_stage(UUID, UUID[], TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.mcp_update_contacts(UUID, JSONB) TO service_role;
@@ -0,0 +1,118 @@
+-- ===========================================
+-- MCP Follow-Up Dispatch
+-- ===========================================
+-- Claim/finish protocol for the MCP server's follow-up dispatcher
+-- (tools/quotahit_dispatch.py) and its send_followup tool. A dispatcher
+-- claims due messages by flipping them to 'sending' under its claim id,
+-- sends them, then writes every outcome back in one call. Rows locked by
+-- another dispatcher are skipped, so several can run side by side.
+
+-- Claim state. attempts counts claims, so a message whose dispatcher died
+-- mid-send is retried only up to the dispatcher's max_attempts.
+ALTER TABLE public.follow_up_messages
+  ADD COLUMN IF NOT EXISTS claim_id UUID,
+  ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE public.follow_up_messages
+  DROP CONSTRAINT IF EXISTS follow_up_messages_status_check;
+ALTER TABLE public.follow_up_messages
+  ADD CONSTRAINT follow_up_messages_status_check
+  CHECK (status IN ('pending', 'sending', 'sent', 'failed', 'cancelled'));
+
+-- One-off messages from send_followup don't belong to a sequence
+ALTER TABLE public.follow_up_messages ALTER COLUMN sequence_id DROP NOT NULL;
+
+-- Expired claims are found without scanning sent history
+CREATE INDEX IF NOT EXISTS idx_follow_up_messages_sending
+  ON public.follow_up_messages(claimed_at) WHERE status = 'sending';
+
+-- Claim up to p_limit messages on p_channels for p_claim_id. Claims older
+-- than p_lease_seconds (their dispatcher is gone) are taken over first, then
+-- due pending messages in send_at order via idx_follow_up_messages_pending.
+-- With p_ids, only those pending messages are claimed, due or not (one-off
+-- sends). Returns the claimed rows with attempts already incremented.
+CREATE OR REPLACE FUNCTION public.mcp_claim_followups(
+  p_claim_id UUID,
+  p_limit INTEGER,
+  p_channels TEXT[],
+  p_lease_seconds INTEGER DEFAULT 300,
+  p_ids UUID[] DEFAULT NULL
+)
+RETURNS SETOF public.follow_up_messages
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_ids UUID[];
+BEGIN
+  IF p_ids IS NOT NULL THEN
+    SELECT coalesce(array_agg(id), '{}') INTO v_ids FROM (
+      SELECT id FROM public.follow_up_messages
+      WHERE id = ANY(p_ids) AND status = 'pending' AND channel = ANY(p_channels)
+      LIMIT p_limit
+      FOR UPDATE SKIP LOCKED
+    ) s;
+  ELSE
+    SELECT coalesce(array_agg(id), '{}') INTO v_ids FROM (
+      SELECT id FROM public.follow_up_messages
+      WHERE status = 'sending' AND channel = ANY(p_channels)
+        AND claimed_at < now() - make_interval(secs => p_lease_seconds)
+      ORDER BY claimed_at
+      LIMIT p_limit
+      FOR UPDATE SKIP LOCKED
+    ) s;
+
+    IF cardinality(v_ids) < p_limit THEN
+      SELECT v_ids || coalesce(array_agg(id), '{}') INTO v_ids FROM (
+        SELECT id FROM public.follow_up_messages
+        WHERE status = 'pending' AND send_at <= now() AND channel = ANY(p_channels)
+        ORDER BY send_at
+        LIMIT p_limit - cardinality(v_ids)
+        FOR UPDATE SKIP LOCKED
+      ) s;
+    END IF;
+  END IF;
+
+  RETURN QUERY
+  UPDATE public.follow_up_messages m
+  SET status = 'sending', claim_id = p_claim_id, claimed_at = now(), attempts = m.attempts + 1
+  WHERE m.id = ANY(v_ids)
+  RETURNING m.*;
+END;
+$$;
+
+-- Record outcomes for messages claimed by p_claim_id. p_results is a JSON
+-- array of {id, status, error?, sent_at?, send_at?, attempts?}; rows that are
+-- no longer held by this claim (taken over after a lease expired) are left
+-- alone. Returns the number of rows written.
+CREATE OR REPLACE FUNCTION public.mcp_finish_followups(
+  p_claim_id UUID,
+  p_results JSONB
+)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+  WITH r AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_results)
+      AS x(id UUID, status TEXT, error TEXT, sent_at TIMESTAMPTZ, send_at TIMESTAMPTZ, attempts INTEGER)
+  ),
+  done AS (
+    UPDATE public.follow_up_messages m
+    SET status = r.status,
+        error = r.error,
+        sent_at = coalesce(r.sent_at, m.sent_at),
+        send_at = coalesce(r.send_at, m.send_at),
+        attempts = coalesce(r.attempts, m.attempts),
+        claim_id = NULL,
+        claimed_at = NULL
+    FROM r
+    WHERE m.id = r.id AND m.claim_id = p_claim_id AND m.status = 'sending'
+    RETURNING 1
+  )
+  SELECT count(*)::INTEGER FROM done;
+$$;
+
+-- Permissions
+GRANT EXECUTE ON FUNCTION public.mcp_claim_followups(UUID, INTEGER, TEXT[], INTEGER, UUID[]) TO service_role;
+GRANT EXECUTE ON FUNCTION public.mcp_finish_followups(UUID, JSONB) TO service_role;
@@ -0,0 +1,47 @@
+-- ===========================================
+-- MCP Campaign Execution
+-- ===========================================
+-- The `campaigns` table behind the MCP server's campaign tools, plus the
+-- state its execution engine (tools/quotahit_campaigns.py) keeps on each
+-- campaign: who it targets, what it sends, and a resumable checkpoint.
+-- (The web app's AI calling campaigns live in ai_call_campaigns.)
+
+CREATE TABLE IF NOT EXISTS public.campaigns (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT 'outbound',
+    description TEXT,
+    status TEXT NOT NULL DEFAULT 'draft',
+    total_contacts INTEGER NOT NULL DEFAULT 0,
+    completed_contacts INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_mcp_campaigns_user ON public.campaigns(user_id, created_at DESC);
+
+ALTER TABLE public.campaigns ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_policies WHERE tablename = 'campaigns' AND policyname = 'Users own campaigns') THEN
+        CREATE POLICY "Users own campaigns" ON public.campaigns FOR ALL USING (auth.uid() = user_id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_policies WHERE tablename = 'campaigns' AND policyname = 'Service role full access campaigns') THEN
+        CREATE POLICY "Service role full access campaigns" ON public.campaigns FOR ALL USING (auth.jwt() ->> 'role' = 'service_role');
+    END IF;
+END
+$$;
+
+-- contact_filter: bulk-tool filter ({"deal_stage": "lead", ...}) selecting the contacts
+-- message: {"channel", "subject", "body"} with {{first_name}}-style placeholders
+-- checkpoint: {"after_id", "outcomes"}; every contact with id <= after_id is done
+-- runner_id / heartbeat_at: the engine holding the campaign; stale after its lease
+ALTER TABLE public.campaigns
+  ADD COLUMN IF NOT EXISTS contact_filter JSONB,
+  ADD COLUMN IF NOT EXISTS message JSONB,
+  ADD COLUMN IF NOT EXISTS checkpoint JSONB NOT NULL DEFAULT '{}',
+  ADD COLUMN IF NOT EXISTS runner_id UUID,
+  ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS completed_at TIMESTAMPTZ;
@@ -0,0 +1,91 @@
+-- ===========================================
+-- MCP Trend Rollup (daily buckets push-down)
+-- ===========================================
+-- Per-day counts for the MCP server's get_trends tool over rows created in
+-- [p_from, p_to): new contacts, stage transitions and won deals (from
+-- stage_changed activities) and lead score buckets (from lead_scored
+-- activities). The server keeps the days it has seen and only asks for the
+-- ones that can still change. Without this function it streams the rows.
+-- A long range returns more rows than PostgREST's max-rows, so the server
+-- pages the result ordered on (day, metric, key), which is unique.
+--
+-- stage_changed rows written before details carried {"from", "to",
+-- "deal_value"} are read from their "Stage: a → b" title, and won deals
+-- without a logged value take the contact's current deal_value.
+
+CREATE INDEX IF NOT EXISTS idx_activities_user_type_created
+  ON public.activities(user_id, activity_type, created_at);
+
+CREATE OR REPLACE FUNCTION public.mcp_trend_rollup(
+  p_user_id UUID,
+  p_from TIMESTAMPTZ,
+  p_to TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TABLE (
+  day DATE,
+  metric TEXT,
+  key TEXT,
+  count BIGINT,
+  value NUMERIC
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH transitions AS (
+    SELECT
+      (a.created_at AT TIME ZONE 'UTC')::DATE AS day,
+      coalesce(a.details ->> 'from', substring(a.title FROM '^Stage: (.*) → ')) AS from_stage,
+      coalesce(a.details ->> 'to', substring(a.title FROM ' → (.*)$')) AS to_stage,
+      coalesce((a.details ->> 'deal_value')::NUMERIC, c.deal_value, 0) AS deal_value
+    FROM public.activities a
+    LEFT JOIN public.contacts c ON c.id = a.contact_id
+    WHERE a.user_id = p_user_id
+      AND a.activity_type = 'stage_changed'
+      AND a.created_at >= p_from
+      AND (p_to IS NULL OR a.created_at < p_to)
+  )
+  SELECT (c.created_at AT TIME ZONE 'UTC')::DATE, 'new_contacts', NULL, count(*)::BIGINT, NULL::NUMERIC
+  FROM public.contacts c
+  WHERE c.user_id = p_user_id
+    AND c.created_at >= p_from
+    AND (p_to IS NULL OR c.created_at < p_to)
+  GROUP BY 1
+
+  UNION ALL
+  SELECT t.day, 'transition', coalesce(t.from_stage, 'unknown') || ' → ' || t.to_stage, count(*)::BIGINT, NULL
+  FROM transitions t
+  WHERE t.to_stage IS NOT NULL
+  GROUP BY 1, 3
+
+  UNION ALL
+  SELECT t.day, 'won', NULL, count(*)::BIGINT, sum(t.deal_value)
+  FROM transitions t
+  WHERE t.to_stage = 'won'
+  GROUP BY 1
+
+  UNION ALL
+  SELECT
+    (a.created_at AT TIME ZONE 'UTC')::DATE,
+    'score',
+    CASE
+      WHEN s.score <= 20 THEN '0-20'
+      WHEN s.score <= 40 THEN '21-40'
+      WHEN s.score <= 60 THEN '41-60'
+      WHEN s.score <= 80 THEN '61-80'
+      ELSE '81-100'
+    END,
+    count(*)::BIGINT,
+    NULL
+  FROM public.activities a
+  CROSS JOIN LATERAL (SELECT (a.details ->> 'score')::NUMERIC AS score) s
+  WHERE a.user_id = p_user_id
+    AND a.activity_type = 'lead_scored'
+    AND a.created_at >= p_from
+    AND (p_to IS NULL OR a.created_at < p_to)
+    AND s.score IS NOT NULL
+  GROUP BY 1, 3
+
+  ORDER BY 1, 2, 3;
+$$;
+
+-- Permissions
+GRANT EXECUTE ON FUNCTION public.mcp_trend_rollup(UUID, TIMESTAMPTZ, TIMESTAMPTZ) TO service_role;
@@ -0,0 +1,183 @@
+"""
+QuotaHit write-behind activity logger.
+
+Mutating MCP tools enqueue their `activities` rows here instead of blocking on
+a separate insert. A background task flushes the queue in batches (on size or
+after `flush_interval` seconds), retrying failed batches with backoff. A
+batch the database refuses outright (a constraint or bad-value error) is
+split until the offending rows are isolated, so only those are dropped. The
+queue is bounded, so producers wait (backpressure) instead of growing memory
+without limit when the database falls behind. `flush()` drains everything and
+is called on server shutdown.
+"""
+
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()  # queue marker: write the batch being collected now
+
+
+def _rejected(error: Exception) -> bool:
+    """True for errors retrying can't fix: data, constraint and schema errors
+    (SQLSTATE classes 22, 23, 42) and PostgREST request errors (PGRST1xx/2xx)."""
+    code = getattr(error, "code", None) or ""
+    return code[:2] in ("22", "23", "42") or code.startswith(("PGRST1", "PGRST2"))
+
+
+class ActivityLogger:
+    """Bounded write-behind queue that batches `activities` inserts."""
+
+    def __init__(
+        self,
+        get_client,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_queue: int = 10_000,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        on_written=None,
+    ):
+        self._get_client = get_client  # async () -> supabase client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._on_written = on_written  # called with each written batch
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._counters = {
+            "enqueued": 0, "written": 0, "batches": 0,
+            "sync_writes": 0, "retries": 0, "dropped": 0, "rejected": 0, "backpressure_waits": 0,
+        }
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            # Fresh context: the worker must not inherit the calling tool's context vars
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+
+    async def log(self, rows, sync: bool = False):
+        """Record one activity row (or a list). sync=True inserts before returning."""
+        rows = rows if isinstance(rows, list) else [rows]
+        if sync:
+            self._counters["sync_writes"] += 1
+            await self._write(rows, retry=False)
+            return
+
+        self._ensure_worker()
+        for row in rows:
+            if self._queue.full():
+                self._counters["backpressure_waits"] += 1
+            await self._queue.put(row)
+            self._counters["enqueued"] += 1
+
+    async def _write(self, batch: list, retry: bool = True):
+        attempt = 0
+        while True:
+            try:
+                sb = await self._get_client()
+                await sb.table("activities").insert(batch, returning="minimal").execute()
+                break
+            except Exception as e:
+                if not retry:
+                    raise
+                if _rejected(e):
+                    await self._split(batch, e)
+                    return
+                attempt += 1
+                if attempt > self.max_retries:
+                    self._counters["dropped"] += len(batch)
+                    logger.error("Dropping %d activity rows after %d retries: %s", len(batch), self.max_retries, e)
+                    return
+                self._counters["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+        self._counters["written"] += len(batch)
+        self._counters["batches"] += 1
+        if self._on_written is not None:
+            self._on_written(batch)
+
+    async def _split(self, batch: list, error: Exception):
+        """Write a rejected batch in halves until the bad rows stand alone."""
+        if len(batch) == 1:
+            self._counters["rejected"] += 1
+            logger.error("Dropping activity row the database rejected: %s", error)
+            return
+        middle = len(batch) // 2
+        await self._write(batch[:middle])
+        await self._write(batch[middle:])
+
+    async def _collect(self) -> list:
+        """Wait for one row, then gather more until batch_size, flush_interval or a flush()."""
+        batch, deadline = [], None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                item = await self._queue.get()
+            else:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _FLUSH:
+                self._queue.task_done()
+                if batch:
+                    break
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = self._loop.time() + self.flush_interval
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                if batch:
+                    await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def flush(self):
+        """Write everything queued so far (including the worker's in-flight batch)."""
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _FLUSH:
+                    self._queue.task_done()
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        if self._worker is not None and not self._worker.done():
+            # Don't wait out flush_interval on rows the worker is still collecting
+            await self._queue.put(_FLUSH)
+        await self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+        }
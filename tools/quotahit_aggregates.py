@@ -0,0 +1,294 @@
+"""
+QuotaHit pipeline aggregates — incremental accumulators over contact rows.
+
+The MCP dashboard tools (get_pipeline, get_analytics, get_forecast) stream
+contacts page by page and feed each row into one of these accumulators, so
+memory stays flat however many contacts a user has. ContactStats also accepts
+pre-aggregated rollup groups from the database, and renders both sources into
+identical, deterministically ordered payloads.
+"""
+
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+
+SCORE_BUCKETS = ("0-20", "21-40", "41-60", "61-80", "81-100")
+
+STAGE_ORDER = ("lead", "contacted", "qualified", "proposal", "negotiation", "won", "lost")
+
+# Stage → close probability used by the revenue forecast
+STAGE_PROBABILITY = {
+    "lead": 0.05,
+    "contacted": 0.10,
+    "qualified": 0.30,
+    "proposal": 0.60,
+    "negotiation": 0.80,
+    "won": 1.00,
+    "lost": 0.00,
+}
+
+
+def score_bucket(score) -> str:
+    """Dashboard bucket label for a lead score (None counts as 0)."""
+    s = score or 0
+    if s <= 20:
+        return "0-20"
+    if s <= 40:
+        return "21-40"
+    if s <= 60:
+        return "41-60"
+    if s <= 80:
+        return "61-80"
+    return "81-100"
+
+
+def _money(value) -> float:
+    """Deal values are DECIMAL(12,2); report sums in cents precision."""
+    return round(float(value), 2)
+
+
+def _stage_key(stage):
+    """Pipeline order first, then any other stage alphabetically (None last)."""
+    if stage in STAGE_ORDER:
+        return (0, STAGE_ORDER.index(stage), "")
+    return (1 if stage is not None else 2, 0, str(stage))
+
+
+class ContactStats:
+    """Running counts and deal value by stage, source and score bucket."""
+
+    def __init__(self):
+        self.total = 0
+        self.enriched = 0
+        self.by_stage = {}  # stage -> {"count", "total_value"}
+        self.by_source = {}  # source -> count
+        self.score_buckets = dict.fromkeys(SCORE_BUCKETS, 0)
+
+    def add(self, row: dict, sign: int = 1):
+        """Fold one contact row into the totals (sign=-1 takes it back out)."""
+        self.add_group(
+            stage=row.get("deal_stage", "lead"),
+            source=row.get("source", "unknown"),
+            bucket=score_bucket(row.get("lead_score")),
+            enriched=row.get("enrichment_status") == "enriched",
+            count=sign,
+            value=sign * (row.get("deal_value") or 0),
+        )
+
+    def remove(self, row: dict):
+        """Take a previously added contact row back out of the totals."""
+        self.add(row, sign=-1)
+
+    def add_group(self, stage, source, bucket: str, enriched: bool, count: int, value):
+        """Fold a pre-aggregated group of `count` contacts (e.g. a database rollup row)."""
+        if stage not in self.by_stage:
+            self.by_stage[stage] = {"count": 0, "total_value": 0}
+        self.by_stage[stage]["count"] += count
+        self.by_stage[stage]["total_value"] += value
+        if self.by_stage[stage]["count"] == 0:
+            del self.by_stage[stage]
+
+        self.by_source[source] = self.by_source.get(source, 0) + count
+        if self.by_source[source] == 0:
+            del self.by_source[source]
+        self.score_buckets[bucket] += count
+        if enriched:
+            self.enriched += count
+        self.total += count
+
+    def _stages(self) -> list:
+        return sorted(self.by_stage, key=_stage_key)
+
+    def pipeline(self) -> dict:
+        """get_pipeline payload."""
+        by_stage = {
+            stage: {
+                "count": self.by_stage[stage]["count"],
+                "total_value": _money(self.by_stage[stage]["total_value"]),
+            }
+            for stage in self._stages()
+        }
+        return {
+            "total_contacts": self.total,
+            "total_pipeline_value": _money(sum(s["total_value"] for s in self.by_stage.values())),
+            "by_stage": by_stage,
+        }
+
+    def analytics(self) -> dict:
+        """get_analytics payload."""
+        total = self.total
+        if total == 0:
+            return {"message": "No contacts yet", "total": 0}
+
+        won_stage = self.by_stage.get("won", {"count": 0, "total_value": 0})
+        won, won_value = won_stage["count"], _money(won_stage["total_value"])
+
+        return {
+            "total_contacts": total,
+            "enriched": self.enriched,
+            "enrichment_rate": round(self.enriched / total * 100, 1),
+            "won_deals": won,
+            "won_value": won_value,
+            "win_rate": round(won / total * 100, 1),
+            "avg_deal_value": round(won_value / won, 2) if won else 0,
+            "score_distribution": dict(self.score_buckets),
+            "by_source": dict(sorted(
+                self.by_source.items(), key=lambda kv: (-kv[1], kv[0] is None, str(kv[0]))
+            )),
+            "by_stage": {stage: self.by_stage[stage]["count"] for stage in self._stages()},
+        }
+
+
+class ForecastStats:
+    """Probability-weighted pipeline totals plus a bounded top-k deal heap."""
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self.total_pipeline = 0
+        self.total_weighted = 0
+        self.deal_count = 0
+        self._heap = []  # min-heap of (weighted, -seq, deal), size <= top_k
+
+    def add(self, row: dict):
+        """Fold one deal (contact with a positive deal_value) into the totals."""
+        value = row.get("deal_value", 0)
+        stage = row.get("deal_stage", "lead")
+        prob = STAGE_PROBABILITY.get(stage, 0.05)
+        weighted = value * prob
+
+        self.total_weighted += weighted
+        self.total_pipeline += value
+        self.deal_count += 1
+
+        # -seq keeps the earliest deal on ties, like a stable full sort would
+        key = (weighted, -self.deal_count)
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, (*key, row))
+        elif key > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, (*key, row))
+
+    def top_deals(self) -> list[dict]:
+        """Highest weighted-value deals, best first."""
+        ranked = sorted(self._heap, key=lambda item: (-item[0], -item[1]))
+        return [
+            {
+                "name": f"{row.get('first_name', '')} {row.get('last_name', '')}".strip(),
+                "company": row.get("company"),
+                "stage": row.get("deal_stage", "lead"),
+                "value": row.get("deal_value", 0),
+                "probability": STAGE_PROBABILITY.get(row.get("deal_stage", "lead"), 0.05),
+                "weighted_value": round(weighted, 2),
+            }
+            for weighted, _, row in ranked
+        ]
+
+    def forecast(self) -> dict:
+        """get_forecast payload."""
+        return {
+            "total_pipeline": self.total_pipeline,
+            "weighted_forecast": round(self.total_weighted, 2),
+            "deal_count": self.deal_count,
+            "top_deals": self.top_deals(),
+        }
+
+
+class AggregateStore:
+    """Per-user materialized ContactStats, kept current by O(1) write deltas.
+
+    Entries are rebuilt from a full scan (or database rollup) at most every
+    `reconcile_seconds`, which corrects any drift from missed or racing
+    writes. A build that overlapped a write is stored already due for
+    reconciliation, since it may or may not include that write.
+    """
+
+    def __init__(self, reconcile_seconds: float = 300, max_users: int = 1000):
+        self.reconcile_seconds = reconcile_seconds
+        self.max_users = max_users
+        self._entries = OrderedDict()  # user_id -> {"stats", "built_at", "deltas"}
+        self._generation = OrderedDict()  # user_id -> stamp of the last write, LRU-bounded
+        self._stamps = itertools.count(1)
+        self._floor = 0  # generation of every user not in _generation; never decreases
+        self._counters = {
+            "hits": 0, "builds": 0, "reconciles": 0,
+            "deltas": 0, "drift_corrections": 0, "evictions": 0,
+        }
+
+    def generation(self, user_id: str) -> int:
+        """Token to pass to `put` so builds racing a write are detected."""
+        return self._generation.get(user_id, self._floor)
+
+    def _written(self, user_id: str):
+        self._generation[user_id] = next(self._stamps)
+        self._generation.move_to_end(user_id)
+        while len(self._generation) > self.max_users:
+            # A forgotten user reads the floor, which is at least their last stamp
+            _, self._floor = self._generation.popitem(last=False)
+
+    def get(self, user_id: str) -> ContactStats | None:
+        """Current aggregates, or None if missing or due for reconciliation."""
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry["built_at"] >= self.reconcile_seconds:
+            return None
+        self._entries.move_to_end(user_id)
+        self._counters["hits"] += 1
+        return entry["stats"]
+
+    def tracks(self, user_id: str) -> bool:
+        """True if writes for this user should fetch old rows to apply deltas."""
+        return user_id in self._entries
+
+    def info(self, user_id: str) -> dict:
+        entry = self._entries[user_id]
+        return {
+            "mode": "materialized",
+            "age_s": round(time.monotonic() - entry["built_at"], 1),
+            "deltas_applied": entry["deltas"],
+        }
+
+    def put(self, user_id: str, stats: ContactStats, generation: int):
+        """Store freshly built aggregates for a user."""
+        previous = self._entries.pop(user_id, None)
+        if previous is None:
+            self._counters["builds"] += 1
+        else:
+            self._counters["reconciles"] += 1
+            if previous["stats"].analytics() != stats.analytics():
+                self._counters["drift_corrections"] += 1
+
+        raced = generation != self.generation(user_id)
+        self._entries[user_id] = {
+            "stats": stats,
+            "built_at": float("-inf") if raced else time.monotonic(),
+            "deltas": 0,
+        }
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def apply(self, user_id: str, old: dict | None = None, new: dict | None = None):
+        """Apply one contact write: `old` row out, `new` row in (either may be None)."""
+        self._written(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if old is not None:
+            entry["stats"].remove(old)
+        if new is not None:
+            entry["stats"].add(new)
+        entry["deltas"] += 1
+        self._counters["deltas"] += 1
+
+    def drop(self, user_id: str):
+        """Forget a user's aggregates (next read rebuilds them)."""
+        self._written(user_id)
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "users": len(self._entries),
+            "generations": len(self._generation),
+            "max_users": self.max_users,
+            "reconcile_seconds": self.reconcile_seconds,
+        }
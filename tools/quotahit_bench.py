@@ -0,0 +1,550 @@
+"""
+QuotaHit MCP micro-benchmarks.
+
+Usage:
+    python tools/quotahit_bench.py scoring [--rows 1000 100000 1000000]
+    python tools/quotahit_bench.py forecast [--deals 1000 10000 50000] [--trials 100000]
+    python tools/quotahit_bench.py serialization [--repeat 200]
+    python tools/quotahit_bench.py tools [--contacts 1k 100k 1m] [--repeat 3] [--rtt-ms 0]
+                                         [--compare FILE] [--record FILE] [--only TOOL ...]
+    python tools/quotahit_bench.py dispatch [--messages 10000] [--latency-ms 50] [--rtt-ms 2]
+                                            [--concurrency 20] [--dispatchers 1]
+
+scoring  — vectorized engine (quotahit_scoring) vs the per-dict rules that
+           score_lead used to evaluate inline; also checks that both, and
+           score_contact, agree.
+forecast — Monte Carlo get_forecast(mode="simulate") scaling with pipeline
+           size, plus the hybrid (exact + CLT tail) vs all-exact error.
+serialization — encode time and response bytes per tool payload: the old
+           indent=2 stdlib dumps vs compact stdlib vs compact orjson, plus
+           the effect of a max_tokens budget.
+tools    — every MCP tool against the in-memory PostgREST stand-in
+           (quotahit_fakedb) at each dataset size: cold latency split into
+           server and database time, round-trips, warm (cached) latency and
+           peak traced memory. --record saves the numbers as a baseline and
+           --compare flags regressions against one (exit status 1).
+           Baseline: tools/quotahit_bench_baseline.json. 1M contacts needs
+           about 4 GB of RAM.
+dispatch — follow-up dispatcher (quotahit_dispatch) draining a backlog of due
+           messages through FakeChannel with a simulated provider latency:
+           messages per minute, claim/finish round-trips, and a check that
+           no message was delivered twice (also with several dispatchers).
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+STAGES = ["lead", "contacted", "qualified", "proposal", "negotiation", "won", "lost"]
+SOURCES = ["referral", "inbound", "linkedin", "website", "import", "manual", "cold", "mcp"]
+
+
+def synthetic_contacts(n: int, seed: int = 42) -> tuple[list[dict], dict]:
+    """Random contacts plus an activity-count map keyed by contact id."""
+    rnd = random.Random(seed)
+    contacts, counts = [], {}
+    for i in range(n):
+        cid = f"00000000-0000-4000-8000-{i:012d}"
+        contacts.append({
+            "id": cid,
+            "first_name": "Lead",
+            "email": f"lead{i}@example.com" if rnd.random() < 0.8 else "",
+            "phone": "+14155550100" if rnd.random() < 0.5 else None,
+            "company": "Acme" if rnd.random() < 0.7 else None,
+            "title": "VP Sales" if rnd.random() < 0.6 else None,
+            "enrichment_status": "enriched" if rnd.random() < 0.3 else "pending",
+            "deal_value": rnd.choice([0, None, 2500.0, 9000.0, 25000.0]),
+            "deal_stage": rnd.choice(STAGES),
+            "source": rnd.choice(SOURCES + [None]),
+            "do_not_call": rnd.random() < 0.05,
+            "do_not_email": rnd.random() < 0.05,
+        })
+        counts[cid] = rnd.randint(0, 8)
+    return contacts, counts
+
+
+def reference_score(contact: dict, activity_count: int) -> tuple[int, dict]:
+    """The original per-dict score_lead rules, kept as the benchmark baseline."""
+    score = 0
+    if contact.get("email"):
+        score += 5
+    if contact.get("phone"):
+        score += 5
+    if contact.get("company"):
+        score += 5
+    if contact.get("title"):
+        score += 5
+    if contact.get("enrichment_status") == "enriched":
+        score += 15
+    deal_value = contact.get("deal_value") or 0
+    if deal_value > 0:
+        score += 10
+    if deal_value > 10000:
+        score += 5
+    score += min(activity_count * 4, 20)
+    stage_bonus = {
+        "lead": 0, "contacted": 3, "qualified": 8,
+        "proposal": 12, "negotiation": 15,
+    }
+    stage = contact.get("deal_stage", "")
+    score += stage_bonus.get(stage, 0)
+    source_bonus = {
+        "referral": 10, "inbound": 8, "linkedin": 6,
+        "website": 5, "import": 3, "manual": 2, "cold": 1, "mcp": 3,
+    }
+    source = contact.get("source", "")
+    score += source_bonus.get(source, 0)
+    if contact.get("do_not_call") and contact.get("do_not_email"):
+        score -= 20
+    score = max(0, min(score, 100))
+
+    breakdown = {
+        "completeness": min(sum([
+            5 if contact.get("email") else 0,
+            5 if contact.get("phone") else 0,
+            5 if contact.get("company") else 0,
+            5 if contact.get("title") else 0,
+        ]), 20),
+        "enrichment": 15 if contact.get("enrichment_status") == "enriched" else 0,
+        "deal_signals": min(10 + (5 if deal_value > 10000 else 0), 15) if deal_value > 0 else 0,
+        "engagement": min(activity_count * 4, 20),
+        "stage": stage_bonus.get(stage, 0),
+        "source": source_bonus.get(source, 0),
+    }
+    return score, breakdown
+
+
+def _timed(fn, *args, repeat: int = 3) -> tuple[float, object]:
+    """Best-of-N wall time in milliseconds, plus the last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, result
+
+
+def bench_scoring(sizes: list[int]):
+    from quotahit_scoring import score_columns, score_contact, score_contacts, to_columns
+
+    print(f"{'rows':>10} {'per-dict ms':>12} {'columns ms':>11} {'engine ms':>10} {'end-to-end ms':>14} {'speedup':>8}")
+    for n in sizes:
+        contacts, counts = synthetic_contacts(n)
+
+        ref_ms, expected = _timed(
+            lambda: [reference_score(c, counts[c["id"]]) for c in contacts], repeat=1
+        )
+        cols_ms, cols = _timed(to_columns, contacts, counts, repeat=1)
+        engine_ms, _ = _timed(score_columns, cols)
+        e2e_ms, actual = _timed(score_contacts, contacts, counts, repeat=1)
+
+        if actual != expected:
+            raise SystemExit(f"engine disagrees with reference scoring at {n} rows")
+        if [score_contact(c, counts[c["id"]]) for c in contacts] != expected:
+            raise SystemExit(f"score_contact disagrees with reference scoring at {n} rows")
+        print(
+            f"{n:>10} {ref_ms:>12.1f} {cols_ms:>11.1f} {engine_ms:>10.2f} "
+            f"{e2e_ms:>14.1f} {ref_ms / engine_ms:>7.0f}x"
+        )
+
+
+def synthetic_deals(n: int, seed: int = 42):
+    """Deal values and stage probabilities shaped like a real pipeline."""
+    import numpy as np
+
+    from quotahit_aggregates import STAGE_PROBABILITY
+
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.lognormal(mean=8.5, sigma=1.2, size=n), 2)
+    stages = rng.choice(STAGES, size=n, p=[0.35, 0.2, 0.15, 0.1, 0.08, 0.07, 0.05])
+    probs = np.array([STAGE_PROBABILITY[s] for s in stages])
+    return values, probs
+
+
+def bench_forecast(sizes: list[int], trials: int):
+    from quotahit_forecast import simulate_revenue
+
+    print(f"{'deals':>8} {'trials':>8} {'method':>7} {'ms':>8} {'P10':>14} {'P50':>14} {'P90':>14}")
+    for n in sizes:
+        values, probs = synthetic_deals(n)
+        ms, sim = _timed(lambda: simulate_revenue(values, probs, trials=trials, seed=1), repeat=1)
+        print(
+            f"{n:>8} {trials:>8} {sim['method']:>7} {ms:>8.0f} "
+            f"{sim['p10']:>14,.0f} {sim['p50']:>14,.0f} {sim['p90']:>14,.0f}"
+        )
+
+    # Accuracy of the CLT tail: hybrid vs simulating every deal exactly
+    n = min(max(sizes), 20_000)
+    values, probs = synthetic_deals(n)
+    exact = simulate_revenue(values, probs, trials=20_000, exact_deals=n, seed=2)
+    hybrid = simulate_revenue(values, probs, trials=20_000, seed=2)
+    error = max(abs(hybrid[k] - exact[k]) / exact[k] for k in ("p10", "p50", "p90"))
+    print(f"hybrid vs exact at {n} deals: max percentile error {error * 100:.2f}%")
+
+
+def synthetic_payloads(seed: int = 42) -> dict:
+    """Responses shaped like what each tool returns on a wide CRM row set."""
+    rnd = random.Random(seed)
+    contacts, counts = synthetic_contacts(1000, seed)
+    for i, c in enumerate(contacts):
+        c.update({
+            "last_name": "Example",
+            "lead_score": rnd.randint(0, 100),
+            "created_at": f"2026-03-{1 + i % 28:02d}T10:00:00.000000+00:00",
+            "last_contacted_at": None,
+            "notes": "Met at SaaStr; interested in the outbound package. " * 3,
+            "custom_fields": {"industry": "Software", "employees": "51-200", "region": "NA"},
+            "enrichment_data": {
+                "summary": "Series B developer-tools company scaling its sales team. " * 8,
+                "news": [{"title": f"Headline {n}", "url": f"https://news.example.com/{n}"} for n in range(12)],
+                "technologies": ["Salesforce", "HubSpot", "Outreach", "Gong", "Slack"],
+            },
+        })
+    summary = [
+        {
+            "id": c["id"], "name": f"{c['first_name']} {c['last_name']}", "email": c["email"],
+            "company": c["company"], "title": c["title"], "stage": c["deal_stage"],
+            "score": c["lead_score"], "deal_value": c["deal_value"], "source": c["source"],
+            "last_contacted": c["last_contacted_at"],
+        }
+        for c in contacts[:100]
+    ]
+    activities = [
+        {
+            "id": f"a{n}", "contact_id": contacts[0]["id"], "activity_type": "note",
+            "title": f"Call #{n}", "description": "Discussed pricing and rollout timeline. " * 4,
+            "created_at": "2026-03-01T10:00:00+00:00",
+        }
+        for n in range(10)
+    ]
+    return {
+        "list_contacts": {"count": 100, "contacts": summary},
+        "list_contacts verbose": {"count": 100, "contacts": contacts[:100]},
+        "get_contact": {"contact": contacts[0], "activities": activities},
+        "score_leads_batch": {
+            "scored": 1000,
+            "results": [
+                {"contact_id": c["id"], "score": score, "breakdown": breakdown}
+                for c, (score, breakdown) in ((c, reference_score(c, counts[c["id"]])) for c in contacts)
+            ],
+        },
+    }
+
+
+def bench_serialization(repeat: int):
+    import quotahit_serialize
+    from quotahit_serialize import dumps, encode
+
+    encoders = {"indent=2": lambda d: json.dumps(d, indent=2, default=str)}
+    fast = quotahit_serialize.orjson
+    quotahit_serialize.orjson = None
+    encoders["compact"] = lambda d: encode(d).decode()
+    if fast is not None:
+        encoders["orjson"] = lambda d: (fast.dumps(d, default=str)).decode()
+    quotahit_serialize.orjson = fast
+
+    print(f"{'payload':<22} {'encoder':>9} {'bytes':>10} {'µs/call':>9}")
+    for name, payload in synthetic_payloads().items():
+        for label, fn in encoders.items():
+            ms, out = _timed(lambda: [fn(payload) for _ in range(repeat)])
+            print(f"{name:<22} {label:>9} {len(out[0].encode()):>10,} {ms * 1000 / repeat:>9.0f}")
+
+        for tokens in (4000, 1000):
+            ms, out = _timed(dumps, payload, False, 0, tokens)
+            print(f"{name:<22} {f'≤{tokens}tok':>9} {len(out.encode()):>10,} {ms * 1000:>9.0f}")
+
+
+def _scale(text: str) -> int:
+    """Parse a row count like 1000, 100k or 1m."""
+    text = text.strip().lower()
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+async def _run_campaign(q, campaign: dict, user: str) -> str:
+    """execute_campaign from the first contact to the last (the fake row is reset in place)."""
+    campaign.update(status="draft", checkpoint={}, completed_contacts=0, runner_id=None)
+    return await q.execute_campaign(campaign["id"], user, wait=True)
+
+
+async def _burst(call, n: int = 20) -> str:
+    """`n` identical calls at once, as when several agents open the same dashboard."""
+    results = await asyncio.gather(*(call() for _ in range(n)))
+    return results[0]
+
+
+def tool_cases(q, user: str, contact_id: str, campaign: dict, import_rows: str, bulk_ids: str) -> list:
+    """(name, call) pairs covering every data tool with representative arguments."""
+    return [
+        ("list_contacts", lambda: q.list_contacts(user_id=user)),
+        ("list_contacts search", lambda: q.list_contacts(user_id=user, search="acme")),
+        ("list_contacts by score", lambda: q.list_contacts(user_id=user, sort_by="lead_score", limit=100)),
+        ("get_contact", lambda: q.get_contact(contact_id, user)),
+        ("create_contact", lambda: q.create_contact("Bench", user, company="Acme Labs", deal_value=5000)),
+        ("update_contact", lambda: q.update_contact(contact_id, user, '{"title": "CTO", "deal_value": 7500}')),
+        ("update_deal_stage", lambda: q.update_deal_stage(contact_id, user, "qualified")),
+        ("bulk_update_deal_stage", lambda: q.bulk_update_deal_stage("qualified", user, contact_ids=bulk_ids)),
+        ("bulk_update_contacts", lambda: q.bulk_update_contacts(user, '{"tags": ["bench"]}', contact_ids=bulk_ids)),
+        ("enrich_lead", lambda: q.enrich_lead(contact_id, user)),
+        ("score_lead", lambda: q.score_lead(contact_id, user)),
+        ("score_leads_batch", lambda: q.score_leads_batch(user, max_tokens=2000)),
+        ("qualify_lead", lambda: q.qualify_lead(contact_id, user)),
+        ("import_contacts", lambda: q.import_contacts(user, rows=import_rows)),
+        ("find_duplicates", lambda: q.find_duplicates(user)),
+        ("list_campaigns", lambda: q.list_campaigns(user)),
+        ("create_campaign", lambda: q.create_campaign("Bench campaign", user)),
+        ("execute_campaign", lambda: _run_campaign(q, campaign, user)),
+        ("campaign_progress", lambda: q.campaign_progress(campaign["id"], user)),
+        ("get_pipeline", lambda: q.get_pipeline(user)),
+        ("get_analytics", lambda: q.get_analytics(user)),
+        ("get_analytics scan", lambda: q.get_analytics(user, mode="scan")),
+        ("get_analytics scan burst", lambda: _burst(lambda: q.get_analytics(user, mode="scan"))),
+        ("get_forecast", lambda: q.get_forecast(user)),
+        ("get_forecast burst", lambda: _burst(lambda: q.get_forecast(user))),
+        ("get_forecast simulate", lambda: q.get_forecast(user, mode="simulate", trials=10_000)),
+        ("get_trends", lambda: q.get_trends(user, granularity="week", since="365d")),
+        ("list_sequences", lambda: q.list_sequences(user)),
+        ("send_followup", lambda: q.send_followup(user, contact_id, "Thanks for your time today.")),
+    ]
+
+
+def _reset_caches(q):
+    """Empty every in-process cache so the next call starts cold."""
+    from quotahit_aggregates import AggregateStore
+    from quotahit_cache import ReadThroughCache
+    from quotahit_search import SearchIndexStore
+    from quotahit_trends import TrendStore
+
+    q._cache = ReadThroughCache(q.CACHE_TTLS, q.CACHE_MAX_ENTRIES)
+    q._aggregates = AggregateStore(q.AGG_RECONCILE_SECONDS, q.AGG_MAX_USERS)
+    q._search = SearchIndexStore(q.SEARCH_REFRESH_SECONDS, q.SEARCH_MAX_DOCS)
+    q._dedupe = SearchIndexStore(q.SEARCH_REFRESH_SECONDS, q.SEARCH_MAX_DOCS)
+    q._trends = TrendStore(q.TRENDS_SETTLE_SECONDS, q.TRENDS_MAX_USERS)
+    q._pushdown_available = True
+    q._trend_pushdown_available = True
+
+
+async def _measure_tool(q, fake, call, repeat: int) -> dict:
+    """Best-of-N cold call (with its database share), one warm call, and traced peak memory."""
+    best = None
+    for _ in range(repeat):
+        _reset_caches(q)
+        trips, db = fake.round_trips, fake.db_seconds
+        start = time.perf_counter()
+        result = await call()
+        ms = (time.perf_counter() - start) * 1000
+        sample = (ms, (fake.db_seconds - db) * 1000, fake.round_trips - trips, result)
+        await q._activity_log.flush()
+        if best is None or ms < best[0]:
+            best = sample
+
+    start = time.perf_counter()
+    await call()
+    warm_ms = (time.perf_counter() - start) * 1000
+    await q._activity_log.flush()
+
+    _reset_caches(q)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        await call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    await q._activity_log.flush()
+
+    ms, db_ms, round_trips, result = best
+    return {
+        "ms": round(ms, 2),
+        "server_ms": round(ms - db_ms, 2),
+        "db_ms": round(db_ms, 2),
+        "round_trips": round_trips,
+        "warm_ms": round(warm_ms, 2),
+        "peak_kb": round(peak / 1024),
+        "ok": isinstance(result, str) and result.startswith(("{", "[")),
+    }
+
+
+def _regressions(scale: str, results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Human-readable regressions of `results` against the baseline for one scale."""
+    found = []
+    for name, now in results.items():
+        before = baseline.get("results", {}).get(scale, {}).get(name)
+        if before is None:
+            continue
+        if now["round_trips"] > before["round_trips"]:
+            found.append(f"{scale} {name}: round-trips {before['round_trips']} -> {now['round_trips']}")
+        if now["server_ms"] > before["server_ms"] * (1 + tolerance) and now["server_ms"] - before["server_ms"] > 1:
+            found.append(f"{scale} {name}: server time {before['server_ms']} -> {now['server_ms']} ms")
+        if now["peak_kb"] > before["peak_kb"] * (1 + tolerance) and now["peak_kb"] - before["peak_kb"] > 64:
+            found.append(f"{scale} {name}: peak memory {before['peak_kb']} -> {now['peak_kb']} KB")
+    return found
+
+
+async def _bench_tools_at(n: int, repeat: int, rtt_ms: float, only: list[str]) -> dict:
+    import quotahit_mcp as q
+    from quotahit_campaigns import CampaignEngine
+    from quotahit_dispatch import CHANNELS, Dispatcher, FakeChannel
+    from quotahit_fakedb import BENCH_USER, FakeSupabase, generate
+
+    start = time.perf_counter()
+    fake = FakeSupabase(generate(n), rtt_ms=rtt_ms)
+    contact = next(c for c in fake.rows("contacts") if c["user_id"] == BENCH_USER and c.get("email"))
+    campaign = next(c for c in fake.rows("campaigns") if c["user_id"] == BENCH_USER)
+    campaign["contact_filter"] = {"deal_stage": "negotiation", "lead_score": {"gte": 50}}  # ~4% of contacts
+    import_rows = json.dumps([
+        {"first_name": f"Imported{i}", "email": f"imported{i}@example.com", "company": "Acme Labs"}
+        for i in range(500)
+    ])
+    bulk_ids = ",".join(c["id"] for c in fake.table_data("contacts").bucket("user_id", BENCH_USER)[:500])
+    print(
+        f"\n{n:,} contacts, {len(fake.rows('activities')):,} activities "
+        f"(built in {time.perf_counter() - start:.1f}s, rtt {rtt_ms:g} ms)"
+    )
+
+    q._supabase = fake
+    q._dispatcher = Dispatcher(q._get_supabase, dict.fromkeys(CHANNELS, FakeChannel()))
+    q._campaigns = CampaignEngine(q._get_supabase)
+    results = {}
+    print(f"{'tool':<24} {'cold ms':>9} {'server':>9} {'db':>9} {'trips':>6} {'warm ms':>9} {'peak KB':>9}")
+    for name, call in tool_cases(q, BENCH_USER, contact["id"], campaign, import_rows, bulk_ids):
+        if only and name.split()[0] not in only and name not in only:
+            continue
+        r = results[name] = await _measure_tool(q, fake, call, repeat)
+        flag = "" if r["ok"] else "  (non-JSON response)"
+        print(
+            f"{name:<24} {r['ms']:>9.1f} {r['server_ms']:>9.1f} {r['db_ms']:>9.1f} "
+            f"{r['round_trips']:>6} {r['warm_ms']:>9.1f} {r['peak_kb']:>9,}{flag}"
+        )
+    q._supabase = None
+    return results
+
+
+def bench_tools(sizes: list[int], repeat: int, rtt_ms: float, only: list[str],
+                compare: str, record: str, tolerance: float):
+    baseline = {}
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+
+    results, regressions = {}, []
+    for n in sizes:
+        results[str(n)] = asyncio.run(_bench_tools_at(n, repeat, rtt_ms, only))
+        regressions += _regressions(str(n), results[str(n)], baseline, tolerance)
+        gc.collect()
+
+    if record:
+        recorded = {"results": {}}
+        if os.path.exists(record):
+            with open(record) as f:
+                recorded = json.load(f)
+        recorded.update({"python": platform.python_version(), "repeat": repeat, "rtt_ms": rtt_ms})
+        for scale, tools in results.items():
+            recorded["results"].setdefault(scale, {}).update(tools)
+        with open(record, "w") as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nrecorded {record}")
+
+    if compare:
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) vs {compare} (tolerance {tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"\nno regressions vs {compare}")
+
+
+async def _bench_dispatch_at(n: int, latency_ms: float, rtt_ms: float, concurrency: int, dispatchers: int):
+    from quotahit_dispatch import CHANNELS, Dispatcher, FakeChannel
+    from quotahit_fakedb import FakeSupabase, followups, generate
+
+    tables = generate(1_000)
+    messages = followups(tables, n)
+    fake = FakeSupabase(tables, rtt_ms=rtt_ms)
+
+    async def client():
+        return fake
+
+    channel = FakeChannel(latency=latency_ms / 1000, concurrency=concurrency)
+    pool = [Dispatcher(client, dict.fromkeys(CHANNELS, channel), poll_interval=0.5) for _ in range(dispatchers)]
+    start = time.perf_counter()
+    for d in pool:
+        d.start()
+    while sum(1 for m in messages if m["status"] in ("sent", "failed")) < n:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    for d in pool:
+        await d.stop()
+
+    stats = [d.stats() for d in pool]
+    print(
+        f"{n:>9,} {dispatchers:>5} {elapsed:>8.2f} {n * 60 / elapsed:>11,.0f} "
+        f"{sum(s['claim_calls'] for s in stats):>7} {sum(s['finish_calls'] for s in stats):>7} "
+        f"{fake.round_trips / n * 1000:>9.1f} {channel.duplicates:>5}"
+    )
+
+
+def bench_dispatch(counts: list[int], latency_ms: float, rtt_ms: float, concurrency: int, dispatchers: int):
+    print(
+        f"provider latency {latency_ms:g} ms, db rtt {rtt_ms:g} ms, "
+        f"{concurrency} sends in flight per channel per dispatcher"
+    )
+    print(f"{'messages':>9} {'procs':>5} {'seconds':>8} {'msgs/min':>11} {'claims':>7} {'finish':>7} {'trips/1k':>9} {'dups':>5}")
+    for n in counts:
+        asyncio.run(_bench_dispatch_at(n, latency_ms, rtt_ms, concurrency, dispatchers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    scoring = sub.add_parser("scoring", help="vectorized vs per-dict lead scoring")
+    scoring.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+
+    forecast = sub.add_parser("forecast", help="Monte Carlo forecast scaling")
+    forecast.add_argument("--deals", type=int, nargs="+", default=[1_000, 10_000, 50_000, 200_000])
+    forecast.add_argument("--trials", type=int, default=100_000)
+
+    serialization = sub.add_parser("serialization", help="response encoding cost and size")
+    serialization.add_argument("--repeat", type=int, default=200)
+
+    tools = sub.add_parser("tools", help="per-tool latency, round-trips and memory on synthetic tenants")
+    tools.add_argument("--contacts", type=_scale, nargs="+", default=[1_000, 100_000])
+    tools.add_argument("--repeat", type=int, default=3)
+    tools.add_argument("--rtt-ms", type=float, default=0, help="simulated network latency per round-trip")
+    tools.add_argument("--only", nargs="+", default=[], help="tool names to run")
+    tools.add_argument("--compare", default="", help="baseline JSON to check against")
+    tools.add_argument("--record", default="", help="write (merge) results into this baseline JSON")
+    tools.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+
+    dispatch = sub.add_parser("dispatch", help="follow-up dispatcher throughput on a fake channel")
+    dispatch.add_argument("--messages", type=_scale, nargs="+", default=[10_000])
+    dispatch.add_argument("--latency-ms", type=float, default=50, help="simulated provider latency per send")
+    dispatch.add_argument("--rtt-ms", type=float, default=2, help="simulated database latency per round-trip")
+    dispatch.add_argument("--concurrency", type=int, default=20, help="sends in flight per channel")
+    dispatch.add_argument("--dispatchers", type=int, default=1, help="dispatchers sharing the backlog")
+
+    args = parser.parse_args()
+    if args.bench == "scoring":
+        bench_scoring(args.rows)
+    elif args.bench == "forecast":
+        bench_forecast(args.deals, args.trials)
+    elif args.bench == "serialization":
+        bench_serialization(args.repeat)
+    elif args.bench == "tools":
+        bench_tools(args.contacts, args.repeat, args.rtt_ms, args.only, args.compare, args.record, args.tolerance)
+    elif args.bench == "dispatch":
+        bench_dispatch(args.messages, args.latency_ms, args.rtt_ms, args.concurrency, args.dispatchers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+QuotaHit read-through cache — in-process, per-user, TTL + LRU bounded.
+
+Entries are keyed by (tool, user_id, subject, args). `subject` is the entity a
+read is about (a contact id for get_contact, "" for user-wide dashboards), so
+write tools can invalidate exactly the keys they affect.
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+
+
+class ReadThroughCache:
+    """TTL + LRU cache that loads missing entries through an async loader."""
+
+    def __init__(self, ttls: dict, max_entries: int = 1024):
+        self.ttls = ttls  # tool -> seconds; tools without a positive TTL bypass the cache
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._by_user = {}  # user_id -> set of keys
+        self._generation = OrderedDict()  # user_id -> stamp of the last invalidation, LRU-bounded
+        self._stamps = itertools.count(1)
+        self._floor = 0  # generation of every user not in _generation; never decreases
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self._per_tool = {}  # tool -> {"hits", "misses"}
+
+    def _count(self, tool: str, outcome: str):
+        self._counters[outcome] += 1
+        per_tool = self._per_tool.setdefault(tool, {"hits": 0, "misses": 0})
+        per_tool[outcome] += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[1]]
+
+    async def get_or_load(self, tool: str, user_id: str, loader, subject: str = "", args: tuple = ()):
+        """Return the cached value, or await `loader()` and cache its result.
+
+        Only dict results are cached (error strings pass straight through).
+        A result is discarded if the user's keys were invalidated while it
+        was loading, so a read racing our own write never caches stale data.
+        """
+        ttl = self.ttls.get(tool, 0)
+        if ttl <= 0:
+            return await loader()
+
+        key = (tool, user_id, subject, args)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(tool, "hits")
+                return entry[1]
+            self._counters["expirations"] += 1
+            self._drop(key)
+
+        self._count(tool, "misses")
+        generation = self.generation(user_id)
+        value = await loader()
+        if isinstance(value, dict) and self.generation(user_id) == generation:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._counters["evictions"] += 1
+                self._drop(next(iter(self._entries)))
+        return value
+
+    def generation(self, user_id: str) -> int:
+        """Changes whenever any of the user's entries are invalidated."""
+        return self._generation.get(user_id, self._floor)
+
+    def invalidate(self, user_id: str, tools: tuple, subject: str | None = None):
+        """Drop a user's entries for `tools` (only those about `subject`, if given)."""
+        self._generation[user_id] = next(self._stamps)
+        self._generation.move_to_end(user_id)
+        while len(self._generation) > self.max_entries:
+            # A forgotten user reads the floor: at least their last stamp, so
+            # a load that started before that invalidation still misses
+            _, self._floor = self._generation.popitem(last=False)
+        for key in list(self._by_user.get(user_id, ())):
+            if key[0] in tools and (subject is None or key[2] == subject):
+                self._drop(key)
+                self._counters["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> dict:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / lookups * 100, 1) if lookups else 0,
+            "size": len(self._entries),
+            "generations": len(self._generation),
+            "max_entries": self.max_entries,
+            "ttls": dict(self.ttls),
+            "by_tool": {tool: dict(c) for tool, c in self._per_tool.items()},
+        }
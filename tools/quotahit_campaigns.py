@@ -0,0 +1,414 @@
+"""
+QuotaHit campaign execution — works through a campaign's contacts in the background.
+
+execute_campaign hands a campaign to CampaignEngine, which streams the
+matching contacts in id-ordered keyset pages (the next page is fetched while
+the current one is processed) and runs each through a processor coroutine:
+at most `concurrency` at once, paced by a token bucket at `rate` contacts per
+second. The default processor, outreach(), renders the campaign's message
+for the contact and queues it as a follow_up_messages row for the dispatcher
+(quotahit_dispatch); opted-out contacts and contacts without an address are
+skipped.
+
+Progress is checkpointed, not recorded per contact. Outcomes land in a
+reorder buffer, and the checkpoint (the id below which every contact is done,
+plus outcome counts) advances only over the contiguous done prefix. Every
+`checkpoint_every` contacts or `checkpoint_seconds`, one write inserts the
+queued follow-ups in bulk, then a second sets completed_contacts and the
+checkpoint. A restarted run resumes after the checkpoint. The few contacts
+past it are processed again, which is harmless: follow-up ids derive from
+(campaign, contact), so a repeat insert is ignored.
+
+A run holds a lease on its campaign row (runner_id, renewed through
+heartbeat_at by every checkpoint), so one process works a campaign at a time.
+The lease of a crashed process expires after `lease_seconds`, and the next
+execute_campaign resumes from its checkpoint. Checkpoint writes also require
+status 'active', so pausing the campaign elsewhere stops the run at its next
+checkpoint.
+"""
+
+import asyncio
+import contextvars
+import logging
+import re
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from quotahit_dispatch import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_CONTACT_COLUMNS = "id, first_name, last_name, email, phone, company, title, deal_stage, do_not_email, do_not_call"
+OUTREACH_NAMESPACE = uuid.UUID("a3c1d7e2-6f4b-4e0a-8d5c-2b9f1e7a4c63")
+INSERT_CHUNK = 500  # follow-up rows per insert
+THROUGHPUT_WINDOW = 30  # seconds of completions behind live throughput
+MAX_FINISHED_RUNS = 100  # finished runs kept for campaign_progress
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def render(template: str, contact: dict) -> str:
+    """Fill {{first_name}}-style placeholders from contact columns ({{name}} is the full name)."""
+    def value(match):
+        key = match.group(1)
+        if key == "name":
+            return f"{contact.get('first_name') or ''} {contact.get('last_name') or ''}".strip()
+        return str(contact.get(key) or "")
+    return _PLACEHOLDER.sub(value, template or "")
+
+
+async def outreach(campaign: dict, contact: dict) -> tuple[str, dict | None]:
+    """Default processor: ("queued", follow-up row) for the contact, or (skip reason, None)."""
+    message = campaign.get("message") or {}
+    channel = message.get("channel") or "email"
+    if contact.get("do_not_email" if channel == "email" else "do_not_call"):
+        return "opted_out", None
+    if not contact.get("email" if channel == "email" else "phone"):
+        return "no_address", None
+    return "queued", {
+        "id": str(uuid.uuid5(OUTREACH_NAMESPACE, f"{campaign['id']}:{contact['id']}")),
+        "user_id": campaign["user_id"],
+        "contact_id": contact["id"],
+        "channel": channel,
+        "subject": render(message.get("subject"), contact) or None,
+        "body": render(message.get("body"), contact),
+        "send_at": _now().isoformat(),
+        "metadata": {
+            "contact_email": contact.get("email"),
+            "contact_phone": contact.get("phone"),
+            "campaign_id": campaign["id"],
+            "source": "campaign",
+        },
+    }
+
+
+async def _prefetch(pages):
+    """Iterate an async page iterator one page ahead, so fetching overlaps processing."""
+    queue = asyncio.Queue(maxsize=1)
+
+    async def fill():
+        try:
+            async for page in pages:
+                await queue.put(page)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.get_running_loop().create_task(fill())
+    try:
+        while (page := await queue.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        task.cancel()
+
+
+class _LeaseLost(Exception):
+    """The campaign was paused, completed or taken over by another runner."""
+
+
+class CampaignRun:
+    """State of one campaign being worked by this process."""
+
+    def __init__(self, campaign: dict, total: int, concurrency: int, rate: float):
+        checkpoint = campaign.get("checkpoint") or {}
+        self.campaign_id = campaign["id"]
+        self.user_id = campaign["user_id"]
+        self.total = total
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.status = "running"  # then completed, stopped, paused or failed
+        self.error = None
+        self.after_id = checkpoint.get("after_id")  # done-prefix watermark
+        self.completed = (campaign.get("completed_contacts") or 0) if self.after_id else 0
+        self.outcomes = dict(checkpoint.get("outcomes") or {}) if self.after_id else {}
+        self.resumed_from = self.completed if self.after_id else None
+        self.committed = self.completed
+        self.checkpoints = 0
+        self.checkpointed_at = None
+        self.in_flight = 0
+        self.task = None
+        self.lease_lost = False
+        self._started = time.monotonic()
+        self._started_at = _now()
+        self._next_seq = 0  # next sequence number to hand out
+        self._watermark_seq = 0  # lowest sequence number not yet done
+        self._done = {}  # seq -> (contact id, outcome), done past the watermark
+        self._rows = []  # follow-up rows not yet written
+        self._window = deque()  # [second, completions]
+        self._last_write = time.monotonic()
+        self._due = asyncio.Event()
+        self._closing = False
+
+    def finish(self, seq: int, contact_id: str, outcome: str, row: dict | None, checkpoint_every: int):
+        """Record a processed contact and advance the watermark over the done prefix."""
+        if row is not None:
+            self._rows.append(row)
+        self._done[seq] = (contact_id, outcome)
+        while self._watermark_seq in self._done:
+            self.after_id, outcome = self._done.pop(self._watermark_seq)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.completed += 1
+            self._watermark_seq += 1
+        second = int(time.monotonic())
+        if self._window and self._window[-1][0] == second:
+            self._window[-1][1] += 1
+        else:
+            self._window.append([second, 1])
+        if self.completed - self.committed >= checkpoint_every:
+            self._due.set()
+
+    def throughput(self) -> float:
+        """Contacts per second over the last THROUGHPUT_WINDOW seconds."""
+        now = time.monotonic()
+        while self._window and self._window[0][0] < now - THROUGHPUT_WINDOW:
+            self._window.popleft()
+        span = min(THROUGHPUT_WINDOW, now - self._started)
+        return sum(n for _, n in self._window) / span if span > 0 else 0.0
+
+    def progress(self) -> dict:
+        processed = self.completed + len(self._done)
+        rate = self.throughput() if self.status == "running" else 0.0
+        remaining = max(0, self.total - processed)
+        eta = remaining / rate if rate and self.status == "running" else None
+        return {
+            "campaign_id": self.campaign_id,
+            "status": self.status,
+            "live": True,
+            "total_contacts": self.total,
+            "processed": processed,
+            "checkpointed": self.committed,
+            "in_flight": self.in_flight,
+            "percent": round(min(100.0, 100 * processed / self.total), 1) if self.total else None,
+            "outcomes": dict(self.outcomes),
+            "throughput_per_second": round(rate, 2),
+            "eta_seconds": round(eta) if eta is not None else None,
+            "eta": (_now() + timedelta(seconds=eta)).isoformat() if eta is not None else None,
+            "elapsed_seconds": round(time.monotonic() - self._started, 1),
+            "started_at": self._started_at.isoformat(),
+            "resumed_from": self.resumed_from,
+            "concurrency": self.concurrency,
+            "rate": self.bucket.rate or None,
+            "rate_waits": self.bucket.waits,
+            "checkpoints": self.checkpoints,
+            "checkpointed_at": self.checkpointed_at,
+            "error": self.error,
+        }
+
+
+class CampaignEngine:
+    """Runs active campaigns in the background, one task per campaign."""
+
+    def __init__(
+        self,
+        get_client,
+        process=outreach,
+        concurrency: int = 8,
+        rate: float = 0.0,
+        checkpoint_every: int = 200,
+        checkpoint_seconds: float = 2.0,
+        lease_seconds: int = 60,
+    ):
+        self._get_client = get_client
+        self.process = process
+        self.concurrency = concurrency
+        self.rate = rate
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.lease_seconds = lease_seconds
+        self.runner_id = str(uuid.uuid4())
+        self._runs = {}  # campaign_id -> CampaignRun, oldest first
+        self._counters = {"started": 0, "resumed": 0, "processed": 0, "checkpoints": 0, "lease_lost": 0}
+
+    def run(self, campaign_id: str) -> CampaignRun | None:
+        return self._runs.get(campaign_id)
+
+    @property
+    def running(self) -> int:
+        return sum(1 for r in self._runs.values() if r.status == "running")
+
+    async def start(self, campaign: dict, contacts, total: int, concurrency: int = 0, rate: float = 0.0) -> CampaignRun | None:
+        """Take the campaign's lease and work it in the background.
+
+        `contacts(after_id)` returns an async iterator of contact pages (with
+        CAMPAIGN_CONTACT_COLUMNS) in id order, starting after `after_id`.
+        Returns None if another live runner holds the lease.
+        """
+        current = self._runs.get(campaign["id"])
+        if current is not None and current.status == "running":
+            return current
+        claimed = await self._claim(campaign, total)
+        if claimed is None:
+            return None
+        run = CampaignRun(claimed, total, concurrency or self.concurrency, rate or self.rate)
+        self._runs.pop(run.campaign_id, None)
+        self._runs[run.campaign_id] = run
+        finished = [cid for cid, r in self._runs.items() if r.status != "running"]
+        for cid in finished[:max(0, len(finished) - MAX_FINISHED_RUNS)]:
+            del self._runs[cid]
+        self._counters["resumed" if run.resumed_from is not None else "started"] += 1
+        # Fresh context: the run must not inherit the calling tool's context vars
+        loop = asyncio.get_running_loop()
+        run.task = contextvars.Context().run(loop.create_task, self._execute(run, claimed, contacts))
+        return run
+
+    async def _claim(self, campaign: dict, total: int) -> dict | None:
+        """Set the campaign active under this runner if no other runner's lease is live."""
+        sb = await self._get_client()
+        now = _now()
+        stale = (now - timedelta(seconds=self.lease_seconds)).isoformat()
+        update = {"status": "active", "runner_id": self.runner_id, "heartbeat_at": now.isoformat(), "total_contacts": total}
+        if not campaign.get("started_at"):
+            update["started_at"] = now.isoformat()
+        result = (
+            await sb.table("campaigns")
+            .update(update)
+            .eq("id", campaign["id"])
+            .eq("user_id", campaign["user_id"])
+            .or_(f'runner_id.is.null,runner_id.eq.{self.runner_id},heartbeat_at.lt."{stale}"')
+            .execute()
+        )
+        return result.data[0] if result.data else None
+
+    async def _execute(self, run: CampaignRun, campaign: dict, contacts):
+        committer = asyncio.get_running_loop().create_task(self._commit_loop(run))
+        final = {"runner_id": None}  # released, so a restart can resume at once
+        try:
+            await self._work(run, campaign, contacts)
+            status = "completed"
+            final = {"status": "completed", "completed_at": _now().isoformat(), "runner_id": None}
+        except asyncio.CancelledError:
+            status = "paused" if run.lease_lost else "stopped"
+            if run.lease_lost:
+                run.error = "campaign was paused, completed or taken over by another runner"
+        except Exception as e:
+            logger.exception("Campaign %s failed", run.campaign_id)
+            status, run.error = "failed", str(e)
+        run._closing = True
+        run._due.set()
+        await asyncio.gather(committer, return_exceptions=True)
+        if not run.lease_lost:
+            try:
+                await self._commit(run, final)
+            except Exception as e:
+                logger.warning("Final checkpoint for campaign %s failed: %s", run.campaign_id, e)
+                status, run.error = "failed", run.error or str(e)
+        run.status = status
+
+    async def _work(self, run: CampaignRun, campaign: dict, contacts):
+        slots = asyncio.Semaphore(run.concurrency)
+        tasks = set()
+        loop = asyncio.get_running_loop()
+
+        async def process(seq: int, contact: dict):
+            try:
+                outcome, row = await self.process(campaign, contact)
+            except Exception as e:
+                logger.warning("Campaign %s: contact %s failed: %s", run.campaign_id, contact.get("id"), e)
+                outcome, row = "failed", None
+            finally:
+                slots.release()
+                run.in_flight -= 1
+            run.finish(seq, contact["id"], outcome, row, self.checkpoint_every)
+            self._counters["processed"] += 1
+
+        try:
+            async for page in _prefetch(contacts(run.after_id)):
+                for contact in page:
+                    await slots.acquire()
+                    await run.bucket.acquire()
+                    seq = run._next_seq
+                    run._next_seq += 1
+                    run.in_flight += 1
+                    task = loop.create_task(process(seq, contact))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _commit_loop(self, run: CampaignRun):
+        while not run._closing:
+            try:
+                await asyncio.wait_for(run._due.wait(), self.checkpoint_seconds)
+            except asyncio.TimeoutError:
+                pass
+            run._due.clear()
+            if run._closing:
+                return
+            try:
+                await self._commit(run)
+            except _LeaseLost:
+                logger.warning("Campaign %s is no longer active under this runner; stopping", run.campaign_id)
+                run.lease_lost = True
+                self._counters["lease_lost"] += 1
+                run.task.cancel()
+                return
+            except Exception as e:
+                logger.warning("Checkpoint for campaign %s failed, will retry: %s", run.campaign_id, e)
+
+    async def _commit(self, run: CampaignRun, final: dict | None = None):
+        """Insert queued follow-ups, then checkpoint the watermark (plus `final` columns)."""
+        quiet = time.monotonic() - run._last_write < self.lease_seconds / 4
+        if final is None and not run._rows and run.completed == run.committed and quiet:
+            return
+        # Snapshot together: every row of a contact below the watermark is in `rows`
+        rows, run._rows = run._rows, []
+        completed, checkpoint = run.completed, {"after_id": run.after_id, "outcomes": dict(run.outcomes)}
+        if run.error:
+            checkpoint["error"] = run.error
+        sb = await self._get_client()
+        try:
+            for start in range(0, len(rows), INSERT_CHUNK):
+                await sb.table("follow_up_messages").upsert(
+                    rows[start:start + INSERT_CHUNK], on_conflict="id", ignore_duplicates=True, returning="minimal"
+                ).execute()
+        except BaseException:
+            run._rows[:0] = rows  # written again next time; repeats are ignored
+            raise
+        now = _now().isoformat()
+        result = (
+            await sb.table("campaigns")
+            .update({"completed_contacts": completed, "checkpoint": checkpoint, "heartbeat_at": now, **(final or {})})
+            .eq("id", run.campaign_id)
+            .eq("runner_id", self.runner_id)
+            .eq("status", "active")
+            .execute()
+        )
+        if not result.data:
+            raise _LeaseLost(run.campaign_id)
+        run.committed = completed
+        run.checkpoints += 1
+        run.checkpointed_at = now
+        run._last_write = time.monotonic()
+        self._counters["checkpoints"] += 1
+
+    async def stop(self, timeout: float = 30.0):
+        """Stop every run, checkpointing where each got to and releasing its lease."""
+        runs = [r for r in self._runs.values() if r.task is not None and not r.task.done()]
+        for run in runs:
+            run.task.cancel()
+        if not runs:
+            return
+        _, pending = await asyncio.wait([r.task for r in runs], timeout=timeout)
+        if pending:
+            logger.warning("%d campaign runs still checkpointing after %.0fs", len(pending), timeout)
+        for run in runs:
+            if run.task.cancelled():  # cancelled before it started, so nothing ran its cleanup
+                run.status = "stopped"
+                try:
+                    await self._commit(run, {"runner_id": None})
+                except Exception as e:
+                    logger.warning("Releasing campaign %s failed: %s", run.campaign_id, e)
+
+    def stats(self) -> dict:
+        return {**self._counters, "runner_id": self.runner_id, "running": self.running}
@@ -0,0 +1,323 @@
+"""
+QuotaHit contact deduplication — blocking keys instead of pairwise comparison.
+
+Each contact is filed under up to three blocking keys:
+
+  - its normalized email (lowercased, "+tag" dropped, dots removed for Gmail),
+  - its email domain plus normalized last name (company domains only, since a
+    free-mail domain would put every Smith on gmail.com in one block),
+  - its phone number in E.164 form.
+
+Only contacts that share a block are scored against each other, so a full
+scan costs the sum of squared block sizes, which is close to linear for real
+data. Blocks larger than `max_block` (a shared switchboard number, a role
+address) are skipped and reported instead of compared. A single new contact
+is checked in O(block size) by looking up its own keys.
+"""
+
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+DEDUPE_COLUMNS = "id, first_name, last_name, email, phone, company"
+
+FREE_EMAIL_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "msn.com", "icloud.com", "me.com", "aol.com", "protonmail.com", "proton.me",
+    "gmx.com", "gmx.de", "mail.com", "yandex.com", "zoho.com",
+})
+
+# Signal weights; a pair scoring at least the caller's min_score is a duplicate
+EMAIL_WEIGHT = 0.55
+PHONE_WEIGHT = 0.35
+DOMAIN_WEIGHT = 0.2
+NAME_WEIGHT = 0.3
+COMPANY_WEIGHT = 0.05
+
+_NON_DIGIT = re.compile(r"\D")
+_EXTENSION = re.compile(r"\s*(?:ext\.?|x|#)\s*\d+\s*$", re.IGNORECASE)
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_COMPANY_SUFFIX = re.compile(r"\b(?:inc|llc|ltd|gmbh|corp|corporation|co|company|limited)\b")
+
+
+def normalize_email(email) -> str:
+    """Canonical mailbox ("" if not an address): lowercased, "+tag" dropped, Gmail dots removed."""
+    local, at, domain = (email or "").strip().lower().rpartition("@")
+    if not at or "." not in domain:
+        return ""
+    local = local.split("+", 1)[0]
+    if domain in ("gmail.com", "googlemail.com"):
+        local, domain = local.replace(".", ""), "gmail.com"
+    return f"{local}@{domain}" if local else ""
+
+
+def normalize_phone(phone, country_code: str = "1") -> str:
+    """E.164 form ("+14155550123") of a free-form number, or "" if implausible.
+
+    Numbers without a "+" or "00" international prefix are national: the
+    trunk "0" is dropped and `country_code` prepended.
+    """
+    phone = _EXTENSION.sub("", (phone or "").strip())
+    digits = _NON_DIGIT.sub("", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif not (country_code == "1" and len(digits) == 11 and digits.startswith("1")):
+        digits = country_code + digits.lstrip("0")
+    return "+" + digits if 8 <= len(digits) <= 15 else ""
+
+
+@lru_cache(maxsize=65536)
+def _name(value) -> str:
+    return _NON_ALNUM.sub("", (value or "").lower())
+
+
+@lru_cache(maxsize=65536)
+def _company(value) -> str:
+    return _NON_ALNUM.sub("", _COMPANY_SUFFIX.sub("", (value or "").lower()))
+
+
+@lru_cache(maxsize=65536)
+def _first_name_similarity(a: str, b: str) -> float:
+    """1.0 for equal names, 0.9 for a prefix (initial, short form), else a fuzzy ratio >= 0.75.
+
+    Memoized: first names repeat a lot, and SequenceMatcher is the costliest step.
+    """
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if a.startswith(b) or b.startswith(a):
+        return 0.9
+    if 2 * min(len(a), len(b)) < 0.75 * (len(a) + len(b)):  # ratio can't reach 0.75
+        return 0.0
+    ratio = SequenceMatcher(None, a, b).ratio()
+    return ratio if ratio >= 0.75 else 0.0
+
+
+class _Contact:
+    __slots__ = ("id", "email", "domain", "first", "last", "phone", "company", "keys", "summary")
+
+    def __init__(self, row: dict, country_code: str):
+        self.id = row.get("id")
+        self.email = normalize_email(row.get("email"))
+        domain = self.email.rpartition("@")[2]
+        self.domain = domain if domain not in FREE_EMAIL_DOMAINS else ""  # company domains only
+        self.first = _name(row.get("first_name"))
+        self.last = _name(row.get("last_name"))
+        self.phone = normalize_phone(row.get("phone"), country_code) if row.get("phone") else ""
+        self.company = _company(row.get("company"))
+        keys = []
+        if self.email:
+            keys.append("e:" + self.email)
+        if self.last and self.domain:
+            keys.append(f"d:{self.domain}|{self.last}")
+        if self.phone:
+            keys.append("p:" + self.phone)
+        self.keys = keys
+        self.summary = {
+            "id": self.id,
+            "name": f"{row.get('first_name') or ''} {row.get('last_name') or ''}".strip(),
+            "email": row.get("email"),
+            "phone": row.get("phone"),
+            "company": row.get("company"),
+        }
+
+
+REASONS = ("email", "phone", "domain", "name", "company")
+
+
+def _score(a: _Contact, b: _Contact) -> tuple[float, int]:
+    """Duplicate likelihood in [0, 1] and a bitmask of the REASONS that agreed."""
+    score, mask = 0.0, 0
+    if a.email and a.email == b.email:
+        score += EMAIL_WEIGHT
+        mask |= 1
+    if a.phone and a.phone == b.phone:
+        score += PHONE_WEIGHT
+        mask |= 2
+    if a.domain and a.domain == b.domain:
+        score += DOMAIN_WEIGHT
+        mask |= 4
+    if a.last and a.last == b.last:
+        first = _first_name_similarity(a.first, b.first)
+        if first:
+            score += NAME_WEIGHT * first
+            mask |= 8
+    if a.company and a.company == b.company:
+        score += COMPANY_WEIGHT
+        mask |= 16
+    return min(score, 1.0), mask
+
+
+def _match(score: float, mask: int) -> dict:
+    return {"score": round(score, 3), "reasons": [r for i, r in enumerate(REASONS) if mask >> i & 1]}
+
+
+class DedupeIndex:
+    """Blocking index over one user's contacts."""
+
+    def __init__(self, max_block: int = 100, country_code: str = "1"):
+        self.max_block = max_block
+        self.country_code = country_code
+        self._contacts = {}  # contact_id -> _Contact
+        self._blocks = {}  # blocking key -> {contact_id: None} (insertion-ordered set)
+
+    def __len__(self) -> int:
+        return len(self._contacts)
+
+    def add(self, contact: dict):
+        """Index (or re-index) a contact row with DEDUPE_COLUMNS."""
+        self.remove(contact["id"])
+        entry = _Contact(contact, self.country_code)
+        self._contacts[entry.id] = entry
+        for key in entry.keys:
+            self._blocks.setdefault(key, {})[entry.id] = None
+
+    def remove(self, contact_id: str):
+        entry = self._contacts.pop(contact_id, None)
+        if entry is None:
+            return
+        for key in entry.keys:
+            block = self._blocks[key]
+            del block[contact_id]
+            if not block:
+                del self._blocks[key]
+
+    def matches(self, contact: dict, min_score: float) -> list[dict]:
+        """Indexed contacts that look like `contact`, best first (its own id excluded)."""
+        probe = _Contact(contact, self.country_code)
+        seen, found = {probe.id}, []
+        for key in probe.keys:
+            for other_id in self._blocks.get(key, ()):
+                if other_id in seen:
+                    continue
+                seen.add(other_id)
+                other = self._contacts[other_id]
+                score, mask = _score(probe, other)
+                if score >= min_score:
+                    found.append({**other.summary, **_match(score, mask)})
+        found.sort(key=lambda m: -m["score"])
+        return found
+
+    def duplicates(self, min_score: float, limit: int | None = None) -> tuple[list[dict], dict]:
+        """Duplicate groups (pairs at or above min_score, joined transitively), strongest
+        first and at most `limit` of them, plus scan stats."""
+        contacts, pairs = self._contacts, []
+        stats = {"contacts": len(contacts), "blocks": 0, "skipped_blocks": 0, "comparisons": 0, "groups_found": 0}
+        for key, block in self._blocks.items():
+            if len(block) < 2:
+                continue
+            if len(block) > self.max_block:
+                stats["skipped_blocks"] += 1
+                continue
+            stats["blocks"] += 1
+            entries = [contacts[cid] for cid in block]
+            for i, a in enumerate(entries):
+                for b in entries[i + 1:]:
+                    # A pair sharing several keys is scored only in the block of its first one
+                    for shared in a.keys:
+                        if shared in b.keys:
+                            break
+                    if shared != key:
+                        continue
+                    stats["comparisons"] += 1
+                    score, mask = _score(a, b)
+                    if score >= min_score:
+                        pairs.append((score, a.id, b.id, mask))
+
+        # Union-find over matched pairs
+        parent = {}
+
+        def root(x):
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+
+        for _, a, b, _ in pairs:
+            ra, rb = root(a), root(b)
+            if ra != rb:
+                parent[rb] = ra
+
+        groups = {}
+        for pair in pairs:
+            group = groups.setdefault(root(pair[1]), [])
+            group.append(pair)
+        stats["groups_found"] = len(groups)
+
+        ranked = sorted(groups.values(), key=lambda g: -max(p[0] for p in g))
+        result = []
+        for group in ranked[:limit]:
+            group.sort(key=lambda p: -p[0])
+            members = [contacts[cid].summary for cid in dict.fromkeys(c for p in group for c in p[1:3])]
+            keep = max(members, key=lambda c: sum(1 for v in c.values() if v))
+            result.append({
+                "score": round(group[0][0], 3),
+                "suggested_primary": keep["id"],
+                "contacts": members,
+                "pairs": [{"a": a, "b": b, **_match(score, mask)} for score, a, b, mask in group],
+            })
+        return result, stats
+
+
+# Columns merge_fields fills on the primary contact when it has no value
+FILL_COLUMNS = (
+    "last_name", "email", "phone", "company", "title",
+    "expected_close_date", "next_follow_up_at", "external_id", "external_provider",
+)
+
+
+def merge_fields(primary: dict, duplicates: list[dict]) -> dict:
+    """Column updates that fold `duplicates` into `primary` (only changed columns).
+
+    Blank columns are filled from the first duplicate that has them; scores and
+    deal values take the maximum; tags, custom fields and notes are combined;
+    an opt-out on any record is kept; enrichment is adopted if the primary
+    has none.
+    """
+    updates = {}
+    for column in FILL_COLUMNS:
+        if primary.get(column) in (None, ""):
+            value = next((d[column] for d in duplicates if d.get(column) not in (None, "")), None)
+            if value is not None:
+                updates[column] = value
+
+    for column in ("lead_score", "deal_value"):
+        values = [v for v in (r.get(column) for r in (primary, *duplicates)) if v is not None]
+        if values and max(values, key=float) != primary.get(column):
+            updates[column] = max(values, key=float)
+
+    contacted = [r["last_contacted_at"] for r in (primary, *duplicates) if r.get("last_contacted_at")]
+    if contacted and max(contacted) != primary.get("last_contacted_at"):
+        updates["last_contacted_at"] = max(contacted)
+
+    for column in ("do_not_call", "do_not_email"):
+        if not primary.get(column) and any(d.get(column) for d in duplicates):
+            updates[column] = True
+
+    tags = list(dict.fromkeys(t for r in (primary, *duplicates) for t in r.get("tags") or ()))
+    if tags != list(primary.get("tags") or ()):
+        updates["tags"] = tags
+
+    custom = {}
+    for r in (*reversed(duplicates), primary):
+        custom.update(r.get("custom_fields") or {})
+    if custom != (primary.get("custom_fields") or {}):
+        updates["custom_fields"] = custom
+
+    notes = [primary["notes"]] if primary.get("notes") else []
+    for d in duplicates:
+        if d.get("notes") and d["notes"] not in notes:
+            notes.append(d["notes"])
+    if len(notes) > (1 if primary.get("notes") else 0):
+        updates["notes"] = "\n\n".join(notes)
+
+    if primary.get("enrichment_status") != "enriched":
+        enriched = next((d for d in duplicates if d.get("enrichment_status") == "enriched"), None)
+        if enriched is not None:
+            for column in ("enrichment_status", "enrichment_data", "enriched_at"):
+                updates[column] = enriched.get(column)
+
+    return updates
@@ -0,0 +1,471 @@
+"""
+QuotaHit follow-up dispatcher — sends due `follow_up_messages`.
+
+A claim loop takes due messages (status 'pending', send_at <= now) in batches
+through mcp_claim_followups, which walks idx_follow_up_messages_pending with
+FOR UPDATE SKIP LOCKED and flips the rows to 'sending' under this
+dispatcher's claim id, so several dispatcher processes can run side by side.
+(Run it instead of the web app's sendDueMessages cron, which reads pending
+rows without claiming them.) Claimed messages go to a per-channel queue
+served by that channel's own worker pool and token-bucket rate limit, so a
+throttled SMS provider never holds up email. Outcomes are written back in
+bulk: one mcp_finish_followups call per `batch_size` results or
+`mark_interval` seconds.
+
+Sends are idempotent. A message is sent only by the dispatcher holding its
+claim, and outcomes are written only while that claim still holds. The
+message id goes to the provider as an idempotency key (where the provider
+supports one). A claim left behind by a crashed process is taken over after
+`lease_seconds` and counts as an attempt. Transient failures go back to
+'pending' with exponential backoff until `max_attempts`; permanent ones
+(SendError(permanent=True)) fail at once.
+
+Backends implement ChannelBackend.send(). ResendEmail and TwilioMessaging
+talk to the providers the web app uses; FakeChannel records deliveries in
+memory for local runs and benchmarks.
+"""
+
+import asyncio
+import contextvars
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ("email", "sms", "whatsapp")
+FINISH_CHUNK = 1000  # outcomes per mcp_finish_followups call
+
+
+class SendError(Exception):
+    """A send failed; permanent=True means retrying can't help (no address, rejected recipient)."""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def recipient(message: dict) -> str:
+    """Address stored on the message when it was created (metadata contact_email / contact_phone)."""
+    key = "contact_email" if message.get("channel") == "email" else "contact_phone"
+    address = (message.get("metadata") or {}).get(key)
+    if not address:
+        raise SendError(f"No {key.split('_')[1]} for contact", permanent=True)
+    return address
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ─── Channel Backends ───────────────────────────────────────────────────────
+
+
+class ChannelBackend:
+    """Delivers messages on `channels`.
+
+    send() gets a claimed follow_up_messages row and returns the provider's
+    message id, raising SendError (any other exception counts as transient)
+    on failure. `rate` (messages/second, 0 = unlimited) and `concurrency`
+    bound what the dispatcher asks of it on each channel.
+    """
+
+    channels = ()
+    rate = 0.0
+    concurrency = 10
+
+    async def send(self, message: dict) -> str | None:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class _HttpBackend(ChannelBackend):
+    """Backend calling a provider's REST API over its own keep-alive httpx pool."""
+
+    def __init__(self, rate: float, concurrency: int, timeout: float):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._http = None
+
+    def _client(self):
+        if self._http is None:
+            try:
+                import httpx
+            except ImportError:
+                raise RuntimeError("httpx not installed. Run: pip3 install httpx")
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency * len(self.channels)),
+            )
+        return self._http
+
+    @staticmethod
+    def _check(response, provider: str):
+        """Raise SendError for an error response; 4xx other than timeouts/throttling is permanent."""
+        if response.status_code < 300:
+            return
+        permanent = 400 <= response.status_code < 500 and response.status_code not in (408, 409, 429)
+        raise SendError(f"{provider} API error ({response.status_code}): {response.text[:300]}", permanent)
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class ResendEmail(_HttpBackend):
+    """Email via Resend; the message id is sent as the Idempotency-Key."""
+
+    channels = ("email",)
+
+    def __init__(self, api_key: str, sender: str, rate: float = 2.0, concurrency: int = 10, timeout: float = 15.0):
+        super().__init__(rate, concurrency, timeout)
+        self.api_key = api_key
+        self.sender = sender
+
+    async def send(self, message: dict) -> str | None:
+        response = await self._client().post(
+            "https://api.resend.com/emails",
+            headers={"Authorization": f"Bearer {self.api_key}", "Idempotency-Key": message["id"]},
+            json={
+                "from": self.sender,
+                "to": [recipient(message)],
+                "subject": message.get("subject") or "Following up on our conversation",
+                "html": message["body"].replace("\n", "<br>"),
+            },
+        )
+        self._check(response, "Resend")
+        return response.json().get("id")
+
+
+class TwilioMessaging(_HttpBackend):
+    """SMS and WhatsApp via Twilio's Messages API."""
+
+    channels = ("sms", "whatsapp")
+
+    def __init__(self, account_sid: str, auth_token: str, sender: str, whatsapp_sender: str = "",
+                 rate: float = 1.0, concurrency: int = 10, timeout: float = 15.0):
+        super().__init__(rate, concurrency, timeout)
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.sender = sender
+        self.whatsapp_sender = whatsapp_sender or sender
+
+    async def send(self, message: dict) -> str | None:
+        to, sender = recipient(message), self.sender
+        if message["channel"] == "whatsapp":
+            to, sender = f"whatsapp:{to}", f"whatsapp:{self.whatsapp_sender}"
+        response = await self._client().post(
+            f"https://api.twilio.com/2010-04-01/Accounts/{self.account_sid}/Messages.json",
+            auth=(self.account_sid, self.auth_token),
+            data={"To": to, "From": sender, "Body": message["body"]},
+        )
+        self._check(response, "Twilio")
+        return response.json().get("sid")
+
+
+class FakeChannel(ChannelBackend):
+    """In-memory backend for every channel: records deliveries, counts repeat
+    deliveries of a message id, and can add latency and random failures."""
+
+    channels = CHANNELS
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, permanent_failure_rate: float = 0.0,
+                 rate: float = 0.0, concurrency: int = 50, seed: int | None = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.permanent_failure_rate = permanent_failure_rate
+        self.rate = rate
+        self.concurrency = concurrency
+        self.delivered = {}  # message id -> message
+        self.duplicates = 0
+        self.attempts = 0
+        self._random = random.Random(seed)
+
+    async def send(self, message: dict) -> str | None:
+        self.attempts += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        recipient(message)
+        roll = self._random.random()
+        if roll < self.permanent_failure_rate:
+            raise SendError("Fake permanent failure", permanent=True)
+        if roll < self.permanent_failure_rate + self.failure_rate:
+            raise SendError("Fake transient failure")
+        if message["id"] in self.delivered:
+            self.duplicates += 1
+        self.delivered[message["id"]] = message
+        return f"fake-{message['id']}"
+
+
+class TokenBucket:
+    """Async token bucket: `rate` sends per second (0 = unlimited), bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waits = 0
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self.waits += 1
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# ─── Dispatcher ─────────────────────────────────────────────────────────────
+
+
+class Dispatcher:
+    """Claims due follow-up messages and sends them through per-channel worker pools."""
+
+    def __init__(
+        self,
+        get_client,
+        backends: dict,
+        rates: dict | None = None,
+        batch_size: int = 200,
+        poll_interval: float = 2.0,
+        lease_seconds: int = 300,
+        max_attempts: int = 3,
+        retry_backoff: float = 60.0,
+        mark_interval: float = 0.5,
+    ):
+        self._get_client = get_client  # async () -> supabase client
+        self.backends = backends  # channel -> ChannelBackend
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.mark_interval = mark_interval
+        self.claim_id = str(uuid.uuid4())
+        rates = rates or {}
+        self._buckets = {ch: TokenBucket(rates.get(ch, b.rate)) for ch, b in backends.items()}
+        self._slots = {ch: asyncio.Semaphore(b.concurrency) for ch, b in backends.items()}
+        self._queues = {}
+        self._results = []  # outcomes waiting for the next bulk write
+        self._tasks = []
+        self._wake = None
+        self._marked = None
+        self._started = None
+        self._counters = {
+            "claimed": 0, "claim_calls": 0, "sent": 0, "failed": 0, "retried": 0,
+            "released": 0, "finish_calls": 0, "finish_errors": 0, "claim_errors": 0,
+        }
+        self._per_channel = {ch: {"sent": 0, "failed": 0, "retried": 0} for ch in backends}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # ── Claim / finish ──
+
+    async def _claim(self, limit: int, channels: list[str], ids: list[str] | None = None) -> list[dict]:
+        sb = await self._get_client()
+        rows = (
+            await sb.rpc("mcp_claim_followups", {
+                "p_claim_id": self.claim_id,
+                "p_limit": limit,
+                "p_channels": channels,
+                "p_lease_seconds": self.lease_seconds,
+                "p_ids": ids,
+            }).execute()
+        ).data or []
+        self._counters["claim_calls"] += 1
+        self._counters["claimed"] += len(rows)
+        return rows
+
+    async def _finish(self, results: list[dict]):
+        sb = await self._get_client()
+        for start in range(0, len(results), FINISH_CHUNK):
+            await sb.rpc("mcp_finish_followups", {
+                "p_claim_id": self.claim_id,
+                "p_results": results[start:start + FINISH_CHUNK],
+            }).execute()
+            self._counters["finish_calls"] += 1
+
+    # ── Sending ──
+
+    def _outcome(self, message: dict, status: str, error: str | None = None, **extra) -> dict:
+        counter = {"sent": "sent", "failed": "failed", "pending": "retried"}[status]
+        self._counters[counter] += 1
+        self._per_channel[message["channel"]][counter] += 1
+        return {"id": message["id"], "status": status, "error": error, **extra}
+
+    async def _deliver(self, message: dict) -> dict:
+        """Send one claimed message (rate-limited, within its channel's concurrency) and return its outcome."""
+        channel, attempts = message["channel"], message.get("attempts") or 1
+        if attempts > self.max_attempts:
+            return self._outcome(message, "failed", f"Claim expired {self.max_attempts} times without a result")
+        async with self._slots[channel]:
+            await self._buckets[channel].acquire()
+            try:
+                await self.backends[channel].send(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                if (isinstance(e, SendError) and e.permanent) or attempts >= self.max_attempts:
+                    return self._outcome(message, "failed", error)
+                retry_at = _now() + timedelta(seconds=self.retry_backoff * 2 ** (attempts - 1))
+                return self._outcome(message, "pending", error, send_at=retry_at.isoformat())
+        return self._outcome(message, "sent", sent_at=_now().isoformat())
+
+    async def send_now(self, ids: list[str]) -> list[dict]:
+        """Claim these pending messages (due or not), send them and record the outcomes.
+
+        Returns one outcome per message claimed; ids that weren't claimable
+        (not pending, claimed elsewhere, or on a channel without a backend)
+        are simply absent.
+        """
+        rows = await self._claim(len(ids), list(self.backends), ids)
+        results = list(await asyncio.gather(*(self._deliver(m) for m in rows)))
+        if results:
+            await self._finish(results)
+        return results
+
+    # ── Background loop ──
+
+    def start(self):
+        """Start the claim loop, workers and bulk marker on the running event loop."""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._wake, self._marked = asyncio.Event(), asyncio.Event()
+        self._queues = {ch: asyncio.Queue() for ch in self.backends}
+        coros = [self._claim_loop(), self._mark_loop()]
+        for channel, backend in self.backends.items():
+            coros += [self._worker(channel) for _ in range(backend.concurrency)]
+        # Fresh context: background tasks must not inherit the calling tool's context vars
+        self._tasks = [contextvars.Context().run(loop.create_task, c) for c in coros]
+        self._started = time.monotonic()
+
+    async def _claim_loop(self):
+        loop = asyncio.get_running_loop()
+        idle_until = dict.fromkeys(self._queues, 0.0)  # channel -> no more due before this time
+        while True:
+            full = False
+            for channel, queue in self._queues.items():
+                if queue.qsize() >= self.batch_size:
+                    full = True
+                    continue
+                if loop.time() < idle_until[channel]:
+                    continue
+                limit = self.batch_size
+                if self._buckets[channel].rate:
+                    # Don't hold more than half a lease of rate-limited sends
+                    limit = min(limit, max(1, int(self._buckets[channel].rate * self.lease_seconds / 2) - queue.qsize()))
+                try:
+                    rows = await self._claim(limit, [channel])
+                except Exception as e:
+                    self._counters["claim_errors"] += 1
+                    logger.error("Claiming %s follow-ups failed: %s", channel, e)
+                    rows = []
+                for row in rows:
+                    queue.put_nowait(row)
+                if len(rows) == limit:
+                    full = True
+                else:  # backlog drained: check this channel again next poll
+                    idle_until[channel] = loop.time() + self.poll_interval
+            self._wake.clear()
+            try:
+                if full:  # more is due: claim again as soon as a queue runs low
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, channel: str):
+        queue = self._queues[channel]
+        while True:
+            message = await queue.get()
+            try:
+                if queue.qsize() < self.batch_size:
+                    self._wake.set()
+                outcome = await self._deliver(message)
+                self._results.append(outcome)  # after the await: the marker may have swapped the list
+                if len(self._results) >= self.batch_size:
+                    self._marked.set()
+            finally:
+                queue.task_done()
+
+    async def _mark_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._marked.wait(), self.mark_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._marked.clear()
+            await self._flush_results()
+
+    async def _flush_results(self):
+        """Write buffered outcomes; on failure keep them for the next round."""
+        if not self._results:
+            return
+        batch, self._results = self._results, []
+        try:
+            await self._finish(batch)
+        except Exception as e:
+            self._counters["finish_errors"] += 1
+            logger.error("Recording %d follow-up outcomes failed: %s", len(batch), e)
+            self._results = batch + self._results
+
+    async def stop(self, timeout: float = 30.0):
+        """Stop claiming, hand queued messages back, let in-flight sends finish (up to
+        `timeout`), then write every outcome and close the backends."""
+        if not self._tasks:
+            return
+        claim_loop, mark_loop, workers = self._tasks[0], self._tasks[1], self._tasks[2:]
+        claim_loop.cancel()
+        released = []
+        for queue in self._queues.values():
+            while not queue.empty():
+                message = queue.get_nowait()
+                released.append({"id": message["id"], "status": "pending", "attempts": (message.get("attempts") or 1) - 1})
+                queue.task_done()
+        self._counters["released"] += len(released)
+        self._results.extend(released)
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues.values())), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Follow-up sends still running after %.0fs; their claims will expire", timeout)
+        for task in (mark_loop, *workers):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush_results()
+        for backend in {id(b): b for b in self.backends.values()}.values():
+            await backend.close()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0
+        return {
+            **self._counters,
+            "running": self.running,
+            "queued": {ch: q.qsize() for ch, q in self._queues.items()},
+            "unrecorded": len(self._results),
+            "sent_per_minute": round(self._counters["sent"] * 60 / elapsed) if elapsed else None,
+            "channels": {
+                ch: {**counts, "rate": self._buckets[ch].rate, "rate_waits": self._buckets[ch].waits,
+                     "concurrency": self.backends[ch].concurrency}
+                for ch, counts in self._per_channel.items()
+            },
+        }
@@ -0,0 +1,550 @@
+"""
+QuotaHit lead enrichment — a local worker pool over a company-level research cache.
+
+enrich_leads queues contacts on an Enricher. A bounded pool of `workers`
+tasks takes them one at a time and looks up research for each contact's
+company through three layers:
+
+  - CompanyCache, keyed by normalized company domain (the contact's email
+    domain unless it's free mail, else its company name). Entries expire
+    after `ttl` seconds, and the cache is saved to a JSON file, so research
+    survives restarts. Dozens of contacts at one company cost one lookup.
+  - in-flight dedupe: while a company is being researched, other workers
+    asking for it wait on the same future instead of calling the provider.
+  - the ResearchProvider. PerplexityResearch asks the model the web app's
+    enrich route uses; StubResearch returns stable fake data locally, for
+    tests and benchmarks.
+
+Results are not written per contact. Patches (enrichment_data,
+enrichment_status, enriched_at) are collected and handed to the `write`
+callback in batches of `batch_size`, or every `flush_interval` seconds.
+Failed writes are retried with backoff. A job is done once every one of its
+contacts has been written, or its write has been given up on (counted as
+write_failed, not written).
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from quotahit_dedupe import FREE_EMAIL_DOMAINS, normalize_email
+
+logger = logging.getLogger(__name__)
+
+ENRICH_COLUMNS = "id, first_name, last_name, email, company, title, enrichment_status"
+MAX_JOB_ERRORS = 100  # per-contact errors kept on a job
+MAX_JOBS = 100  # finished jobs kept for polling
+
+# Second-level labels under country TLDs (acme.co.uk, acme.com.au)
+_SECOND_LEVEL = frozenset({"co", "com", "org", "net", "ac", "gov", "edu"})
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_COMPANY_SUFFIX = re.compile(r"\b(?:inc|llc|ltd|gmbh|corp|corporation|co|company|limited)\b\.?")
+
+
+def _registrable(domain: str) -> str:
+    """acme.com for mail.acme.com; keeps three labels under a country second level (acme.co.uk)."""
+    labels = domain.strip(".").removeprefix("www.").split(".")
+    keep = 3 if len(labels) >= 3 and labels[-2] in _SECOND_LEVEL and len(labels[-1]) == 2 else 2
+    return ".".join(labels[-keep:])
+
+
+def company_key(contact: dict) -> str:
+    """Cache key for a contact's company: its company email domain, else "name:<company>",
+    else "" (nothing to research)."""
+    domain = normalize_email(contact.get("email")).rpartition("@")[2]
+    if domain and domain not in FREE_EMAIL_DOMAINS:
+        return _registrable(domain)
+    name = _NON_ALNUM.sub("", _COMPANY_SUFFIX.sub("", (contact.get("company") or "").lower()))
+    return f"name:{name}" if name else ""
+
+
+# ─── Research Providers ─────────────────────────────────────────────────────
+
+
+class ResearchProvider:
+    """Researches a company. research() gets the cache key's domain ("" when the
+    company is only known by name) and the company name, and returns
+    enrichment_data in the web app's EnrichmentData shape."""
+
+    name = "provider"
+
+    async def research(self, domain: str, company: str) -> dict:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+RESEARCH_PROMPT = """You are a sales intelligence researcher. Given a company, research and return a JSON object with the following fields. Be concise and factual. If you can't find information for a field, use null.
+
+Return ONLY valid JSON, no markdown fences:
+{
+  "company_overview": "1-2 sentence company description",
+  "industry": "Industry category",
+  "company_size": "Approximate employee count or range",
+  "website": "Company website URL",
+  "linkedin_url": "Company LinkedIn URL if findable",
+  "funding": "Latest funding info or 'Unknown'",
+  "recent_news": ["Recent news item 1", "Recent news item 2"],
+  "pain_points": ["Likely pain point 1", "Likely pain point 2", "Likely pain point 3"],
+  "tech_stack": ["Technology 1", "Technology 2"],
+  "conversation_starters": ["Opener 1", "Opener 2", "Opener 3"],
+  "key_people": [{"name": "Name", "title": "Title", "insight": "Brief insight"}]
+}"""
+
+
+class PerplexityResearch(ResearchProvider):
+    """Company research with Perplexity's sonar model, directly or through OpenRouter."""
+
+    name = "perplexity"
+
+    def __init__(self, api_key: str, openrouter: bool = False, timeout: float = 60.0, max_connections: int = 10):
+        self.api_key = api_key
+        self.openrouter = openrouter
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http = None
+
+    def _client(self):
+        if self._http is None:
+            try:
+                import httpx
+            except ImportError:
+                raise RuntimeError("httpx not installed. Run: pip3 install httpx")
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout, limits=httpx.Limits(max_connections=self.max_connections)
+            )
+        return self._http
+
+    async def research(self, domain: str, company: str) -> dict:
+        target = " ".join(filter(None, (company, f"({domain})" if domain else "")))
+        url, model, headers = "https://api.perplexity.ai/chat/completions", "sonar", {}
+        if self.openrouter:
+            url, model = "https://openrouter.ai/api/v1/chat/completions", "perplexity/sonar"
+            headers["HTTP-Referer"] = "https://www.quotahit.com"
+        response = await self._client().post(
+            url,
+            headers={"Authorization": f"Bearer {self.api_key}", **headers},
+            json={
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": RESEARCH_PROMPT},
+                    {"role": "user", "content": f"Research this company: {target}"},
+                ],
+                "temperature": 0.3,
+                "max_tokens": 1500,
+            },
+        )
+        if response.status_code >= 300:
+            raise RuntimeError(f"Research API error ({response.status_code}): {response.text[:300]}")
+        content = (response.json().get("choices") or [{}])[0].get("message", {}).get("content") or ""
+        match = re.search(r"\{.*\}", content, re.S)
+        try:
+            return json.loads(match.group(0)) if match else {}
+        except json.JSONDecodeError:
+            return {"company_overview": content}
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class StubResearch(ResearchProvider):
+    """Local provider: stable made-up research per company after `latency` seconds,
+    failing at `failure_rate`. Counts calls per key, so tests can check dedupe."""
+
+    name = "stub"
+    INDUSTRIES = ("Software", "Fintech", "Healthcare", "Logistics", "Retail", "Manufacturing")
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = {}  # domain or company -> research calls
+        self._random = random.Random(seed)
+
+    async def research(self, domain: str, company: str) -> dict:
+        key = domain or company
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            raise RuntimeError("Stub research failure")
+        digest = int(hashlib.sha1(key.encode()).hexdigest(), 16)
+        name = company or domain.split(".")[0].title()
+        return {
+            "company_overview": f"{name} is a {self.INDUSTRIES[digest % 6].lower()} company.",
+            "industry": self.INDUSTRIES[digest % 6],
+            "company_size": f"{10 * (1 + digest % 50)}-{20 * (1 + digest % 50)}",
+            "website": f"https://{domain}" if domain else None,
+            "funding": "Unknown",
+            "recent_news": [],
+            "pain_points": ["Pipeline visibility", "Rep ramp time"],
+            "tech_stack": [],
+            "conversation_starters": [f"How is {name} handling outbound this quarter?"],
+            "key_people": [],
+        }
+
+
+# ─── Company Cache ──────────────────────────────────────────────────────────
+
+
+class CompanyCache:
+    """Research results by company key with a TTL and LRU bound, persisted to a JSON file."""
+
+    def __init__(self, ttl: float = 30 * 86400, max_entries: int = 50_000, path: str = ""):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()  # key -> (expires at, epoch seconds; data)
+        self._loaded = False
+        self._dirty = False
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "loaded": 0, "saves": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self):
+        """Read the cache file once (missing or unreadable files start empty)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable enrichment cache %s: %s", self.path, e)
+            return
+        now = time.time()
+        for key, (expires, data) in sorted(stored.items(), key=lambda kv: kv[1][0]):
+            if expires > now:
+                self._entries[key] = (expires, data)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._counters["loaded"] = len(self._entries)
+
+    def save(self):
+        """Write live entries to the file if anything changed (atomically, via a temp file)."""
+        if not self.path or not self._dirty:
+            return
+        now = time.time()
+        live = {k: [expires, data] for k, (expires, data) in self._entries.items() if expires > now}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp, "w") as f:
+            json.dump(live, f, separators=(",", ":"))
+        os.replace(temp, self.path)
+        self._dirty = False
+        self._counters["saves"] += 1
+
+    def get(self, key: str) -> dict | None:
+        self.load()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.time():
+            del self._entries[key]
+            self._dirty = True
+            self._counters["expired"] += 1
+            entry = None
+        if entry is None:
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._counters["hits"] += 1
+        return entry[1]
+
+    def put(self, key: str, data: dict):
+        self.load()
+        self._entries[key] = (time.time() + self.ttl, data)
+        self._entries.move_to_end(key)
+        self._dirty = True
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        return {**self._counters, "entries": len(self._entries), "ttl": self.ttl, "path": self.path or None}
+
+
+# ─── Worker Pool ────────────────────────────────────────────────────────────
+
+
+class EnrichJob:
+    """One enrich_leads call: its contacts' outcomes, complete once all are written."""
+
+    def __init__(self, user_id: str, total: int):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.total = total
+        self.counts = {"enriched": 0, "failed": 0, "write_failed": 0, "cache_hits": 0, "coalesced": 0, "researched": 0}
+        self.recorded = 0
+        self.written = 0
+        self.errors = {}  # contact id -> error
+        self.done = asyncio.Event()
+        self._started = time.monotonic()
+        self._elapsed = None
+        if not total:
+            self._finish()
+
+    def _finish(self):
+        self._elapsed = time.monotonic() - self._started
+        self.done.set()
+
+    def report(self) -> dict:
+        elapsed = self._elapsed if self._elapsed is not None else time.monotonic() - self._started
+        report = {
+            "job_id": self.id,
+            "status": "done" if self.done.is_set() else "running",
+            "total": self.total,
+            **self.counts,
+            "written": self.written,
+            "elapsed_seconds": round(elapsed, 2),
+            "per_second": round(self.written / elapsed, 1) if elapsed else None,
+        }
+        if self.errors:
+            report["errors"] = [{"id": k, "error": v} for k, v in self.errors.items()]
+        return report
+
+
+class Enricher:
+    """Bounded worker pool that enriches contacts through a CompanyCache and writes in batches.
+
+    `write(user_id, patches)` persists a list of {"id", enrichment columns}
+    patches for one user.
+    """
+
+    def __init__(
+        self,
+        provider: ResearchProvider | None,
+        cache: CompanyCache,
+        write,
+        workers: int = 8,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        save_interval: float = 30.0,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self._write = write
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.save_interval = save_interval
+        self._queue = None
+        self._tasks = []  # workers
+        self._writer_task = None
+        self._closing = False
+        self._loop = None
+        self._inflight = {}  # company key -> future of its research
+        self._pending = []  # (job, patch) not yet written
+        self._due = None
+        self._jobs = OrderedDict()  # job id -> EnrichJob
+        self._last_save = time.monotonic()
+        self._counters = {
+            "queued": 0, "enriched": 0, "failed": 0, "cache_hits": 0, "coalesced": 0,
+            "researched": 0, "research_errors": 0, "written": 0, "batches": 0, "write_retries": 0,
+            "write_failed": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def job(self, job_id: str) -> EnrichJob | None:
+        return self._jobs.get(job_id)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._tasks = loop, []
+            self._queue, self._due = asyncio.Queue(), asyncio.Event()
+            self._inflight = {}
+        if self._tasks:
+            return
+        self._closing = False
+        # Fresh context: workers must not inherit the calling tool's context vars
+        context = contextvars.Context()
+        self._tasks = [context.run(loop.create_task, self._worker()) for _ in range(self.workers)]
+        self._writer_task = context.run(loop.create_task, self._writer())
+
+    async def submit(self, user_id: str, contacts: list[dict]) -> EnrichJob:
+        """Queue contacts (rows with ENRICH_COLUMNS) for enrichment; returns their job."""
+        if self.provider is None:
+            raise RuntimeError("no research provider configured")
+        self._ensure_started()
+        job = EnrichJob(user_id, len(contacts))
+        self._jobs[job.id] = job
+        finished = [j for j, x in self._jobs.items() if x.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - MAX_JOBS)]:
+            del self._jobs[job_id]
+        for contact in contacts:
+            self._queue.put_nowait((job, contact))
+        self._counters["queued"] += len(contacts)
+        return job
+
+    async def _worker(self):
+        while True:
+            job, contact = await self._queue.get()
+            try:
+                await self._enrich(job, contact)
+            except Exception as e:  # never lose a worker
+                logger.exception("Enriching contact %s failed", contact.get("id"))
+                self._record(job, contact["id"], None, str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _enrich(self, job: EnrichJob, contact: dict):
+        key = company_key(contact)
+        if not key:
+            self._record(job, contact["id"], None, "no company or company email domain to research")
+            return
+        try:
+            data, source = await self.research(key, contact.get("company") or "")
+        except Exception as e:
+            self._record(job, contact["id"], None, f"research failed: {e}")
+            return
+        job.counts[source] += 1
+        self._counters[source] += 1
+        self._record(job, contact["id"], data, None)
+
+    async def research(self, key: str, company: str) -> tuple[dict, str]:
+        """Research for a company key and where it came from: cache_hits, coalesced or researched."""
+        data = self.cache.get(key)
+        if data is not None:
+            return data, "cache_hits"
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), "coalesced"
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            data = await self.provider.research("" if key.startswith("name:") else key, company)
+        except BaseException as e:
+            self._counters["research_errors"] += 1
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("research cancelled"))
+            future.exception()  # retrieved, even if nobody else was waiting
+            raise
+        else:
+            self.cache.put(key, data)
+            future.set_result(data)
+        finally:
+            del self._inflight[key]
+        return data, "researched"
+
+    def _record(self, job: EnrichJob, contact_id: str, data: dict | None, error: str | None):
+        if error is None:
+            patch = {"id": contact_id, "enrichment_data": data, "enrichment_status": "enriched"}
+            job.counts["enriched"] += 1
+            self._counters["enriched"] += 1
+        else:
+            patch = {"id": contact_id, "enrichment_status": "failed"}
+            job.counts["failed"] += 1
+            self._counters["failed"] += 1
+            if len(job.errors) < MAX_JOB_ERRORS:
+                job.errors[contact_id] = error
+        self._pending.append((job, patch))
+        job.recorded += 1
+        if len(self._pending) >= self.batch_size or job.recorded == job.total:
+            self._due.set()  # full batch, or a finished job shouldn't wait out flush_interval
+
+    async def _writer(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._due.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._due.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every collected patch, batch_size per write call, grouped by user."""
+        pending, self._pending = self._pending, []
+        by_user = {}
+        for job, patch in pending:
+            by_user.setdefault(job.user_id, []).append((job, patch))
+        enriched_at = datetime.now(timezone.utc).isoformat()  # one value per flush keeps patches groupable
+        for user_id, items in by_user.items():
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                patches = [{**p, "enriched_at": enriched_at} if "enrichment_data" in p else p for _, p in batch]
+                written = await self._write_batch(user_id, patches)
+                for job, patch in batch:
+                    if written:
+                        job.written += 1
+                    else:
+                        job.counts["write_failed"] += 1
+                        if len(job.errors) < MAX_JOB_ERRORS:
+                            job.errors[patch["id"]] = "enrichment status write failed"
+                    if job.written + job.counts["write_failed"] == job.total:
+                        job._finish()
+        if self.save_interval and time.monotonic() - self._last_save >= self.save_interval:
+            self._save()
+
+    async def _write_batch(self, user_id: str, patches: list[dict]) -> bool:
+        attempt = 0
+        while True:
+            try:
+                await self._write(user_id, patches)
+                break
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error("Dropping %d enrichment results after %d retries: %s", len(patches), self.max_retries, e)
+                    self._counters["write_failed"] += len(patches)
+                    return False
+                self._counters["write_retries"] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        self._counters["written"] += len(patches)
+        self._counters["batches"] += 1
+        return True
+
+    def _save(self):
+        self._last_save = time.monotonic()
+        try:
+            self.cache.save()
+        except OSError as e:
+            logger.warning("Saving enrichment cache failed: %s", e)
+
+    async def stop(self, timeout: float = 30.0):
+        """Finish queued contacts (up to `timeout`), write their results, save the cache."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("%d contacts left unenriched at shutdown", self._queue.qsize())
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            # Let the writer finish the flush it may be in rather than cancel it mid-batch
+            self._closing = True
+            self._due.set()
+            await self._writer_task
+            await self.flush()
+        self._save()
+        if self.provider is not None:
+            await self.provider.close()
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "provider": self.provider.name if self.provider is not None else None,
+            "workers": self.workers,
+            "queued_now": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_companies": len(self._inflight),
+            "unwritten": len(self._pending),
+            "cache": self.cache.stats(),
+        }
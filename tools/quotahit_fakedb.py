@@ -0,0 +1,972 @@
+"""
+QuotaHit in-memory PostgREST stand-in — run the MCP server without Supabase.
+
+FakeSupabase implements the slice of the async supabase-py client that
+quotahit_mcp uses:
+- table() with select/insert/upsert/update/delete
+- filters: eq, neq, gt, gte, lt, lte, in_, is_, like, ilike, not_, or_
+- modifiers: order, limit, range, single, maybe_single, and count="exact"
+- rpc() for the SQL functions in supabase/migrations (order, limit and range apply too)
+
+Like PostgREST it returns fresh row copies, caps every result at `max_rows`,
+and raises errors carrying PostgREST codes (PGRST116, PGRST202).
+
+Equality filters on the id/user_id/contact_id/campaign_id columns use hash
+indexes whose buckets are kept in id order. Keyset pages (`id > last ORDER BY
+id`) are therefore range scans, as on the real B-tree, not table scans.
+Every execute() counts a round-trip, can sleep `rtt_ms` to model network
+latency, and adds its own run time to `db_seconds`, so benchmarks can tell
+server time from database time.
+
+generate() builds synthetic tenants at any scale (1k, 100k, 1M contacts):
+contacts, activities, campaigns and follow-up sequences; followups() adds a
+backlog of due follow-up messages for dispatcher runs.
+"""
+
+import asyncio
+import copy
+import heapq
+import random
+import re
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import chain
+
+INDEXED_COLUMNS = ("id", "user_id", "contact_id", "campaign_id")
+
+BENCH_USER = "00000001-0000-4000-8000-000000000000"
+
+_TABLE_DEFAULTS = {
+    "contacts": {
+        "last_name": None, "email": None, "phone": None, "company": None, "title": None,
+        "deal_stage": "lead", "deal_value": 0, "lead_score": 0, "source": "manual",
+        "do_not_call": False, "do_not_email": False, "last_contacted_at": None,
+        "tags": [], "custom_fields": {}, "notes": None,
+        "enrichment_data": {}, "enrichment_status": "pending",
+    },
+    "activities": {"description": None, "details": {}},
+    "campaigns": {
+        "status": "draft", "total_contacts": 0, "completed_contacts": 0, "started_at": None,
+        "contact_filter": None, "message": None, "checkpoint": {}, "runner_id": None,
+        "heartbeat_at": None, "completed_at": None,
+    },
+    "follow_up_sequences": {"is_active": True, "steps": []},
+    "follow_up_messages": {
+        "sequence_id": None, "call_id": None, "status": "pending", "subject": None, "sent_at": None,
+        "error": None, "metadata": {}, "claim_id": None, "claimed_at": None, "attempts": 0,
+    },
+}
+
+
+class FakeAPIError(Exception):
+    """Shaped like postgrest.APIError: `.message` and a PostgREST `.code`."""
+
+    def __init__(self, message: str, code: str = ""):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _id_key(row: dict) -> str:
+    return row.get("id") or ""
+
+
+def _copy(value):
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+def _coerce(sample, value):
+    """Cast a filter argument (often a string) to the type of the column value."""
+    if value is None or sample is None:
+        return value
+    if isinstance(sample, bool):
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    if isinstance(sample, (int, float)) and isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    if isinstance(sample, str) and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _like(pattern: str, value, ignore_case: bool) -> bool:
+    if value is None:
+        return False
+    parts = pattern.replace("*", "%").split("%")
+    regex = "^" + ".*".join(re.escape(p) for p in parts) + "$"
+    return re.match(regex, str(value), re.I | re.S if ignore_case else re.S) is not None
+
+
+def _compare(op: str, value, arg) -> bool:
+    if op == "is":
+        if arg in (None, "null"):
+            return value is None
+        return value is (arg in (True, "true"))
+    if op == "in":
+        return value is not None and value in {_coerce(value, a) for a in arg}
+    if op in ("like", "ilike"):
+        return _like(arg, value, op == "ilike")
+    if value is None:
+        return False
+    arg = _coerce(value, arg)
+    try:
+        if op == "eq":
+            return value == arg
+        if op == "neq":
+            return value != arg
+        if op == "gt":
+            return value > arg
+        if op == "gte":
+            return value >= arg
+        if op == "lt":
+            return value < arg
+        if op == "lte":
+            return value <= arg
+    except TypeError:
+        return False
+    raise FakeAPIError(f"unsupported operator {op}", "PGRST100")
+
+
+def _split_top(expr: str) -> list[str]:
+    """Split a PostgREST logic expression on commas outside quotes and parentheses."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append("".join(current))
+    return parts
+
+
+def _parse_logic(expr: str) -> list:
+    """Parse the body of an or=(...)/and=(...) filter into row predicates."""
+    predicates = []
+    for part in _split_top(expr):
+        part = part.strip()
+        group = re.match(r"^(not\.)?(and|or)\((.*)\)$", part, re.S)
+        if group:
+            inner = _parse_logic(group.group(3))
+            combine = all if group.group(2) == "and" else any
+            negate = bool(group.group(1))
+            predicates.append(lambda r, i=inner, c=combine, n=negate: n != c(p(r) for p in i))
+            continue
+        column, rest = part.split(".", 1)
+        negate = rest.startswith("not.")
+        if negate:
+            rest = rest[4:]
+        op, arg = rest.split(".", 1)
+        if len(arg) > 1 and arg[0] == arg[-1] == '"':
+            arg = arg[1:-1]
+        if op == "in":
+            arg = [a.strip().strip('"') for a in arg.strip("()").split(",")]
+        predicates.append(lambda r, c=column, o=op, a=arg, n=negate: n != _compare(o, r.get(c), a))
+    return predicates
+
+
+class _Table:
+    """Rows plus lazily built equality indexes (buckets kept in id order)."""
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+        self._indexes = {}  # column -> {value: [rows in id order]}
+        self._unsorted = {}  # column -> values whose bucket had rows appended
+
+    def index(self, column: str) -> dict:
+        idx = self._indexes.get(column)
+        if idx is None:
+            idx = {}
+            for row in sorted(self.rows, key=_id_key):
+                idx.setdefault(row.get(column), []).append(row)
+            self._indexes[column] = idx
+            self._unsorted[column] = set()
+        return idx
+
+    def bucket(self, column: str, value) -> list:
+        """Rows whose `column` equals `value`, in id order."""
+        idx = self.index(column)
+        unsorted = self._unsorted[column]
+        if value in unsorted:
+            unsorted.discard(value)
+            idx[value].sort(key=_id_key)  # appended tail: near-linear for timsort
+        return idx.get(value, [])
+
+    def insert(self, row: dict):
+        self.rows.append(row)
+        for column, idx in self._indexes.items():
+            value = row.get(column)
+            rows = idx.setdefault(value, [])
+            if rows and _id_key(rows[-1]) > _id_key(row):
+                self._unsorted[column].add(value)
+            rows.append(row)
+
+    def invalidate(self, columns=None):
+        """Drop indexes on `columns` (all of them when None) after in-place changes."""
+        for column in list(self._indexes) if columns is None else columns:
+            self._indexes.pop(column, None)
+            self._unsorted.pop(column, None)
+
+
+class _Shaping:
+    """order / limit / offset / range and the max_rows cap, shared by table
+    queries and RPC calls (PostgREST shapes function results the same way)."""
+
+    def _init_shaping(self):
+        self._order = []  # (column, desc, nulls_first)
+        self._offset = 0
+        self._limit = None
+
+    def order(self, column, *, desc=False, nullsfirst=None, foreign_table=None):
+        # PostgreSQL default: NULLS FIRST for DESC, NULLS LAST for ASC
+        self._order.append((column, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self._limit = size
+        return self
+
+    def offset(self, size):
+        self._offset = size
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def _sorted(self, rows: list) -> list:
+        for column, desc, nulls_first in reversed(self._order):
+            present = [r for r in rows if r.get(column) is not None]
+            nulls = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            rows = nulls + present if nulls_first else present + nulls
+        return rows
+
+    def _window(self) -> tuple[int, int]:
+        limit = self._limit
+        if self._client.max_rows and (limit is None or limit > self._client.max_rows):
+            limit = self._client.max_rows
+        return self._offset, None if limit is None else self._offset + limit
+
+
+class FakeQuery(_Shaping):
+    """One PostgREST request under construction; mirrors the supabase-py builder chain."""
+
+    def __init__(self, client, table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = None
+        self._count = None
+        self._head = False
+        self._payload = None
+        self._returning = "representation"
+        self._on_conflict = "id"
+        self._ignore_duplicates = False
+        self._filters = []  # (op, column, arg, negated); op "pred" carries a callable
+        self._init_shaping()
+        self._single = False
+        self._maybe = False
+        self._negate = False
+
+    # ── Operations ──
+
+    def select(self, *columns, count=None, head=False):
+        columns = ",".join(columns) if columns else "*"
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",") if c.strip()]
+        self._count = count
+        self._head = head
+        return self
+
+    def insert(self, rows, count=None, returning="representation", **kwargs):
+        self._op, self._payload, self._returning = "insert", rows, returning
+        return self
+
+    def upsert(self, rows, on_conflict="id", returning="representation", ignore_duplicates=False, **kwargs):
+        self._op, self._payload, self._returning = "upsert", rows, returning
+        self._on_conflict = on_conflict or "id"
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data, count=None, returning="representation", **kwargs):
+        self._op, self._payload, self._returning = "update", data, returning
+        self._count = count
+        return self
+
+    def delete(self, count=None, returning="representation", **kwargs):
+        self._op, self._returning = "delete", returning
+        self._count = count
+        return self
+
+    # ── Filters ──
+
+    def _add(self, op: str, column: str | None, arg):
+        self._filters.append((op, column, arg, self._negate))
+        self._negate = False
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def eq(self, column, value):
+        return self._add("eq", column, value)
+
+    def neq(self, column, value):
+        return self._add("neq", column, value)
+
+    def gt(self, column, value):
+        return self._add("gt", column, value)
+
+    def gte(self, column, value):
+        return self._add("gte", column, value)
+
+    def lt(self, column, value):
+        return self._add("lt", column, value)
+
+    def lte(self, column, value):
+        return self._add("lte", column, value)
+
+    def in_(self, column, values):
+        return self._add("in", column, list(values))
+
+    def is_(self, column, value):
+        return self._add("is", column, value)
+
+    def like(self, column, pattern):
+        return self._add("like", column, pattern)
+
+    def ilike(self, column, pattern):
+        return self._add("ilike", column, pattern)
+
+    def match(self, query: dict):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def filter(self, column, operator, criteria):
+        if operator == "in":
+            return self.in_(column, [c.strip().strip('"') for c in criteria.strip("()").split(",")])
+        return self._add(operator, column, criteria)
+
+    def or_(self, filters: str, reference_table=None):
+        predicates = _parse_logic(filters)
+        return self._add("pred", None, lambda r: any(p(r) for p in predicates))
+
+    # ── Modifiers ──
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._maybe = True
+        return self
+
+    # ── Execution ──
+
+    def _predicate(self, skip=None):
+        tests = []
+        for f in self._filters:
+            if f is skip:
+                continue
+            op, column, arg, negated = f
+            if op == "pred":
+                tests.append((arg, negated))
+            else:
+                tests.append((lambda r, o=op, c=column, a=arg: _compare(o, r.get(c), a), negated))
+        return lambda row: all(test(row) != negated for test, negated in tests)
+
+    def _candidates(self, table: _Table):
+        """Smallest indexed bucket matching an eq/in filter (id-ordered), else all rows."""
+        best, used = None, None
+        for f in self._filters:
+            op, column, arg, negated = f
+            if negated or column not in INDEXED_COLUMNS or op not in ("eq", "in"):
+                continue
+            if op == "eq":
+                rows = table.bucket(column, arg)
+            else:
+                rows = sorted(
+                    chain.from_iterable(table.bucket(column, a) for a in dict.fromkeys(arg)), key=_id_key
+                )
+            if best is None or len(rows) < len(best):
+                best, used = rows, f
+        return best, used
+
+    def _id_range(self, rows: list, desc: bool):
+        """Iterate id-ordered `rows` within the id range filters, in either direction."""
+        lo, hi = 0, len(rows)
+        for op, column, arg, negated in self._filters:
+            if column != "id" or negated:
+                continue
+            if op == "gt":
+                lo = max(lo, bisect_right(rows, arg, key=_id_key))
+            elif op == "gte":
+                lo = max(lo, bisect_left(rows, arg, key=_id_key))
+            elif op == "lt":
+                hi = min(hi, bisect_left(rows, arg, key=_id_key))
+            elif op == "lte":
+                hi = min(hi, bisect_right(rows, arg, key=_id_key))
+        positions = range(hi - 1, lo - 1, -1) if desc else range(lo, hi)
+        return (rows[i] for i in positions)
+
+    def _select(self, table: _Table) -> tuple[list, int | None]:
+        candidates, used = self._candidates(table)
+        start, end = self._window()
+
+        # Keyset fast path: an id-ordered bucket read in id order stops after `end` rows
+        if candidates is not None and self._order[:1] and self._order[0][0] == "id" and len(self._order) == 1:
+            test = self._predicate(skip=used)
+            matched = []
+            for row in self._id_range(candidates, self._order[0][1]):
+                if test(row):
+                    matched.append(row)
+                    if end is not None and len(matched) >= end and not self._count:
+                        break
+            count = len(matched) if self._count else None
+            return matched[start:end], count
+
+        test = self._predicate(skip=used)
+        matched = self._sorted([r for r in (table.rows if candidates is None else candidates) if test(r)])
+        return matched[start:end], len(matched) if self._count else None
+
+    def _project(self, row: dict) -> dict:
+        if self._columns is None:
+            return {k: _copy(v) for k, v in row.items()}
+        return {c: _copy(row.get(c)) for c in self._columns}
+
+    def _write(self, table: _Table) -> list:
+        if self._op in ("insert", "upsert"):
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            keys = [k.strip() for k in self._on_conflict.split(",")]
+            written, fresh, ids = [], [], set()
+            for item in payload:
+                existing = None
+                if self._op == "upsert":
+                    candidates = table.bucket("id", item.get("id")) if keys == ["id"] else table.rows
+                    existing = next(
+                        (r for r in candidates if all(r.get(k) == item.get(k) for k in keys)), None
+                    )
+                if existing is not None:
+                    if self._ignore_duplicates:
+                        continue
+                    existing.update(copy.deepcopy(item))
+                    table.invalidate(set(INDEXED_COLUMNS) & item.keys())
+                    written.append(existing)
+                    continue
+                row = copy.deepcopy(_TABLE_DEFAULTS.get(self._table, {}))
+                row.update(copy.deepcopy(item))
+                row.setdefault("id", str(uuid.uuid4()))
+                row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                if row["id"] in ids or table.bucket("id", row["id"]):
+                    raise FakeAPIError(f'duplicate key value violates unique constraint "{self._table}_pkey"', "23505")
+                ids.add(row["id"])
+                fresh.append(row)
+                written.append(row)
+            for row in fresh:  # a failed statement inserts nothing, as in Postgres
+                table.insert(row)
+            return written
+
+        candidates, used = self._candidates(table)
+        test = self._predicate(skip=used)
+        matched = [r for r in (table.rows if candidates is None else candidates) if test(r)]
+        if self._op == "update":
+            for row in matched:
+                row.update(copy.deepcopy(self._payload))
+            table.invalidate(set(INDEXED_COLUMNS) & self._payload.keys())
+        else:
+            gone = {id(r) for r in matched}
+            table.rows = [r for r in table.rows if id(r) not in gone]
+            table.invalidate()
+        return matched
+
+    async def execute(self):
+        client = self._client
+        client.round_trips += 1
+        if client.rtt_ms:
+            await asyncio.sleep(client.rtt_ms / 1000)
+        start = time.perf_counter()
+        try:
+            table = client.table_data(self._table)
+            count = None
+            if self._op == "select":
+                rows, count = self._select(table)
+                data = [] if self._head else [self._project(r) for r in rows]
+            else:
+                rows = self._write(table)
+                data = [] if self._returning == "minimal" else [self._project(r) for r in rows]
+                count = len(rows) if self._count else None
+
+            if self._single or self._maybe:
+                if len(data) != 1:
+                    if self._maybe and not data:
+                        return None
+                    raise FakeAPIError("JSON object requested, multiple (or no) rows returned", "PGRST116")
+                data = data[0]
+            return FakeResponse(data, count)
+        finally:
+            client.db_seconds += time.perf_counter() - start
+
+
+class _FakeRPC(_Shaping):
+    def __init__(self, client, fn: str, params: dict):
+        self._client, self._fn, self._params = client, fn, params
+        self._init_shaping()
+
+    async def execute(self):
+        client = self._client
+        client.round_trips += 1
+        if client.rtt_ms:
+            await asyncio.sleep(client.rtt_ms / 1000)
+        start = time.perf_counter()
+        try:
+            fn = client.functions.get(self._fn)
+            if fn is None:
+                raise FakeAPIError(f"Could not find the function public.{self._fn}", "PGRST202")
+            data = fn(client, **self._params)
+            if isinstance(data, list):
+                first, end = self._window()
+                data = self._sorted(data)[first:end]
+            return FakeResponse(data)
+        finally:
+            client.db_seconds += time.perf_counter() - start
+
+
+# ─── SQL Functions (supabase/migrations) ───────────────────────────────────
+
+
+def _rows_where(db, table: str, column: str, value) -> list:
+    return db.table_data(table).bucket(column, value)
+
+
+def rpc_activity_counts(db, p_user_id, p_contact_ids=None):
+    """022: activities per contact for a user."""
+    if p_contact_ids is None:
+        rows = _rows_where(db, "activities", "user_id", p_user_id)
+    else:
+        rows = chain.from_iterable(_rows_where(db, "activities", "contact_id", c) for c in set(p_contact_ids))
+    counts = {}
+    for a in rows:
+        if a.get("user_id") == p_user_id:
+            cid = a.get("contact_id")
+            counts[cid] = counts.get(cid, 0) + 1
+    return [{"contact_id": k, "activity_count": v} for k, v in counts.items()]
+
+
+def rpc_set_lead_scores(db, p_user_id, p_contact_ids, p_scores):
+    """022: bulk lead_score write; returns rows updated."""
+    contacts = db.table_data("contacts")
+    updated = 0
+    for cid, score in dict(zip(p_contact_ids, p_scores)).items():
+        for row in contacts.bucket("id", cid):
+            if row.get("user_id") == p_user_id:
+                row["lead_score"] = score
+                updated += 1
+    return updated
+
+
+def rpc_contact_rollup(db, p_user_id):
+    """023: contacts grouped by stage, source, score bucket and enrichment."""
+    groups = {}
+    for c in _rows_where(db, "contacts", "user_id", p_user_id):
+        score = c.get("lead_score") or 0
+        bucket = (
+            "0-20" if score <= 20 else "21-40" if score <= 40 else
+            "41-60" if score <= 60 else "61-80" if score <= 80 else "81-100"
+        )
+        key = (c.get("deal_stage"), c.get("source"), bucket, c.get("enrichment_status") == "enriched")
+        group = groups.setdefault(key, [0, 0.0])
+        group[0] += 1
+        group[1] += float(c.get("deal_value") or 0)
+    return [
+        {"deal_stage": k[0], "source": k[1], "score_bucket": k[2], "enriched": k[3],
+         "contacts": n, "total_value": round(total, 2)}
+        for k, (n, total) in groups.items()
+    ]
+
+
+def rpc_merge_contacts(db, p_user_id, p_primary_id, p_duplicate_ids):
+    """025: re-point the duplicates' rows to the primary, delete them; returns activities moved."""
+    contacts = db.table_data("contacts")
+    if not any(r.get("user_id") == p_user_id for r in contacts.bucket("id", p_primary_id)):
+        raise FakeAPIError(f"contact {p_primary_id} not found", "P0002")
+    ids = {
+        r["id"] for cid in set(p_duplicate_ids) if cid != p_primary_id
+        for r in contacts.bucket("id", cid) if r.get("user_id") == p_user_id
+    }
+    moved = 0
+    for name in ("activities", "follow_up_messages", "deal_stage_history", "notifications"):
+        table = db.table_data(name)
+        for cid in ids:
+            for row in table.bucket("contact_id", cid):
+                if row.get("user_id") == p_user_id:
+                    row["contact_id"] = p_primary_id
+                    moved += name == "activities"
+        table.invalidate(["contact_id"])
+    contacts.rows = [r for r in contacts.rows if r["id"] not in ids]
+    contacts.invalidate()
+    return moved
+
+
+def rpc_set_deal_stage(db, p_user_id, p_contact_ids, p_new_stage):
+    """026: stage move returning each owned contact's previous values."""
+    contacts = db.table_data("contacts")
+    out = []
+    for cid in dict.fromkeys(p_contact_ids):
+        for row in contacts.bucket("id", cid):
+            if row.get("user_id") != p_user_id:
+                continue
+            out.append({
+                "id": row["id"], "first_name": row.get("first_name"), "last_name": row.get("last_name"),
+                "old_stage": row.get("deal_stage"), "deal_value": row.get("deal_value"),
+                "lead_score": row.get("lead_score"), "source": row.get("source"),
+                "enrichment_status": row.get("enrichment_status"),
+                "changed": row.get("deal_stage") != p_new_stage,
+            })
+            row["deal_stage"] = p_new_stage
+    return out
+
+
+def rpc_update_contacts(db, p_user_id, p_updates):
+    """026: per-contact patches returning new rows and old dashboard columns."""
+    contacts = db.table_data("contacts")
+    out = []
+    for item in p_updates:
+        patch = {k: v for k, v in item.items() if k not in ("id", "user_id")}
+        for row in contacts.bucket("id", item.get("id")):
+            if row.get("user_id") != p_user_id:
+                continue
+            old = {k: row.get(k) for k in ("id", "deal_stage", "deal_value", "lead_score", "source", "enrichment_status")}
+            row.update(copy.deepcopy(patch))
+            out.append({"contact": copy.deepcopy(row), "old": old})
+    return out
+
+
+@lru_cache(maxsize=262144)
+def _time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def rpc_trend_rollup(db, p_user_id, p_from, p_to=None):
+    """029: per-day new contacts, stage transitions, won deals and score buckets."""
+    start, end = _time(p_from), _time(p_to) if p_to else None
+    groups = {}
+
+    def add(created_at, metric, key, value=None):
+        at = _time(created_at)
+        if at < start or (end is not None and at >= end):
+            return
+        group = groups.setdefault((at.astimezone(timezone.utc).date().isoformat(), metric, key), [0, None])
+        group[0] += 1
+        if value is not None:
+            group[1] = (group[1] or 0) + float(value)
+
+    contacts = db.table_data("contacts")
+    for c in contacts.bucket("user_id", p_user_id):
+        add(c["created_at"], "new_contacts", None)
+    for a in db.table_data("activities").bucket("user_id", p_user_id):
+        details = a.get("details") or {}
+        if a.get("activity_type") == "lead_scored" and details.get("score") is not None:
+            score = details["score"]
+            bucket = (
+                "0-20" if score <= 20 else "21-40" if score <= 40 else
+                "41-60" if score <= 60 else "61-80" if score <= 80 else "81-100"
+            )
+            add(a["created_at"], "score", bucket)
+        elif a.get("activity_type") == "stage_changed":
+            match = re.match(r"^Stage: (.*) → (.*)$", a.get("title") or "")
+            old = details.get("from") or (match.group(1) if match else None)
+            new = details.get("to") or (match.group(2) if match else None)
+            if new is None:
+                continue
+            add(a["created_at"], "transition", f"{old or 'unknown'} → {new}")
+            if new == "won":
+                value = details.get("deal_value")
+                if value is None:
+                    value = next((c.get("deal_value") for c in contacts.bucket("id", a.get("contact_id"))), None)
+                add(a["created_at"], "won", None, value or 0)
+    return [
+        {"day": k[0], "metric": k[1], "key": k[2], "count": n, "value": round(v, 2) if v is not None else None}
+        for k, (n, v) in groups.items()
+    ]
+
+
+def rpc_claim_followups(db, p_claim_id, p_limit, p_channels, p_lease_seconds=300, p_ids=None):
+    """027: claim expired then due messages (or just p_ids) for a dispatcher."""
+    messages = db.table_data("follow_up_messages")
+    now = datetime.now(timezone.utc)
+    if p_ids is not None:
+        rows = [
+            r for mid in dict.fromkeys(p_ids) for r in messages.bucket("id", mid)
+            if r.get("status") == "pending" and r.get("channel") in p_channels
+        ][:p_limit]
+    else:
+        expired = now - timedelta(seconds=p_lease_seconds)
+        rows = heapq.nsmallest(
+            p_limit,
+            (r for r in messages.rows if r.get("status") == "sending" and r.get("channel") in p_channels
+             and _time(r["claimed_at"]) < expired),
+            key=lambda r: _time(r["claimed_at"]),
+        )
+        rows += heapq.nsmallest(
+            p_limit - len(rows),
+            (r for r in messages.rows if r.get("status") == "pending" and r.get("channel") in p_channels
+             and _time(r["send_at"]) <= now),
+            key=lambda r: _time(r["send_at"]),
+        )
+    for row in rows:
+        row.update(status="sending", claim_id=p_claim_id, claimed_at=now.isoformat(),
+                   attempts=(row.get("attempts") or 0) + 1)
+    return copy.deepcopy(rows)
+
+
+def rpc_finish_followups(db, p_claim_id, p_results):
+    """027: record outcomes for messages still held by p_claim_id; returns rows written."""
+    messages = db.table_data("follow_up_messages")
+    written = 0
+    for result in p_results:
+        for row in messages.bucket("id", result["id"]):
+            if row.get("claim_id") != p_claim_id or row.get("status") != "sending":
+                continue
+            row.update(status=result["status"], error=result.get("error"), claim_id=None, claimed_at=None)
+            for column in ("sent_at", "send_at", "attempts"):
+                if result.get(column) is not None:
+                    row[column] = result[column]
+            written += 1
+    return written
+
+
+RPC_FUNCTIONS = {
+    "mcp_activity_counts": rpc_activity_counts,
+    "mcp_set_lead_scores": rpc_set_lead_scores,
+    "mcp_contact_rollup": rpc_contact_rollup,
+    "mcp_merge_contacts": rpc_merge_contacts,
+    "mcp_set_deal_stage": rpc_set_deal_stage,
+    "mcp_update_contacts": rpc_update_contacts,
+    "mcp_claim_followups": rpc_claim_followups,
+    "mcp_finish_followups": rpc_finish_followups,
+    "mcp_trend_rollup": rpc_trend_rollup,
+}
+
+
+class FakeSupabase:
+    """Drop-in for supabase AsyncClient over in-memory tables."""
+
+    def __init__(self, tables: dict | None = None, functions: dict | None = None,
+                 max_rows: int = 1000, rtt_ms: float = 0):
+        self._tables = {name: _Table(rows) for name, rows in (tables or {}).items()}
+        self.functions = dict(RPC_FUNCTIONS if functions is None else functions)
+        self.max_rows = max_rows  # PostgREST db-max-rows (0 = unlimited)
+        self.rtt_ms = rtt_ms
+        self.round_trips = 0
+        self.db_seconds = 0.0
+
+    def table_data(self, name: str) -> _Table:
+        table = self._tables.get(name)
+        if table is None:
+            table = self._tables[name] = _Table()
+        return table
+
+    def rows(self, name: str) -> list[dict]:
+        return self.table_data(name).rows
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: dict | None = None, **kwargs) -> _FakeRPC:
+        return _FakeRPC(self, fn, params or {})
+
+
+# ─── Synthetic Data ─────────────────────────────────────────────────────────
+
+
+FIRST_NAMES = [
+    "Ava", "Ben", "Chloe", "Dev", "Elena", "Farid", "Grace", "Hiro", "Isla", "Jamal",
+    "Kira", "Liam", "Maya", "Noah", "Olga", "Priya", "Quinn", "Rosa", "Sam", "Tariq",
+    "Uma", "Victor", "Wen", "Ximena", "Yusuf", "Zoe", "Ana", "Bruno", "Carla", "Diego",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Garcia", "Patel", "Nguyen", "Kim", "Müller", "Rossi", "Silva", "Cohen",
+    "Okafor", "Tanaka", "Dubois", "Kowalski", "Larsen", "O'Brien", "Haddad", "Novak", "Ivanova", "Chen",
+]
+COMPANY_WORDS = [
+    "Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay", "Soylent", "Tyrell",
+    "Cyberdyne", "Aperture", "Gringotts", "Wonka", "Oscorp", "Massive", "Dynamic", "Blue", "North", "Bright",
+]
+COMPANY_SUFFIXES = ["Inc", "Labs", "Systems", "Group", "Cloud", "Analytics", "Software", "Partners"]
+TITLES = ["CEO", "CTO", "VP Sales", "Head of Growth", "Sales Manager", "Account Executive", "Founder", "COO"]
+STAGES = ["lead", "contacted", "qualified", "proposal", "negotiation", "won", "lost"]
+STAGE_WEIGHTS = [35, 20, 15, 10, 8, 7, 5]
+SOURCES = ["referral", "inbound", "linkedin", "website", "import", "manual", "cold", "mcp"]
+ACTIVITY_TYPES = ["note", "call", "email_sent", "email_opened", "meeting", "stage_changed", "lead_scored"]
+TRIGGERS = ["meeting_booked", "callback_scheduled", "interested", "no_answer", "voicemail"]
+
+_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _uuid(kind: int, n: int) -> str:
+    """Deterministic UUID-shaped id; `kind` separates tables, `n` orders rows."""
+    return f"{kind:08x}-0000-4000-8000-{n:012x}"
+
+
+def _timestamp(rnd: random.Random, days: int = 540) -> str:
+    return (_EPOCH + timedelta(seconds=rnd.randrange(days * 86400))).isoformat()
+
+
+def tenant_ids(tenants: int) -> list[str]:
+    """User ids of the synthetic tenants; the first one is BENCH_USER."""
+    return [_uuid(1, i) for i in range(tenants)]
+
+
+def generate(contacts: int, tenants: int = 5, activities_per_contact: float = 2,
+             seed: int = 42) -> dict[str, list[dict]]:
+    """Synthetic tables for `tenants` users.
+
+    BENCH_USER owns `contacts` contacts. The other tenants share a further
+    10% between them, so every query has to filter on user_id. Each contact
+    gets on average `activities_per_contact` activities. Each tenant gets 20
+    campaigns (each targeting one deal stage with an email message) and 8
+    follow-up sequences.
+    """
+    rnd = random.Random(seed)
+    users = tenant_ids(tenants)
+    others = users[1:]
+    companies = [f"{w} {s}" for w in COMPANY_WORDS for s in COMPANY_SUFFIXES]
+    domains = {c: re.sub(r"\W", "", c.lower()) + ".com" for c in companies}
+    extra = contacts // 10 if others else 0
+    max_activities = max(0, round(activities_per_contact * 2))
+
+    tables = {"contacts": [], "activities": [], "campaigns": [], "follow_up_sequences": []}
+    contact_rows, activity_rows = tables["contacts"], tables["activities"]
+    for i in range(contacts + extra):
+        user = users[0] if i < contacts else others[i % len(others)]
+        first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+        company = rnd.choice(companies) if rnd.random() < 0.85 else None
+        enriched = rnd.random() < 0.3
+        contact = {
+            "id": _uuid(2, i),
+            "user_id": user,
+            "first_name": first,
+            "last_name": last if rnd.random() < 0.9 else None,
+            "email": f"{first.lower()}.{i}@{domains[company] if company else 'gmail.com'}"
+            if rnd.random() < 0.8 else None,
+            "phone": f"+1415555{i % 10000:04d}" if rnd.random() < 0.5 else None,
+            "company": company,
+            "title": rnd.choice(TITLES) if rnd.random() < 0.6 else None,
+            "deal_stage": rnd.choices(STAGES, STAGE_WEIGHTS)[0],
+            "deal_value": round(rnd.lognormvariate(8.5, 1.2), 2) if rnd.random() < 0.7 else 0,
+            "lead_score": rnd.randint(0, 100) if rnd.random() < 0.8 else None,
+            "source": rnd.choice(SOURCES) if rnd.random() < 0.95 else None,
+            "do_not_call": rnd.random() < 0.05,
+            "do_not_email": rnd.random() < 0.05,
+            "last_contacted_at": _timestamp(rnd) if rnd.random() < 0.6 else None,
+            "tags": [],
+            "custom_fields": {"industry": "Software", "employees": "51-200"} if rnd.random() < 0.3 else {},
+            "notes": "Met at a conference; interested in outbound automation." if rnd.random() < 0.2 else None,
+            "enrichment_data": {"summary": f"{company} is scaling its sales team."} if enriched and company else {},
+            "enrichment_status": "enriched" if enriched else "pending",
+            "created_at": _timestamp(rnd),
+        }
+        contact_rows.append(contact)
+        for _ in range(rnd.randint(0, max_activities)):
+            kind = rnd.choice(ACTIVITY_TYPES)
+            title, details = kind.replace("_", " ").capitalize(), {}
+            if kind == "stage_changed":
+                # Moves into the contact's current stage from the one before it
+                stage = contact["deal_stage"]
+                old = STAGES[max(STAGES.index(stage) - 1, 0)] if stage != "lost" else "negotiation"
+                title = f"Stage: {old} → {stage}"
+                details = {"from": old, "to": stage, "deal_value": contact["deal_value"]}
+            elif kind == "lead_scored":
+                details = {"score": contact["lead_score"] or 0, "source": "mcp"}
+            activity_rows.append({
+                "id": _uuid(3, len(activity_rows)),
+                "user_id": user,
+                "contact_id": contact["id"],
+                "activity_type": kind,
+                "title": title,
+                "description": None,
+                "details": details,
+                "created_at": _timestamp(rnd),
+            })
+
+    for u, user in enumerate(users):
+        for n in range(20):
+            total = rnd.randint(0, 500)
+            tables["campaigns"].append({
+                "id": _uuid(4, u * 20 + n),
+                "user_id": user,
+                "name": f"Campaign {n + 1}",
+                "type": rnd.choice(["outbound", "inbound", "nurture", "reactivation"]),
+                "description": "",
+                "status": rnd.choice(["draft", "active", "paused", "completed"]),
+                "total_contacts": total,
+                "completed_contacts": rnd.randint(0, total),
+                "contact_filter": {"deal_stage": STAGES[n % len(STAGES)]},
+                "message": {
+                    "channel": "email",
+                    "subject": "Quick question, {{first_name}}",
+                    "body": "Hi {{first_name}}, is {{company}} still looking at this quarter's pipeline?",
+                },
+                "created_at": _timestamp(rnd),
+            })
+        for n in range(8):
+            tables["follow_up_sequences"].append({
+                "id": _uuid(5, u * 8 + n),
+                "user_id": user,
+                "name": f"Sequence {n + 1}",
+                "trigger": rnd.choice(TRIGGERS),
+                "steps": [{"delay_hours": 24 * (s + 1), "channel": "email"} for s in range(rnd.randint(1, 5))],
+                "is_active": rnd.random() < 0.7,
+                "created_at": _timestamp(rnd),
+            })
+    return tables
+
+
+def followups(tables: dict, count: int, seed: int = 42) -> list[dict]:
+    """Add `count` due pending follow_up_messages for BENCH_USER's contacts to
+    generate()'s tables (channels mixed like real sequences) and return them."""
+    rnd = random.Random(seed)
+    contacts = [c for c in tables["contacts"] if c["user_id"] == BENCH_USER]
+    now = datetime.now(timezone.utc)
+    rows = tables.setdefault("follow_up_messages", [])
+    for n in range(count):
+        contact = rnd.choice(contacts)
+        channel = rnd.choices(("email", "sms", "whatsapp"), (6, 3, 1))[0]
+        row = copy.deepcopy(_TABLE_DEFAULTS["follow_up_messages"])
+        row.update({
+            "id": _uuid(6, len(rows)),
+            "user_id": BENCH_USER,
+            "contact_id": contact["id"],
+            "channel": channel,
+            "subject": "Following up" if channel == "email" else None,
+            "body": f"Hi {contact['first_name']}, following up on our call.",
+            "send_at": (now - timedelta(seconds=rnd.randrange(86400))).isoformat(),
+            "metadata": {"contact_email": contact.get("email") or f"lead{n}@example.com",
+                         "contact_phone": contact.get("phone") or "+14155550100"},
+            "created_at": (now - timedelta(days=1)).isoformat(),
+        })
+        rows.append(row)
+    return rows
@@ -0,0 +1,72 @@
+"""
+QuotaHit Monte Carlo revenue forecast — vectorized Bernoulli trials over deals.
+
+Each trial closes every deal independently with its stage probability and sums
+the won value. To stay interactive on 50k-deal pipelines, the deals that carry
+most of the variance (largest v²·p·(1-p)) are simulated exactly, and the long
+tail of small deals is folded in as one normal draw with the tail's exact mean
+and variance (central limit theorem). Deals with p of 0 or 1 are deterministic
+and never simulated. Trials run in chunks so memory stays bounded.
+"""
+
+import numpy as np
+
+# Uniform draws generated per chunk (float32 → ~16 MB per chunk)
+_CHUNK_ELEMENTS = 4_000_000
+
+
+def simulate_revenue(
+    values,
+    probs,
+    trials: int = 100_000,
+    target: float = 0,
+    exact_deals: int = 512,
+    seed: int | None = None,
+) -> dict:
+    """Simulate pipeline revenue; return percentiles and P(revenue >= target)."""
+    values = np.asarray(values, dtype=np.float64)
+    probs = np.clip(np.asarray(probs, dtype=np.float64), 0.0, 1.0)
+    rng = np.random.default_rng(seed)
+
+    certain = float(values[probs >= 1.0].sum())
+    uncertain = (probs > 0.0) & (probs < 1.0)
+    values, probs = values[uncertain], probs[uncertain]
+
+    # Exact simulation for the highest-variance deals, CLT for the rest
+    variance = values * values * probs * (1.0 - probs)
+    if len(values) > exact_deals:
+        order = np.argpartition(variance, len(values) - exact_deals)
+        exact, tail = order[-exact_deals:], order[:-exact_deals]
+    else:
+        exact, tail = np.arange(len(values)), np.arange(0)
+    exact_values = values[exact]
+    exact_probs = probs[exact].astype(np.float32)
+    tail_mean = float((values[tail] * probs[tail]).sum())
+    tail_sd = float(np.sqrt(variance[tail].sum()))
+
+    revenue = np.empty(trials, dtype=np.float64)
+    rows = max(1, _CHUNK_ELEMENTS // max(1, len(exact)))
+    for start in range(0, trials, rows):
+        n = min(rows, trials - start)
+        if len(exact):
+            won = rng.random((n, len(exact)), dtype=np.float32) < exact_probs
+            revenue[start:start + n] = won @ exact_values
+        else:
+            revenue[start:start + n] = 0.0
+    if len(tail):
+        revenue += np.maximum(rng.normal(tail_mean, tail_sd, trials), 0.0)
+    revenue += certain
+
+    p10, p50, p90 = np.percentile(revenue, [10, 50, 90])
+    return {
+        "trials": trials,
+        "method": "exact" if not len(tail) else "hybrid",
+        "simulated_deals": int(len(exact)),
+        "tail_deals": int(len(tail)),
+        "mean": round(float(revenue.mean()), 2),
+        "p10": round(float(p10), 2),
+        "p50": round(float(p50), 2),
+        "p90": round(float(p90), 2),
+        "target": target,
+        "prob_hit_target": round(float((revenue >= target).mean()), 4) if target > 0 else None,
+    }
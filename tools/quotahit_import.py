@@ -0,0 +1,143 @@
+"""
+QuotaHit contact import — streaming readers and row normalization.
+
+Rows are read lazily from CSV or JSONL files (or an inline JSON array) and
+grouped into fixed-size chunks, so an import holds at most one chunk in
+memory regardless of file size.
+"""
+
+import csv
+import json
+import os
+import re
+
+VALID_STAGES = ("lead", "contacted", "qualified", "proposal", "negotiation", "won", "lost")
+
+CONTACT_FIELDS = (
+    "first_name", "last_name", "email", "phone", "company",
+    "title", "source", "deal_stage", "deal_value", "notes",
+)
+
+# Common spreadsheet headers → contact columns (keys already normalized)
+HEADER_ALIASES = {
+    "firstname": "first_name",
+    "given_name": "first_name",
+    "lastname": "last_name",
+    "surname": "last_name",
+    "family_name": "last_name",
+    "e_mail": "email",
+    "email_address": "email",
+    "phone_number": "phone",
+    "mobile": "phone",
+    "company_name": "company",
+    "organization": "company",
+    "organisation": "company",
+    "job_title": "title",
+    "position": "title",
+    "stage": "deal_stage",
+    "value": "deal_value",
+    "amount": "deal_value",
+    "note": "notes",
+}
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _header(key: str) -> str:
+    key = re.sub(r"[\s\-]+", "_", str(key).strip().lower())
+    return HEADER_ALIASES.get(key, key)
+
+
+def iter_rows(path: str = "", inline: str = ""):
+    """Yield (row_number, raw_dict) from a CSV/JSONL file or an inline JSON array."""
+    if inline:
+        rows = json.loads(inline)
+        if not isinstance(rows, list):
+            raise ValueError("inline rows must be a JSON array of objects")
+        yield from enumerate(rows, start=1)
+        return
+
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if ext in (".jsonl", ".ndjson"):
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_no, {"__error__": f"invalid JSON: {e.msg}"}
+        elif ext == ".csv":
+            # Row numbers are file lines (header is line 1)
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            raise ValueError(f"unsupported file type '{ext}' (use .csv, .jsonl or .ndjson)")
+
+
+def iter_chunks(rows, size: int):
+    """Group an iterator into lists of at most `size` items."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def normalize_row(raw, user_id: str, source: str) -> tuple[dict | None, str | None]:
+    """Validate and normalize one raw row. Returns (contact, None) or (None, error)."""
+    if not isinstance(raw, dict):
+        return None, "row must be an object"
+    if "__error__" in raw:
+        return None, raw["__error__"]
+
+    row, extra = {}, {}
+    for key, value in raw.items():
+        if key is None:  # surplus CSV cells
+            continue
+        column = _header(key)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            continue
+        if column in CONTACT_FIELDS:
+            row[column] = value
+        elif column == "name" and "first_name" not in row:
+            first, _, last = str(value).partition(" ")
+            row["first_name"] = first
+            if last:
+                row.setdefault("last_name", last.strip())
+        else:
+            extra[column] = value
+
+    if not row.get("first_name"):
+        return None, "first_name is required"
+
+    if "email" in row:
+        row["email"] = str(row["email"]).lower()
+        if not _EMAIL_RE.match(row["email"]):
+            return None, f"invalid email '{row['email']}'"
+
+    row["deal_stage"] = str(row.get("deal_stage", "lead")).lower()
+    if row["deal_stage"] not in VALID_STAGES:
+        return None, f"invalid deal_stage '{row['deal_stage']}'"
+
+    if "deal_value" in row:
+        try:
+            row["deal_value"] = float(str(row["deal_value"]).replace(",", "").lstrip("$"))
+        except ValueError:
+            return None, f"invalid deal_value '{row['deal_value']}'"
+        if row["deal_value"] < 0:
+            return None, "deal_value must be >= 0"
+
+    for column in ("first_name", "last_name", "phone", "company", "title", "notes"):
+        if column in row:
+            row[column] = str(row[column])
+
+    row["source"] = str(row.get("source") or source)
+    row["user_id"] = user_id
+    if extra:
+        row["custom_fields"] = extra
+    return row, None
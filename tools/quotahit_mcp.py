@@ -1,87 +1,946 @@
 """
 QuotaHit MCP Server — AI Sales Department control plane.
 
-15 tools + 6 prompts for managing the entire QuotaHit pipeline:
+28 tools + 6 prompts for managing the entire QuotaHit pipeline:
 
 Tools (Actions):
-  - list_contacts, get_contact, create_contact, update_contact
-  - enrich_lead, score_lead, qualify_lead
-  - list_campaigns, create_campaign, execute_campaign
-  - get_pipeline, get_analytics, get_forecast
+  - list_contacts, get_contact, create_contact, update_contact, import_contacts
+  - find_duplicates, merge_contacts, bulk_update_contacts, bulk_update_deal_stage
+  - enrich_lead, enrich_leads, score_lead, score_leads_batch, qualify_lead
+  - list_campaigns, create_campaign, execute_campaign, campaign_progress
+  - get_pipeline, get_analytics, get_forecast, get_trends
   - list_sequences, send_followup
+  - cache_stats, wire_stats, server_stats
 
 Prompts (AI Reasoning):
   - qualify_lead, handle_objection, write_outreach
   - summarize_deal, score_conversation, suggest_next_action
 
-Uses FastMCP (stdio transport) + Supabase service role for data access.
+Uses FastMCP + async Supabase client (service role) over a pooled keep-alive
+HTTP connection for data access. Every tool is a coroutine, so a slow PostgREST
+round-trip never blocks other tool calls.
+
+Serves stdio by default (one process per agent). `--transport streamable-http`
+(or QUOTAHIT_TRANSPORT) runs one long-lived server for many clients that share
+its connection pool, caches and indexes; see --help for host/port/path and
+--stateless. QUOTAHIT_HTTP_TOKENS ('{"<token>": ["<user uuid>", ...] | "*"}')
+requires a bearer token on every request, and every tool's user_id must be one
+the token allows. At most QUOTAHIT_MAX_CONCURRENT_TOOLS (--concurrency) tool
+calls run at once; keep QUOTAHIT_POOL_MAX_CONNECTIONS near it. SIGTERM drains
+in-flight requests for up to QUOTAHIT_SHUTDOWN_GRACE_SECONDS, then flushes the
+activity log.
+
+Pool tuning (env): QUOTAHIT_POOL_MAX_CONNECTIONS, QUOTAHIT_POOL_MAX_KEEPALIVE,
+QUOTAHIT_POOL_KEEPALIVE_EXPIRY, QUOTAHIT_HTTP_TIMEOUT.
+
+Dashboard tools stream contacts with keyset pagination into incremental
+accumulators (quotahit_aggregates), so results stay correct past PostgREST's
+max-rows cap (QUOTAHIT_MAX_ROWS) and memory stays flat. get_pipeline and
+get_analytics push grouping down to the mcp_contact_rollup SQL function when
+it is deployed, and fall back to streaming when it isn't.
+
+get_contact, get_pipeline and get_analytics are served through an in-process
+read-through cache (per-tool TTLs, LRU bound, per-user keys); write tools
+invalidate exactly the keys they affect. Tune with QUOTAHIT_CACHE_TTLS
+(JSON, e.g. '{"get_contact": 10}') and QUOTAHIT_CACHE_MAX_ENTRIES.
+Concurrent identical get_pipeline, get_analytics and get_forecast calls are
+coalesced (quotahit_singleflight): the first runs the query and the rest
+await its result, so a dashboard burst costs one scan. Calls made after a
+write start a fresh query. Disable with QUOTAHIT_SINGLE_FLIGHT=0.
+
+Per-user pipeline aggregates are materialized in memory: write tools apply
+O(1) deltas, and a full rebuild reconciles drift at most every
+QUOTAHIT_AGG_RECONCILE_SECONDS (bounded to QUOTAHIT_AGG_MAX_USERS tenants).
+
+get_trends reports new contacts, stage transitions (from stage_changed
+activities), won deals and lead score distribution per day or week from
+per-user daily rollups (quotahit_trends). Days older than
+QUOTAHIT_TRENDS_SETTLE_SECONDS are frozen once computed, so repeat queries
+only scan rows created since the last one. Buckets are grouped in the
+database by mcp_trend_rollup (migration 029) when it is deployed, and
+streamed otherwise.
+
+Activity rows from create_contact, score_lead and update_deal_stage are written
+behind (quotahit_activity): queued, then inserted in batches by a background
+task and flushed on shutdown. Pass sync=True to wait for the insert when the
+caller needs to read it back. Tune with QUOTAHIT_ACTIVITY_BATCH_SIZE,
+QUOTAHIT_ACTIVITY_FLUSH_SECONDS and QUOTAHIT_ACTIVITY_MAX_QUEUE.
+
+Queries select only the columns a tool uses (list_contacts and get_contact
+take `fields` to narrow further). Tools are registered with _tool(), which
+times each call and tags it so an httpx response hook can attribute Supabase
+round-trips, rows and bytes to the tool that made them (quotahit_metrics;
+see server_stats and wire_stats). QUOTAHIT_METRICS_FILE and/or
+QUOTAHIT_METRICS_PORT publish the same metrics in Prometheus text format.
+
+Responses are compact JSON (quotahit_serialize; orjson when installed). Set
+QUOTAHIT_JSON_PRETTY=1 for indented output. QUOTAHIT_MAX_RESPONSE_TOKENS caps
+every response, and list_contacts, get_contact and score_leads_batch also take
+a per-call max_tokens. Over-budget arrays are truncated with an explicit
+"... truncated, N more" marker.
+
+list_contacts and get_contact's activities page with opaque keyset cursors on
+(sort column, id), so deep pages cost the same as the first and concurrent
+inserts never shift rows between pages.
+
+list_contacts `search` is answered from a per-user in-memory n-gram index
+(quotahit_search) built on first use and kept current by write tools; the
+ranked ids are then fetched by primary key. QUOTAHIT_SEARCH_INDEX=0 falls
+back to ilike filters. Bounded by QUOTAHIT_SEARCH_MAX_DOCS (LRU by tenant),
+refreshed every QUOTAHIT_SEARCH_REFRESH_SECONDS.
+
+find_duplicates scores contacts only within blocking keys (normalized email,
+company email domain + last name, E.164 phone; quotahit_dedupe), from a
+per-user index kept like the search index. create_contact(check_duplicates=True)
+probes the same index before inserting. merge_contacts folds duplicates into a
+primary and re-points their activities in bulk via mcp_merge_contacts.
+Tune with QUOTAHIT_DEDUPE_MIN_SCORE, QUOTAHIT_DEDUPE_MAX_BLOCK and
+QUOTAHIT_DEFAULT_COUNTRY_CODE (for numbers without an international prefix).
+
+bulk_update_deal_stage and bulk_update_contacts target an id list or a JSON
+filter (at most QUOTAHIT_BULK_MAX_CONTACTS) and write with one set-based
+statement per 1,000 contacts (mcp_set_deal_stage / mcp_update_contacts return
+the old values for activity rows and aggregate deltas). Failures are reported
+per id.
+
+Due follow_up_messages are sent by a background dispatcher (quotahit_dispatch;
+QUOTAHIT_DISPATCH=1 or --dispatch): it claims batches with mcp_claim_followups
+(FOR UPDATE SKIP LOCKED, so replicas never double-send), sends on per-channel
+worker pools with token-bucket limits (QUOTAHIT_DISPATCH_CONCURRENCY,
+QUOTAHIT_DISPATCH_RATES) through Resend / Twilio, and records outcomes in bulk.
+send_followup sends one message immediately through the same path, or queues
+it with send_at. Needs migration 027.
+
+execute_campaign runs a campaign in the background (quotahit_campaigns):
+contacts matching its contact_filter are streamed in keyset pages and queued
+as follow-ups carrying its message, QUOTAHIT_CAMPAIGN_CONCURRENCY at a time
+and at most QUOTAHIT_CAMPAIGN_RATE per second. completed_contacts and a
+resume checkpoint are written every QUOTAHIT_CAMPAIGN_CHECKPOINT_EVERY
+contacts (or QUOTAHIT_CAMPAIGN_CHECKPOINT_SECONDS) under a lease on the
+campaign row, so a crashed run resumes where it stopped once its lease
+(QUOTAHIT_CAMPAIGN_LEASE_SECONDS) expires. campaign_progress reports live
+throughput and ETA. Needs migration 028.
+
+enrich_lead and enrich_leads research companies on a local worker pool
+(quotahit_enrich; QUOTAHIT_ENRICH_WORKERS): results are cached by company
+domain with a TTL and persisted to QUOTAHIT_ENRICH_CACHE_FILE, concurrent
+lookups of one company share a single provider call, and status updates are
+written QUOTAHIT_ENRICH_BATCH_SIZE contacts per statement.
 """
 
 import os
 import json
-from datetime import datetime
+import asyncio
+import base64
+import contextvars
+import functools
+import hmac
+import inspect
+import sys
+import time
+import uuid
+from array import array
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+
+_T0 = time.perf_counter()  # startup report baseline, taken before the mcp import
+
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.lowlevel.server import request_ctx
+
+from quotahit_activity import ActivityLogger
+from quotahit_aggregates import STAGE_PROBABILITY, AggregateStore, ContactStats, ForecastStats
+from quotahit_cache import ReadThroughCache
+from quotahit_campaigns import CAMPAIGN_CONTACT_COLUMNS, CampaignEngine
+from quotahit_dedupe import DEDUPE_COLUMNS, DedupeIndex, merge_fields
+from quotahit_dispatch import CHANNELS, Dispatcher, FakeChannel, ResendEmail, TwilioMessaging
+from quotahit_enrich import ENRICH_COLUMNS, CompanyCache, Enricher, PerplexityResearch, StubResearch
+from quotahit_import import iter_chunks, iter_rows, normalize_row
+from quotahit_metrics import Metrics, PrometheusExporter
+from quotahit_scoring import score_contact, score_contacts
+from quotahit_search import SEARCH_COLUMNS, SearchIndex, SearchIndexStore
+from quotahit_serialize import dumps
+from quotahit_singleflight import SingleFlight
+from quotahit_trends import (
+    GRANULARITIES, TREND_ACTIVITY_COLUMNS, TREND_ACTIVITY_TYPES,
+    DayBucket, TrendBuilder, TrendStore, day_start, period_start, series,
+)
+
+_T_IMPORTED = time.perf_counter()
+
+
+@asynccontextmanager
+async def _lifespan(server):
+    """Start the metrics exporter (and prewarm, and the follow-up dispatcher); stop the
+    dispatcher, campaign runs and enrichment workers, flush write-behind activity
+    rows and stop the exporter (writing the final metrics file) on exit.
+
+    Over HTTP this runs once per client session (per request when stateless),
+    so the final flush is left to _serve_http's shutdown instead.
+    """
+    await _exporter.start()
+    _start_prewarm()
+    _start_dispatcher()
+    try:
+        yield {}
+    finally:
+        if not _serving_http:
+            if _prewarm_task is not None:
+                _prewarm_task.cancel()
+            await _dispatcher.stop(SHUTDOWN_GRACE_SECONDS)
+            await _campaigns.stop(SHUTDOWN_GRACE_SECONDS)
+            await _enricher.stop(SHUTDOWN_GRACE_SECONDS)
+            await _activity_log.flush()
+            await _exporter.stop()
 
-from mcp.server.fastmcp import FastMCP
 
-mcp = FastMCP("QuotaHit Sales Department")
+mcp = FastMCP("QuotaHit Sales Department", lifespan=_lifespan)
 
 # ─── Config ──────────────────────────────────────────────────────────────────
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "")
 
-# Lazy Supabase client
+# HTTP connection pool shared by every tool call (keep-alive, bounded)
+POOL_MAX_CONNECTIONS = int(os.environ.get("QUOTAHIT_POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("QUOTAHIT_POOL_MAX_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("QUOTAHIT_POOL_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.environ.get("QUOTAHIT_HTTP_TIMEOUT", "30"))
+
+# Bulk query sizing — MAX_ROWS should match PostgREST's max-rows setting
+MAX_ROWS = int(os.environ.get("QUOTAHIT_MAX_ROWS", "1000"))
+PAGE_SIZE = min(1000, MAX_ROWS)
+ID_CHUNK_SIZE = 200  # ids per `in.(...)` filter, keeps URLs short
+INSERT_CHUNK_SIZE = 500
+
+# Bulk import: files must live under QUOTAHIT_IMPORT_DIR when it is set
+IMPORT_DIR = os.environ.get("QUOTAHIT_IMPORT_DIR", "")
+IMPORT_MAX_CHUNK = 1000
+IMPORT_ERRORS_PER_CHUNK = 20
+
+# Bulk mutation tools: contacts per call, ids per set-based RPC, errors listed
+BULK_MAX_CONTACTS = int(os.environ.get("QUOTAHIT_BULK_MAX_CONTACTS", "5000"))
+BULK_RPC_CHUNK = 1000
+BULK_ERRORS_REPORTED = 100
+
+# Read-through cache for repeat reads: per-tool TTL seconds (0 disables), LRU bound
+CACHE_TTLS = {
+    "get_contact": 30,
+    "get_pipeline": 60,
+    "get_analytics": 60,
+    **json.loads(os.environ.get("QUOTAHIT_CACHE_TTLS", "{}")),
+}
+CACHE_MAX_ENTRIES = int(os.environ.get("QUOTAHIT_CACHE_MAX_ENTRIES", "1024"))
+
+_cache = ReadThroughCache(CACHE_TTLS, CACHE_MAX_ENTRIES)
+
+# Cached reads that depend on a user's contact rows (stage, value, score, ...)
+DASHBOARD_TOOLS = ("get_pipeline", "get_analytics")
+DASHBOARD_COLUMNS = {"deal_stage", "deal_value", "lead_score", "source", "enrichment_status"}
+DASHBOARD_SELECT = "id, deal_stage, deal_value, lead_score, source, enrichment_status"
+
+# Single-flight: concurrent identical dashboard reads share one in-flight query
+SINGLE_FLIGHT = os.environ.get("QUOTAHIT_SINGLE_FLIGHT", "1") not in ("", "0")
+
+_flights = SingleFlight()
+
+# Per-user pipeline aggregates maintained by write deltas, rebuilt periodically
+AGG_RECONCILE_SECONDS = float(os.environ.get("QUOTAHIT_AGG_RECONCILE_SECONDS", "300"))
+AGG_MAX_USERS = int(os.environ.get("QUOTAHIT_AGG_MAX_USERS", "1000"))
+
+_aggregates = AggregateStore(AGG_RECONCILE_SECONDS, AGG_MAX_USERS)
+
+# Trend rollups: per-user daily buckets; days older than the settle window are frozen
+TRENDS_SETTLE_SECONDS = float(os.environ.get("QUOTAHIT_TRENDS_SETTLE_SECONDS", "300"))
+TRENDS_MAX_USERS = int(os.environ.get("QUOTAHIT_TRENDS_MAX_USERS", "1000"))
+TRENDS_MAX_DAYS = 731
+TRENDS_DEFAULT_DAYS = {"day": 30, "week": 84}
+
+_trends = TrendStore(TRENDS_SETTLE_SECONDS, TRENDS_MAX_USERS)
+
+# In-memory contact search index: on by default, LRU-bounded by indexed contacts
+SEARCH_INDEX = os.environ.get("QUOTAHIT_SEARCH_INDEX", "1") not in ("", "0")
+SEARCH_MAX_DOCS = int(os.environ.get("QUOTAHIT_SEARCH_MAX_DOCS", "500000"))
+SEARCH_REFRESH_SECONDS = float(os.environ.get("QUOTAHIT_SEARCH_REFRESH_SECONDS", "300"))
+SEARCH_FIELDS = {"first_name", "last_name", "email", "company"}
+
+_search = SearchIndexStore(SEARCH_REFRESH_SECONDS, SEARCH_MAX_DOCS)
+
+# Duplicate detection: per-user blocking index (same LRU bound and refresh as search)
+DEDUPE_MIN_SCORE = float(os.environ.get("QUOTAHIT_DEDUPE_MIN_SCORE", "0.5"))
+DEDUPE_MAX_BLOCK = int(os.environ.get("QUOTAHIT_DEDUPE_MAX_BLOCK", "100"))
+DEDUPE_COUNTRY_CODE = os.environ.get("QUOTAHIT_DEFAULT_COUNTRY_CODE", "1")
+DEDUPE_FIELDS = {"first_name", "last_name", "email", "phone", "company"}
+MERGE_MAX_DUPLICATES = 50
+MERGE_TABLES = ("activities", "follow_up_messages", "deal_stage_history", "notifications")
+
+_dedupe = SearchIndexStore(SEARCH_REFRESH_SECONDS, SEARCH_MAX_DOCS)
+
+# Write-behind activity log: batch on size or time, bounded queue applies backpressure
+ACTIVITY_BATCH_SIZE = int(os.environ.get("QUOTAHIT_ACTIVITY_BATCH_SIZE", "200"))
+ACTIVITY_FLUSH_SECONDS = float(os.environ.get("QUOTAHIT_ACTIVITY_FLUSH_SECONDS", "0.5"))
+ACTIVITY_MAX_QUEUE = int(os.environ.get("QUOTAHIT_ACTIVITY_MAX_QUEUE", "10000"))
+
+# Follow-up dispatcher: the background loop runs only with QUOTAHIT_DISPATCH
+# (--dispatch); send_followup works either way. Providers come from the web
+# app's settings (RESEND_*, TWILIO_*); QUOTAHIT_DISPATCH_BACKEND=fake sends
+# every channel to an in-memory FakeChannel
+DISPATCH = os.environ.get("QUOTAHIT_DISPATCH", "") not in ("", "0")
+DISPATCH_BACKEND = os.environ.get("QUOTAHIT_DISPATCH_BACKEND", "")
+DISPATCH_RATES = json.loads(os.environ.get("QUOTAHIT_DISPATCH_RATES", "{}"))  # channel -> sends/second
+DISPATCH_CONCURRENCY = int(os.environ.get("QUOTAHIT_DISPATCH_CONCURRENCY", "20"))  # sends in flight per channel
+DISPATCH_BATCH_SIZE = int(os.environ.get("QUOTAHIT_DISPATCH_BATCH_SIZE", "200"))
+DISPATCH_POLL_SECONDS = float(os.environ.get("QUOTAHIT_DISPATCH_POLL_SECONDS", "2"))
+DISPATCH_LEASE_SECONDS = int(os.environ.get("QUOTAHIT_DISPATCH_LEASE_SECONDS", "300"))
+DISPATCH_MAX_ATTEMPTS = int(os.environ.get("QUOTAHIT_DISPATCH_MAX_ATTEMPTS", "3"))
+DISPATCH_RETRY_SECONDS = float(os.environ.get("QUOTAHIT_DISPATCH_RETRY_SECONDS", "60"))
+
+# Campaign execution: contacts in flight and contacts/second per campaign (0 =
+# unlimited; execute_campaign can override both), checkpoint cadence and lease
+CAMPAIGN_CONCURRENCY = int(os.environ.get("QUOTAHIT_CAMPAIGN_CONCURRENCY", "8"))
+CAMPAIGN_RATE = float(os.environ.get("QUOTAHIT_CAMPAIGN_RATE", "0"))
+CAMPAIGN_CHECKPOINT_EVERY = int(os.environ.get("QUOTAHIT_CAMPAIGN_CHECKPOINT_EVERY", "200"))
+CAMPAIGN_CHECKPOINT_SECONDS = float(os.environ.get("QUOTAHIT_CAMPAIGN_CHECKPOINT_SECONDS", "2"))
+CAMPAIGN_LEASE_SECONDS = int(os.environ.get("QUOTAHIT_CAMPAIGN_LEASE_SECONDS", "60"))
+
+# Lead enrichment: research runs on Perplexity (PERPLEXITY_API_KEY, or
+# OPENROUTER_API_KEY) unless QUOTAHIT_ENRICH_PROVIDER=stub. Company research
+# is cached for QUOTAHIT_ENRICH_CACHE_TTL_SECONDS in QUOTAHIT_ENRICH_CACHE_FILE
+# ("" keeps it in memory only)
+ENRICH_PROVIDER = os.environ.get("QUOTAHIT_ENRICH_PROVIDER", "")
+ENRICH_WORKERS = int(os.environ.get("QUOTAHIT_ENRICH_WORKERS", "8"))
+ENRICH_BATCH_SIZE = int(os.environ.get("QUOTAHIT_ENRICH_BATCH_SIZE", "200"))
+ENRICH_FLUSH_SECONDS = float(os.environ.get("QUOTAHIT_ENRICH_FLUSH_SECONDS", "1"))
+ENRICH_CACHE_TTL_SECONDS = float(os.environ.get("QUOTAHIT_ENRICH_CACHE_TTL_SECONDS", str(30 * 86400)))
+ENRICH_CACHE_MAX_ENTRIES = int(os.environ.get("QUOTAHIT_ENRICH_CACHE_MAX_ENTRIES", "50000"))
+ENRICH_CACHE_FILE = os.environ.get(
+    "QUOTAHIT_ENRICH_CACHE_FILE",
+    os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "quotahit", "company_research.json"),
+)
+
+# Response encoding: compact unless QUOTAHIT_JSON_PRETTY; default size budget (0 = none)
+RESPONSE_PRETTY = os.environ.get("QUOTAHIT_JSON_PRETTY", "") not in ("", "0")
+RESPONSE_MAX_TOKENS = int(os.environ.get("QUOTAHIT_MAX_RESPONSE_TOKENS", "0"))
+
+# Metrics: always collected; optionally published in Prometheus text format
+METRICS_FILE = os.environ.get("QUOTAHIT_METRICS_FILE", "")
+METRICS_PORT = int(os.environ.get("QUOTAHIT_METRICS_PORT", "0"))
+METRICS_INTERVAL = float(os.environ.get("QUOTAHIT_METRICS_INTERVAL", "15"))
+
+# Shared HTTP serving (--transport streamable-http). QUOTAHIT_HTTP_TOKENS maps
+# bearer tokens to the user ids they may act for ("*" = any user)
+TRANSPORT = os.environ.get("QUOTAHIT_TRANSPORT", "stdio")
+HTTP_HOST = os.environ.get("QUOTAHIT_HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.environ.get("QUOTAHIT_HTTP_PORT", "8765"))
+HTTP_PATH = os.environ.get("QUOTAHIT_HTTP_PATH", "/mcp")
+HTTP_TOKENS = json.loads(os.environ.get("QUOTAHIT_HTTP_TOKENS", "{}"))
+SHUTDOWN_GRACE_SECONDS = float(os.environ.get("QUOTAHIT_SHUTDOWN_GRACE_SECONDS", "30"))
+
+# Tool calls executing at once across all clients; the rest wait their turn
+MAX_CONCURRENT_TOOLS = int(os.environ.get("QUOTAHIT_MAX_CONCURRENT_TOOLS", "32"))
+
+_tool_slots = asyncio.Semaphore(MAX_CONCURRENT_TOOLS)
+_serving_http = False
+
+_metrics = Metrics()
+_exporter = PrometheusExporter(_metrics, METRICS_FILE, METRICS_PORT, METRICS_INTERVAL)
+
+# Cold start: QUOTAHIT_PREWARM (--prewarm) imports supabase off the event loop,
+# builds the client and opens the first pooled connection while the MCP
+# handshake runs. The timing breakdown goes to stderr (stdout is the transport)
+PREWARM = os.environ.get("QUOTAHIT_PREWARM", "") not in ("", "0")
+STARTUP_REPORT = os.environ.get("QUOTAHIT_STARTUP_REPORT", "1") not in ("", "0")
+
+_startup = dict.fromkeys(("import_s", "register_s", "client_import_s", "client_init_s", "first_query_s", "ready_s"))
+_startup["import_s"] = round(_T_IMPORTED - _T0, 3)
+_startup["prewarm"] = False
+_prewarm_task = None
+
+# Lazy async Supabase client
 _supabase = None
+_supabase_lock = asyncio.Lock()
 
 
-def _get_supabase():
-    """Get or create Supabase client (lazy init)."""
+async def _get_supabase():
+    """Get or create the async Supabase client (lazy init, pooled HTTP)."""
     global _supabase
-    if _supabase is None:
-        try:
-            from supabase import create_client
-            _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        except ImportError:
-            raise RuntimeError(
-                "supabase-py not installed. Run: pip3 install supabase"
-            )
-        except Exception as e:
-            raise RuntimeError(f"Failed to connect to Supabase: {e}")
+    if _supabase is not None:
+        return _supabase
+    async with _supabase_lock:
+        if _supabase is None:
+            started = time.perf_counter()
+            try:
+                import httpx
+                from supabase import AsyncClientOptions, acreate_client
+            except ImportError:
+                raise RuntimeError(
+                    "supabase-py not installed. Run: pip3 install supabase"
+                )
+            imported = time.perf_counter()
+            try:
+                http = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=HTTP_TIMEOUT,
+                    follow_redirects=True,
+                    event_hooks={"response": [_count_response]},
+                )
+                _supabase = await acreate_client(
+                    SUPABASE_URL,
+                    SUPABASE_KEY,
+                    options=AsyncClientOptions(httpx_client=http),
+                )
+            except Exception as e:
+                raise RuntimeError(f"Failed to connect to Supabase: {e}")
+            if _startup["client_import_s"] is None:  # prewarm may have imported already
+                _startup["client_import_s"] = round(imported - started, 3)
+            _startup["client_init_s"] = round(time.perf_counter() - imported, 3)
     return _supabase
 
 
-def _json(data) -> str:
-    """Format data as indented JSON string."""
-    return json.dumps(data, indent=2, default=str)
+def _import_client():
+    import httpx  # noqa: F401
+    import supabase  # noqa: F401
+
+
+async def _prewarm():
+    """Import supabase in a thread, build the client, then run one tiny query to open a connection."""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_import_client)
+    except ImportError:
+        return  # _get_supabase reports it on the first tool call
+    _startup["client_import_s"] = round(time.perf_counter() - started, 3)
+    try:
+        sb = await _get_supabase()
+        await sb.table("contacts").select("id").limit(1).execute()
+    except Exception as e:
+        print(f"quotahit: prewarm failed, connecting on first use: {e}", file=sys.stderr)
+
+
+def _start_prewarm():
+    global _prewarm_task
+    if PREWARM and _prewarm_task is None:
+        _startup["prewarm"] = True
+        _prewarm_task = asyncio.get_running_loop().create_task(_prewarm())
+
+
+def _first_query(response):
+    """Record the first Supabase round-trip (connect + TLS + query) and print the startup report."""
+    _startup["first_query_s"] = round(response.elapsed.total_seconds(), 3)
+    _startup["ready_s"] = round(time.perf_counter() - _T0, 3)
+    if STARTUP_REPORT:
+        phases = ", ".join(
+            f"{key[:-2].replace('_', ' ')} {value:.3f}s"
+            for key, value in _startup.items() if key.endswith("_s") and value is not None
+        )
+        mode = "prewarmed" if _startup["prewarm"] else "on first call"
+        print(f"quotahit startup ({mode}): {phases}", file=sys.stderr, flush=True)
+
+
+def _activities_written(rows: list[dict]):
+    """Drop cached get_contact reads that were served before these rows landed."""
+    for key in {(r["user_id"], r.get("contact_id")) for r in rows}:
+        _cache.invalidate(key[0], ("get_contact",), subject=key[1])
+
+
+_activity_log = ActivityLogger(
+    _get_supabase,
+    batch_size=ACTIVITY_BATCH_SIZE,
+    flush_interval=ACTIVITY_FLUSH_SECONDS,
+    max_queue=ACTIVITY_MAX_QUEUE,
+    on_written=_activities_written,
+)
+
+
+def _dispatch_backends() -> dict:
+    """Channel -> backend for every channel whose provider is configured."""
+    if DISPATCH_BACKEND == "fake":
+        return dict.fromkeys(CHANNELS, FakeChannel(concurrency=DISPATCH_CONCURRENCY))
+    backends = {}
+    if os.environ.get("RESEND_API_KEY"):
+        backends["email"] = ResendEmail(
+            os.environ["RESEND_API_KEY"],
+            os.environ.get("RESEND_FROM_EMAIL") or "QuotaHit <noreply@quotahit.com>",
+            concurrency=DISPATCH_CONCURRENCY,
+        )
+    twilio = [os.environ.get(k, "") for k in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER")]
+    if all(twilio):
+        whatsapp_sender = os.environ.get("TWILIO_WHATSAPP_NUMBER", "")
+        backend = TwilioMessaging(*twilio, whatsapp_sender=whatsapp_sender, concurrency=DISPATCH_CONCURRENCY)
+        backends["sms"] = backend
+        if whatsapp_sender:
+            backends["whatsapp"] = backend
+    return backends
+
+
+_dispatcher = Dispatcher(
+    _get_supabase,
+    _dispatch_backends(),
+    rates=DISPATCH_RATES,
+    batch_size=DISPATCH_BATCH_SIZE,
+    poll_interval=DISPATCH_POLL_SECONDS,
+    lease_seconds=DISPATCH_LEASE_SECONDS,
+    max_attempts=DISPATCH_MAX_ATTEMPTS,
+    retry_backoff=DISPATCH_RETRY_SECONDS,
+)
+
+
+_campaigns = CampaignEngine(
+    _get_supabase,
+    concurrency=CAMPAIGN_CONCURRENCY,
+    rate=CAMPAIGN_RATE,
+    checkpoint_every=CAMPAIGN_CHECKPOINT_EVERY,
+    checkpoint_seconds=CAMPAIGN_CHECKPOINT_SECONDS,
+    lease_seconds=CAMPAIGN_LEASE_SECONDS,
+)
+
+
+def _start_dispatcher():
+    if not DISPATCH or _dispatcher.running:
+        return
+    if not _dispatcher.backends:
+        print("quotahit: QUOTAHIT_DISPATCH is set but no channel backend is configured", file=sys.stderr)
+        return
+    _dispatcher.start()
+
+
+# Tool call in progress as [tool name, round-trips so far], so HTTP hooks can
+# attribute traffic to it (shared by tasks the tool spawns)
+_current_call = contextvars.ContextVar("quotahit_call", default=None)
+
+
+async def _count_response(response):
+    """httpx response hook: record the round-trip against the calling tool."""
+    await response.aread()
+    if _startup["first_query_s"] is None:
+        _first_query(response)
+    call = _current_call.get()
+    if call is not None:
+        call[1] += 1
+    _metrics.http_response(
+        call[0] if call is not None else "background",
+        response.headers.get("content-range"),
+        len(response.content),
+        response.num_bytes_downloaded,
+    )
+
+
+def _token_users(authorization: str):
+    """Users a bearer token may act for: "*", a list of user ids, or None if unknown."""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    for known, users in HTTP_TOKENS.items():
+        if hmac.compare_digest(known.encode(), token.strip().encode()):
+            return users
+    return None
+
+
+def _caller_users() -> set | None:
+    """User ids the current HTTP caller is scoped to (None = unrestricted, e.g. stdio)."""
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        return None
+    if request is None or not HTTP_TOKENS:
+        return None
+    users = _token_users(request.headers.get("authorization", ""))
+    if users == "*":
+        return None
+    return set(users or ())
+
+
+def _tool():
+    """Register an MCP tool: scoped to the caller's users, concurrency-limited, timed,
+    and with its Supabase traffic counted under its name."""
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        scoped = "user_id" in signature.parameters
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            call = [fn.__name__, 0]
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            result, error = None, True
+            try:
+                users = _caller_users() if scoped else None
+                if users is not None:
+                    user_id = signature.bind_partial(*args, **kwargs).arguments.get("user_id", "")
+                    if user_id not in users:
+                        result, error = f"Error: this token is not authorized for user_id '{user_id}'", False
+                        return result
+                async with _tool_slots:
+                    result = await fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                _current_call.reset(token)
+                _metrics.call(fn.__name__, time.perf_counter() - start, result, error, call[1])
+        return mcp.tool()(wrapper)
+    return decorator
+
+
+def _json(data, max_tokens: int = 0) -> str:
+    """Format data as a JSON string, truncated to the (per-call or default) token budget."""
+    return dumps(data, pretty=RESPONSE_PRETTY, max_tokens=max_tokens or RESPONSE_MAX_TOKENS)
+
+
+def _chunks(items, size):
+    """Split a list into consecutive chunks of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _full_name(contact: dict) -> str:
+    """Display name from first/last name columns."""
+    return f"{contact.get('first_name') or ''} {contact.get('last_name') or ''}".strip()
+
+
+def _rpc_missing(error) -> bool:
+    """True if a PostgREST error means the SQL function isn't deployed."""
+    return getattr(error, "code", "") in ("PGRST202", "42883")
+
+
+async def _iter_pages(build, page_size: int = PAGE_SIZE, after_id: str | None = None):
+    """Yield pages of rows using keyset pagination on `id`, starting after `after_id`.
+
+    `build` returns a fresh filtered query (its select must include `id`).
+    Pages are capped at MAX_ROWS so a short page reliably marks the end,
+    even when PostgREST enforces a server-side row limit.
+    """
+    page_size = max(1, min(page_size, MAX_ROWS))
+    last_id = after_id
+    while True:
+        query = build()
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = (await query.order("id").limit(page_size).execute()).data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+async def _rpc_rows(call) -> list:
+    """Every row of a set-returning RPC, fetched in MAX_ROWS pages.
+
+    `call` returns a fresh rpc() builder ordered on a unique key, so offset
+    pages are stable; a short page marks the end. PostgREST would otherwise
+    cut the result off at its max-rows limit without an error.
+    """
+    rows = []
+    while True:
+        page = (await call().range(len(rows), len(rows) + MAX_ROWS - 1).execute()).data or []
+        rows.extend(page)
+        if len(page) < MAX_ROWS:
+            return rows
+
+
+def _encode_cursor(sort: str, row: dict, column: str) -> str:
+    """Opaque cursor pointing just past `row` in `sort` order."""
+    raw = json.dumps([sort, row.get(column), row["id"]], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    """(sort value, id) from a cursor; ValueError if malformed or from another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, last_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError(f"cursor was issued for sort '{cursor_sort}', not '{sort}'")
+    return value, last_id
+
+
+def _keyset_after(query, column: str, value, last_id: str):
+    """Filter to rows after (value, last_id) in `column DESC NULLS LAST, id DESC` order."""
+    if value is None:
+        return query.is_(column, "null").lt("id", last_id)
+    quoted = '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return query.or_(
+        f"{column}.lt.{quoted},"
+        f"and({column}.eq.{quoted},id.lt.{last_id}),"
+        f"{column}.is.null"
+    )
+
+
+def _keyset_order(query, column: str):
+    """Stable order matching _keyset_after: sort column, then id as tiebreaker."""
+    return query.order(column, desc=True, nullsfirst=False).order("id", desc=True)
+
+
+_FILTER_OPS = ("eq", "neq", "lt", "lte", "gt", "gte", "in", "is")
+
+
+def _parse_filter(text: str) -> list[tuple]:
+    """Validate a bulk-tool filter into (operator, column, value) triples.
+
+    `{"column": value}` is equality, a list means `in`, null means `is null`,
+    and `{"column": {"lt": 20}}` picks the operator explicitly.
+    """
+    try:
+        spec = json.loads(text)
+    except json.JSONDecodeError:
+        raise ValueError("filter must be valid JSON")
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("filter must be a non-empty JSON object")
+    ops = []
+    for column, cond in spec.items():
+        if column not in CONTACT_COLUMNS or column == "user_id":
+            raise ValueError(f"unknown filter column '{column}'")
+        if not isinstance(cond, dict):
+            cond = {"is": None} if cond is None else {"in": cond} if isinstance(cond, list) else {"eq": cond}
+        for op, value in cond.items():
+            if op not in _FILTER_OPS:
+                raise ValueError(f"unknown filter operator '{op}'. Valid: {', '.join(_FILTER_OPS)}")
+            ops.append((op, column, value))
+    return ops
+
+
+def _apply_filter(query, ops: list[tuple]):
+    for op, column, value in ops:
+        if op == "in":
+            query = query.in_(column, value)
+        elif op == "is":
+            query = query.is_(column, "null" if value is None else str(value).lower())
+        else:
+            query = getattr(query, op)(column, value)
+    return query
+
+
+def _split_ids(ids: str) -> list[str]:
+    """Unique ids from a comma-separated argument, in order."""
+    return list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+
+
+async def _bulk_ids(sb, user_id: str, contact_ids: str, filter: str) -> list[str]:
+    """Contact ids a bulk tool acts on: the given ids, or every match of `filter`.
+
+    Raises ValueError for a bad or missing target, or more than BULK_MAX_CONTACTS.
+    """
+    if bool(contact_ids.strip()) == bool(filter.strip()):
+        raise ValueError("provide exactly one of contact_ids or filter")
+    if contact_ids.strip():
+        ids = _split_ids(contact_ids)
+    else:
+        ops = _parse_filter(filter)
+        ids = []
+        async for page in _iter_pages(
+            lambda: _apply_filter(sb.table("contacts").select("id").eq("user_id", user_id), ops)
+        ):
+            ids.extend(r["id"] for r in page)
+            if len(ids) > BULK_MAX_CONTACTS:
+                break
+    if len(ids) > BULK_MAX_CONTACTS:
+        raise ValueError(
+            f"more than {BULK_MAX_CONTACTS} contacts targeted; narrow the filter or split the call"
+        )
+    return ids
+
+
+def _bulk_report(ids: list[str], done: set, errors: dict, **extra) -> dict:
+    """Summary for a bulk tool: counts plus per-id failures (ids not done are "not found")."""
+    failed = [{"id": i, "error": errors.get(i, "not found")} for i in ids if i not in done]
+    report = {"matched": len(ids), **extra, "failed": len(failed)}
+    if failed:
+        report["errors"] = failed[:BULK_ERRORS_REPORTED]
+    return report
+
+
+async def _user_index(store: SearchIndexStore, new_index, columns: str, sb, user_id: str):
+    """The user's index from `store`, built from a keyset scan of `columns` on first use."""
+    index = store.get(user_id)
+    if index is not None:
+        return index
+    async with store.lock(user_id):
+        index = store.get(user_id)
+        if index is None:
+            store.begin(user_id)
+            index = new_index()
+            try:
+                async for page in _iter_pages(
+                    lambda: sb.table("contacts").select(columns).eq("user_id", user_id)
+                ):
+                    for row in page:
+                        index.add(row)
+            except BaseException:
+                store.abort(user_id)
+                raise
+            index = store.finish(user_id, index)
+    return index
+
+
+async def _search_index(sb, user_id: str) -> SearchIndex:
+    """The user's search index, built on first use."""
+    return await _user_index(_search, SearchIndex, SEARCH_COLUMNS, sb, user_id)
+
+
+async def _dedupe_index(sb, user_id: str) -> DedupeIndex:
+    """The user's duplicate-blocking index, built on first use."""
+    return await _user_index(
+        _dedupe, lambda: DedupeIndex(DEDUPE_MAX_BLOCK, DEDUPE_COUNTRY_CODE), DEDUPE_COLUMNS, sb, user_id
+    )
+
+
+async def _indexed_search(sb, user_id: str, search: str, columns: str, stage: str, position: int, limit: int):
+    """Ranked search hits from `position` on: (rows, position after the last row, more left)."""
+    index = await _search_index(sb, user_id)
+    hits = islice(index.search(search), position, None)
+    chunk_size = limit if not stage else ID_CHUNK_SIZE
+
+    rows, search_ms = [], 0.0
+    while len(rows) < limit:
+        start = time.perf_counter()
+        chunk = list(islice(hits, chunk_size))
+        search_ms += (time.perf_counter() - start) * 1000
+        if not chunk:
+            break
+        query = sb.table("contacts").select(columns).eq("user_id", user_id).in_("id", chunk)
+        if stage:
+            query = query.eq("deal_stage", stage)
+        found = {r["id"]: r for r in (await query.execute()).data or []}
+        for i, cid in enumerate(chunk, start=1):
+            if cid in found:
+                rows.append(found[cid])
+                if len(rows) == limit:
+                    position += i
+                    _search.record(search_ms)
+                    return rows, position, i < len(chunk) or next(hits, None) is not None
+        position += len(chunk)
+
+    _search.record(search_ms)
+    return rows, position, False
 
 
 # ─── Contact Tools ───────────────────────────────────────────────────────────
 
+# Every selectable contacts column; `fields` arguments are checked against it
+CONTACT_COLUMNS = (
+    "id", "user_id", "first_name", "last_name", "email", "phone", "company", "title",
+    "deal_stage", "deal_value", "probability", "lead_score", "source",
+    "do_not_call", "do_not_email", "last_contacted_at", "next_follow_up_at",
+    "expected_close_date", "tags", "custom_fields", "notes", "enrichment_data",
+    "enrichment_status", "enriched_at", "external_id", "external_provider",
+    "created_at", "updated_at",
+)
+
+# Columns behind list_contacts' summary rows (no notes / JSON blobs)
+LIST_COLUMNS = (
+    "id, first_name, last_name, email, company, title, deal_stage, "
+    "lead_score, deal_value, source, last_contacted_at, created_at"
+)
+
+# list_contacts sort_by → column (each backed by a (user_id, column, id) index)
+SORT_COLUMNS = {
+    "created_at": "created_at",
+    "lead_score": "lead_score",
+    "deal_value": "deal_value",
+    "last_contacted": "last_contacted_at",
+}
+
+
+def _projection(fields: str) -> str:
+    """Validate a comma-separated `fields` argument into a select list (always with id)."""
+    columns = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [c for c in columns if c not in CONTACT_COLUMNS]
+    if unknown:
+        raise ValueError(
+            f"unknown field(s): {', '.join(unknown)}. Valid: {', '.join(CONTACT_COLUMNS)}"
+        )
+    return ", ".join(dict.fromkeys(["id", *columns]))
+
+
+def _list_response(contacts: list[dict], next_cursor: str | None, raw: bool, max_tokens: int) -> str:
+    """list_contacts payload: rows as selected (`raw`) or the summary shape."""
+    if raw:
+        return _json({"count": len(contacts), "contacts": contacts, "next_cursor": next_cursor}, max_tokens)
+
+    return _json({
+        "count": len(contacts),
+        "next_cursor": next_cursor,
+        "contacts": [
+            {
+                "id": c["id"],
+                "name": f"{c.get('first_name', '')} {c.get('last_name', '')}".strip(),
+                "email": c.get("email"),
+                "company": c.get("company"),
+                "title": c.get("title"),
+                "stage": c.get("deal_stage"),
+                "score": c.get("lead_score"),
+                "deal_value": c.get("deal_value"),
+                "source": c.get("source"),
+                "last_contacted": c.get("last_contacted_at"),
+            }
+            for c in contacts
+        ],
+    }, max_tokens)
+
 
-@mcp.tool()
-def list_contacts(
+@_tool()
+async def list_contacts(
     search: str = "",
     stage: str = "",
     sort_by: str = "created_at",
     limit: int = 25,
     offset: int = 0,
     user_id: str = "",
+    fields: str = "",
+    verbose: bool = False,
+    max_tokens: int = 0,
+    cursor: str = "",
 ) -> str:
-    """List contacts with optional filters.
+    """List contacts with optional filters, highest sort value first.
 
     Args:
         search: Search by name, email, or company
         stage: Filter by deal stage (lead, contacted, qualified, proposal, negotiation, won, lost)
-        sort_by: Sort field (created_at, lead_score, deal_value, last_contacted)
+        sort_by: Sort field (created_at, lead_score, deal_value, last_contacted); search
+            results are ranked by relevance instead
         limit: Max results (default 25, max 100)
-        offset: Pagination offset
+        offset: Legacy pagination offset (slow on deep pages — prefer cursor)
         user_id: Required — the user's ID
+        fields: Comma-separated contact columns to return as-is instead of the summary
+        verbose: Return full contact rows (every column) instead of the summary
+        max_tokens: Response size budget; long lists are truncated to fit (0 = no limit)
+        cursor: next_cursor from the previous page (same sort_by and filters)
     """
     if not user_id:
         return "Error: user_id is required"
 
-    sb = _get_supabase()
-    query = sb.table("contacts").select("*").eq("user_id", user_id)
+    sort_column = SORT_COLUMNS.get(sort_by)
+    if not sort_column:
+        return f"Invalid sort_by '{sort_by}'. Valid: {', '.join(SORT_COLUMNS)}"
+    if cursor and offset:
+        return "Error: use either cursor or offset, not both"
+    indexed = bool(search) and SEARCH_INDEX
+
+    try:
+        columns = _projection(f"{fields},{sort_column}") if fields else "*" if verbose else LIST_COLUMNS
+        after = _decode_cursor(cursor, f"search:{search}" if indexed else sort_by) if cursor else None
+    except ValueError as e:
+        return f"Error: {e}"
+
+    limit = max(1, min(limit, 100))
+    sb = await _get_supabase()
+
+    if indexed:
+        position = after[0] if after else offset
+        contacts, position, more = await _indexed_search(sb, user_id, search, columns, stage, position, limit)
+        next_cursor = (
+            _encode_cursor(f"search:{search}", {"id": contacts[-1]["id"], "pos": position}, "pos")
+            if more and contacts else None
+        )
+        return _list_response(contacts, next_cursor, fields or verbose, max_tokens)
+
+    query = sb.table("contacts").select(columns).eq("user_id", user_id)
 
     if search:
         query = query.or_(
@@ -92,73 +951,82 @@ def list_contacts(
         )
     if stage:
         query = query.eq("deal_stage", stage)
+    if after:
+        query = _keyset_after(query, sort_column, *after)
 
-    query = query.order(sort_by, desc=True).range(offset, offset + min(limit, 100) - 1)
-    result = query.execute()
+    query = _keyset_order(query, sort_column)
+    query = query.range(offset, offset + limit - 1) if offset else query.limit(limit)
+    result = await query.execute()
     contacts = result.data or []
+    next_cursor = _encode_cursor(sort_by, contacts[-1], sort_column) if len(contacts) == limit else None
+    return _list_response(contacts, next_cursor, fields or verbose, max_tokens)
 
-    return _json({
-        "count": len(contacts),
-        "contacts": [
-            {
-                "id": c["id"],
-                "name": f"{c.get('first_name', '')} {c.get('last_name', '')}".strip(),
-                "email": c.get("email"),
-                "company": c.get("company"),
-                "title": c.get("title"),
-                "stage": c.get("deal_stage"),
-                "score": c.get("lead_score"),
-                "deal_value": c.get("deal_value"),
-                "source": c.get("source"),
-                "last_contacted": c.get("last_contacted_at"),
-            }
-            for c in contacts
-        ],
-    })
 
-
-@mcp.tool()
-def get_contact(contact_id: str, user_id: str) -> str:
+@_tool()
+async def get_contact(
+    contact_id: str,
+    user_id: str,
+    fields: str = "",
+    max_tokens: int = 0,
+    activities_limit: int = 10,
+    activities_cursor: str = "",
+) -> str:
     """Get full details for a single contact including enrichment data and recent activities.
 
     Args:
         contact_id: The contact's UUID
         user_id: The user's UUID
+        fields: Comma-separated contact columns to return (default: all)
+        max_tokens: Response size budget; long lists/text are truncated to fit (0 = no limit)
+        activities_limit: Activities per page, newest first (max 100)
+        activities_cursor: activities_next_cursor from a previous call, for older activities
     """
-    sb = _get_supabase()
-
-    # Contact
-    contact = (
-        sb.table("contacts")
-        .select("*")
-        .eq("id", contact_id)
-        .eq("user_id", user_id)
-        .single()
-        .execute()
-    ).data
-
-    if not contact:
-        return f"Contact {contact_id} not found"
-
-    # Recent activities
-    activities = (
-        sb.table("activities")
-        .select("*")
-        .eq("contact_id", contact_id)
-        .eq("user_id", user_id)
-        .order("created_at", desc=True)
-        .limit(10)
-        .execute()
-    ).data or []
+    try:
+        columns = _projection(fields) if fields else "*"
+        after = _decode_cursor(activities_cursor, "activities") if activities_cursor else None
+    except ValueError as e:
+        return f"Error: {e}"
+    activities_limit = max(1, min(activities_limit, 100))
+
+    async def load():
+        sb = await _get_supabase()
+
+        activities = sb.table("activities").select("*").eq("contact_id", contact_id).eq("user_id", user_id)
+        if after:
+            activities = _keyset_after(activities, "created_at", *after)
+
+        # Contact and recent activities are independent — fetch them concurrently
+        contact_res, activities_res = await asyncio.gather(
+            sb.table("contacts")
+            .select(columns)
+            .eq("id", contact_id)
+            .eq("user_id", user_id)
+            .single()
+            .execute(),
+            _keyset_order(activities, "created_at").limit(activities_limit).execute(),
+        )
 
-    return _json({
-        "contact": contact,
-        "activities": activities,
-    })
+        contact = contact_res.data
+        if not contact:
+            return f"Contact {contact_id} not found"
+
+        rows = activities_res.data or []
+        return {
+            "contact": contact,
+            "activities": rows,
+            "activities_next_cursor": (
+                _encode_cursor("activities", rows[-1], "created_at") if len(rows) == activities_limit else None
+            ),
+        }
+
+    result = await _cache.get_or_load(
+        "get_contact", user_id, load, subject=contact_id, args=(columns, activities_limit, activities_cursor)
+    )
+    return _json(result, max_tokens) if isinstance(result, dict) else result
 
 
-@mcp.tool()
-def create_contact(
+@_tool()
+async def create_contact(
     first_name: str,
     user_id: str,
     last_name: str = "",
@@ -170,6 +1038,8 @@ def create_contact(
     deal_stage: str = "lead",
     deal_value: float = 0,
     notes: str = "",
+    sync: bool = False,
+    check_duplicates: bool = False,
 ) -> str:
     """Create a new contact in the CRM.
 
@@ -185,8 +1055,11 @@ def create_contact(
         deal_stage: Initial stage (lead, contacted, qualified, proposal, negotiation)
         deal_value: Estimated deal value in USD
         notes: Initial notes
+        sync: Wait for the activity log row to be written before returning
+        check_duplicates: Don't create the contact if it matches an existing one by
+            email, phone, or email domain + name; return the matches instead
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     data = {
         "user_id": user_id,
@@ -202,26 +1075,36 @@ def create_contact(
         "notes": notes,
     }
 
-    result = sb.table("contacts").insert(data).execute()
+    if check_duplicates:
+        matches = (await _dedupe_index(sb, user_id)).matches(data, DEDUPE_MIN_SCORE)
+        if matches:
+            return _json({"created": False, "duplicates": matches[:10]})
+
+    result = await sb.table("contacts").insert(data).execute()
     contact = result.data[0] if result.data else None
 
     if not contact:
         return "Error: Failed to create contact"
 
     # Log activity
-    sb.table("activities").insert({
+    await _activity_log.log({
         "user_id": user_id,
         "contact_id": contact["id"],
         "activity_type": "contact_created",
         "title": "Contact created via MCP",
         "description": f"Created {first_name} {last_name} from {source}",
-    }).execute()
+    }, sync=sync)
+
+    _cache.invalidate(user_id, DASHBOARD_TOOLS)
+    _aggregates.apply(user_id, new=contact)
+    _search.apply(user_id, contact)
+    _dedupe.apply(user_id, contact)
 
     return _json({"created": True, "contact": contact})
 
 
-@mcp.tool()
-def update_contact(
+@_tool()
+async def update_contact(
     contact_id: str,
     user_id: str,
     updates: str = "{}",
@@ -233,7 +1116,7 @@ def update_contact(
         user_id: The user's UUID
         updates: JSON string of fields to update, e.g. '{"deal_stage": "qualified", "deal_value": 5000}'
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     try:
         update_data = json.loads(updates)
@@ -243,9 +1126,22 @@ def update_contact(
     # Prevent changing user_id or id
     update_data.pop("user_id", None)
     update_data.pop("id", None)
+    touches_dashboard = bool(DASHBOARD_COLUMNS & update_data.keys())
+
+    # Old dashboard columns, so materialized aggregates can apply a delta
+    old = None
+    if touches_dashboard and _aggregates.tracks(user_id):
+        rows = (
+            await sb.table("contacts")
+            .select(DASHBOARD_SELECT)
+            .eq("id", contact_id)
+            .eq("user_id", user_id)
+            .execute()
+        ).data
+        old = rows[0] if rows else None
 
     result = (
-        sb.table("contacts")
+        await sb.table("contacts")
         .update(update_data)
         .eq("id", contact_id)
         .eq("user_id", user_id)
@@ -255,29 +1151,383 @@ def update_contact(
     if not result.data:
         return f"Contact {contact_id} not found or update failed"
 
+    _cache.invalidate(user_id, ("get_contact",), subject=contact_id)
+    if touches_dashboard:
+        _cache.invalidate(user_id, DASHBOARD_TOOLS)
+        _aggregates.apply(user_id, old, result.data[0] if old else None)
+    if SEARCH_FIELDS & update_data.keys():
+        _search.apply(user_id, result.data[0])
+    if DEDUPE_FIELDS & update_data.keys():
+        _dedupe.apply(user_id, result.data[0])
+
     return _json({"updated": True, "contact": result.data[0]})
 
 
+@_tool()
+async def import_contacts(
+    user_id: str,
+    path: str = "",
+    rows: str = "",
+    chunk_size: int = 500,
+    source: str = "import",
+    ctx: Context | None = None,
+) -> str:
+    """Bulk-import contacts from a local CSV/JSONL file or an inline JSON array.
+
+    Rows are streamed, validated and normalized (header aliases like "First Name"
+    or "Company Name" are understood; unknown columns go to custom_fields), then
+    inserted chunk by chunk with one bulk activity insert per chunk. Memory is
+    bounded by chunk_size, not file size.
+
+    Args:
+        user_id: The user's UUID
+        path: Path to a .csv, .jsonl or .ndjson file on the server host
+        rows: Inline JSON array of contact objects (alternative to path)
+        chunk_size: Contacts inserted per round-trip (max 1000)
+        source: Lead source for rows that don't set one
+    """
+    if bool(path) == bool(rows):
+        return "Error: provide exactly one of path or rows"
+    if path and _serving_http and not IMPORT_DIR:
+        return "Error: importing from a path over HTTP requires QUOTAHIT_IMPORT_DIR"
+    if path and IMPORT_DIR:
+        root = os.path.realpath(IMPORT_DIR)
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            return f"Error: path must be inside {IMPORT_DIR}"
+    chunk_size = max(1, min(chunk_size, IMPORT_MAX_CHUNK))
+
+    sb = await _get_supabase()
+
+    totals = {"rows": 0, "inserted": 0, "failed": 0}
+    chunks = []
+    try:
+        for index, chunk in enumerate(iter_chunks(iter_rows(path, rows), chunk_size), start=1):
+            contacts, line_nos, errors = [], [], []
+            for line_no, raw in chunk:
+                contact, error = normalize_row(raw, user_id, source)
+                if error:
+                    errors.append({"row": line_no, "error": error})
+                else:
+                    contacts.append(contact)
+                    line_nos.append(line_no)
+
+            inserted = []
+            if contacts:
+                try:
+                    inserted = (
+                        await sb.table("contacts")
+                        .insert(contacts, default_to_null=False)
+                        .execute()
+                    ).data or []
+                except Exception as e:
+                    errors.extend({"row": n, "error": f"insert failed: {e}"} for n in line_nos)
+
+            report = {"chunk": index, "rows": len(chunk), "inserted": len(inserted)}
+            if inserted:
+                try:
+                    await sb.table("activities").insert([
+                        {
+                            "user_id": user_id,
+                            "contact_id": c["id"],
+                            "activity_type": "contact_created",
+                            "title": "Contact imported via MCP",
+                            "description": f"Created {_full_name(c)} from {c.get('source')}",
+                        }
+                        for c in inserted
+                    ], returning="minimal").execute()
+                except Exception as e:
+                    report["activity_error"] = str(e)
+
+                _cache.invalidate(user_id, DASHBOARD_TOOLS)
+                for c in inserted:
+                    _aggregates.apply(user_id, new=c)
+                    _search.apply(user_id, c)
+                    _dedupe.apply(user_id, c)
+
+            report["failed"] = len(errors)
+            if errors:
+                report["errors"] = errors[:IMPORT_ERRORS_PER_CHUNK]
+            chunks.append(report)
+
+            totals["rows"] += len(chunk)
+            totals["inserted"] += len(inserted)
+            totals["failed"] += len(errors)
+            if ctx is not None:
+                await ctx.report_progress(
+                    totals["rows"],
+                    message=f"chunk {index}: {totals['inserted']} imported, {totals['failed']} failed",
+                )
+    except (OSError, ValueError) as e:
+        return _json({"error": str(e), **totals, "chunks": chunks})
+
+    return _json({**totals, "chunks": chunks})
+
+
+@_tool()
+async def find_duplicates(
+    user_id: str,
+    contact_id: str = "",
+    min_score: float = 0,
+    limit: int = 25,
+    max_tokens: int = 0,
+) -> str:
+    """Find likely duplicate contacts (same email, same phone, or same company
+    email domain + similar name), grouped and scored 0-1.
+
+    Contacts are only compared within shared blocking keys, so this stays fast
+    on large books; pass the groups you agree with to merge_contacts.
+
+    Args:
+        user_id: The user's UUID
+        contact_id: Only look for duplicates of this contact
+        min_score: Minimum pair score to report (default QUOTAHIT_DEDUPE_MIN_SCORE, 0.5)
+        limit: Max groups to return (max 200)
+        max_tokens: Response size budget; long lists are truncated to fit (0 = no limit)
+    """
+    min_score = min_score or DEDUPE_MIN_SCORE
+    limit = max(1, min(limit, 200))
+    sb = await _get_supabase()
+    index = await _dedupe_index(sb, user_id)
+
+    if contact_id:
+        rows = (
+            await sb.table("contacts").select(DEDUPE_COLUMNS).eq("id", contact_id).eq("user_id", user_id).execute()
+        ).data
+        if not rows:
+            return f"Contact {contact_id} not found"
+        return _json({"contact_id": contact_id, "duplicates": index.matches(rows[0], min_score)[:limit]}, max_tokens)
+
+    groups, stats = index.duplicates(min_score, limit)
+    return _json({**stats, "groups": groups}, max_tokens)
+
+
+async def _merge_into(sb, user_id: str, primary_id: str, duplicate_ids: list[str]) -> int:
+    """Re-point rows referencing the duplicates to the primary, then delete them; returns activities moved."""
+    try:
+        return (
+            await sb.rpc("mcp_merge_contacts", {
+                "p_user_id": user_id,
+                "p_primary_id": primary_id,
+                "p_duplicate_ids": duplicate_ids,
+            }).execute()
+        ).data or 0
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+
+    # Fallback: the same set-based statements, one round-trip each
+    moved = 0
+    for table in MERGE_TABLES:
+        result = await (
+            sb.table(table)
+            .update({"contact_id": primary_id}, count="exact", returning="minimal")
+            .eq("user_id", user_id)
+            .in_("contact_id", duplicate_ids)
+            .execute()
+        )
+        if table == "activities":
+            moved = result.count or 0
+    await sb.table("contacts").delete(returning="minimal").eq("user_id", user_id).in_("id", duplicate_ids).execute()
+    return moved
+
+
+@_tool()
+async def merge_contacts(
+    primary_id: str,
+    duplicate_ids: str,
+    user_id: str,
+    sync: bool = False,
+) -> str:
+    """Merge duplicate contacts into one. The primary keeps its values; blank fields
+    are filled from the duplicates, tags/notes/custom fields are combined, and all
+    activities, follow-ups and stage history move to the primary in bulk. The
+    duplicates are then deleted.
+
+    Args:
+        primary_id: UUID of the contact to keep
+        duplicate_ids: Comma-separated UUIDs of the contacts to merge into it (max 50)
+        user_id: The user's UUID
+        sync: Wait for the activity log row to be written before returning
+    """
+    ids = [d.strip() for d in duplicate_ids.split(",") if d.strip() and d.strip() != primary_id]
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return "Error: duplicate_ids must name at least one contact other than primary_id"
+    if len(ids) > MERGE_MAX_DUPLICATES:
+        return f"Error: at most {MERGE_MAX_DUPLICATES} duplicates per merge"
+
+    sb = await _get_supabase()
+    rows = (
+        await sb.table("contacts").select("*").eq("user_id", user_id).in_("id", [primary_id, *ids]).execute()
+    ).data or []
+    by_id = {r["id"]: r for r in rows}
+    primary = by_id.get(primary_id)
+    if primary is None:
+        return f"Contact {primary_id} not found"
+    missing = [d for d in ids if d not in by_id]
+    if missing:
+        return f"Error: contact(s) not found: {', '.join(missing)}"
+    duplicates = [by_id[d] for d in ids]
+
+    updates = merge_fields(primary, duplicates)
+    merged = primary
+    if updates:
+        result = await sb.table("contacts").update(updates).eq("id", primary_id).eq("user_id", user_id).execute()
+        if not result.data:
+            return f"Contact {primary_id} not found or update failed"
+        merged = result.data[0]
+    moved = await _merge_into(sb, user_id, primary_id, ids)
+
+    await _activity_log.log({
+        "user_id": user_id,
+        "contact_id": primary_id,
+        "activity_type": "contacts_merged",
+        "title": f"Merged {len(ids)} duplicate contact(s)",
+        "description": ", ".join(_full_name(d) or d["id"] for d in duplicates),
+    }, sync=sync)
+
+    for contact in (primary, *duplicates):
+        _cache.invalidate(user_id, ("get_contact",), subject=contact["id"])
+    _cache.invalidate(user_id, DASHBOARD_TOOLS)
+    _aggregates.apply(user_id, primary, merged)
+    for d in duplicates:
+        _aggregates.apply(user_id, old=d)
+    for store in (_search, _dedupe):
+        store.apply(user_id, merged)
+        for d in ids:
+            store.apply(user_id, removed_id=d)
+
+    return _json({
+        "merged": True,
+        "contact": merged,
+        "removed": ids,
+        "filled": sorted(updates),
+        "activities_moved": moved,
+    })
+
+
 # ─── Lead Intelligence Tools ────────────────────────────────────────────────
 
 
-@mcp.tool()
-def enrich_lead(contact_id: str, user_id: str) -> str:
-    """Trigger AI enrichment for a contact (uses Perplexity/OpenRouter for research).
+def _research_provider():
+    """Stub when QUOTAHIT_ENRICH_PROVIDER=stub, else Perplexity if a key is set, else None."""
+    if ENRICH_PROVIDER == "stub":
+        return StubResearch()
+    if os.environ.get("PERPLEXITY_API_KEY"):
+        return PerplexityResearch(os.environ["PERPLEXITY_API_KEY"], max_connections=ENRICH_WORKERS)
+    if os.environ.get("OPENROUTER_API_KEY"):
+        return PerplexityResearch(os.environ["OPENROUTER_API_KEY"], openrouter=True, max_connections=ENRICH_WORKERS)
+    return None
+
+
+async def _write_enrichment(user_id: str, patches: list[dict]):
+    """Enricher write callback: one batched contacts update, then caches, aggregates and activities."""
+    sb = await _get_supabase()
+    results = await _update_rows(sb, user_id, patches)
+    for r in results:
+        _cache.invalidate(user_id, ("get_contact",), subject=r["contact"]["id"])
+    if results:
+        _cache.invalidate(user_id, DASHBOARD_TOOLS)
+        if all(r["old"] is not None for r in results):
+            for r in results:
+                _aggregates.apply(user_id, r["old"], r["contact"])
+        else:
+            _aggregates.drop(user_id)
+    enriched = [p for p in patches if p["enrichment_status"] == "enriched"]
+    if enriched:
+        await _activity_log.log([
+            {
+                "user_id": user_id,
+                "contact_id": p["id"],
+                "activity_type": "enrichment",
+                "title": "AI enrichment completed",
+                "details": {"fields_found": len(p["enrichment_data"] or {}), "source": "mcp"},
+            }
+            for p in enriched
+        ])
+
+
+_enricher = Enricher(
+    _research_provider(),
+    CompanyCache(ENRICH_CACHE_TTL_SECONDS, ENRICH_CACHE_MAX_ENTRIES, ENRICH_CACHE_FILE),
+    _write_enrichment,
+    workers=ENRICH_WORKERS,
+    batch_size=ENRICH_BATCH_SIZE,
+    flush_interval=ENRICH_FLUSH_SECONDS,
+)
+
+
+async def _start_enrichment(sb, user_id: str, ids: list[str], refresh: bool):
+    """Mark the contacts 'enriching' and queue them; returns (job, ids skipped as already enriched)."""
+    rows = []
+    for chunk in _chunks(ids, ID_CHUNK_SIZE):
+        rows.extend((
+            await sb.table("contacts")
+            .select(f"{ENRICH_COLUMNS}, deal_stage, deal_value, lead_score, source")
+            .eq("user_id", user_id)
+            .in_("id", chunk)
+            .execute()
+        ).data or [])
+    skipped = [] if refresh else [r["id"] for r in rows if r.get("enrichment_status") == "enriched"]
+    if skipped:
+        rows = [r for r in rows if r.get("enrichment_status") != "enriched"]
+
+    for chunk in _chunks([r["id"] for r in rows], ID_CHUNK_SIZE):
+        await sb.table("contacts").update(
+            {"enrichment_status": "enriching"}, returning="minimal"
+        ).eq("user_id", user_id).in_("id", chunk).execute()
+    for r in rows:
+        _cache.invalidate(user_id, ("get_contact",), subject=r["id"])
+        _aggregates.apply(user_id, r, {**r, "enrichment_status": "enriching"})
+    if rows:
+        _cache.invalidate(user_id, DASHBOARD_TOOLS)
+    return await _enricher.submit(user_id, rows), skipped
+
+
+@_tool()
+async def enrich_lead(contact_id: str, user_id: str) -> str:
+    """Enrich a contact with AI company research (Perplexity), waiting for the result.
+    Without a research provider configured, only marks it for the web app's enrichment.
 
     Args:
         contact_id: The contact's UUID
         user_id: The user's UUID
-
-    Returns enrichment status. Full results arrive asynchronously.
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
+
+    if _enricher.provider is not None:
+        job, skipped = await _start_enrichment(sb, user_id, [contact_id], refresh=True)
+        if not job.total:
+            return f"Contact {contact_id} not found"
+        await job.done.wait()
+        report = job.report()
+        if report["enriched"] and not report["write_failed"]:
+            return _json({"status": "enriched", "contact_id": contact_id,
+                          "source": next(k for k in ("cache_hits", "coalesced", "researched") if report[k]),
+                          "message": "Use get_contact() to read the research."})
+        return _json({"status": "failed", "contact_id": contact_id,
+                      "error": (report.get("errors") or [{}])[0].get("error")})
+
+    old = None
+    if _aggregates.tracks(user_id):
+        rows = (
+            await sb.table("contacts")
+            .select(DASHBOARD_SELECT)
+            .eq("id", contact_id)
+            .eq("user_id", user_id)
+            .execute()
+        ).data
+        old = rows[0] if rows else None
 
     # Mark as enriching
-    sb.table("contacts").update(
+    await sb.table("contacts").update(
         {"enrichment_status": "enriching"}
     ).eq("id", contact_id).eq("user_id", user_id).execute()
 
+    _cache.invalidate(user_id, ("get_contact",), subject=contact_id)
+    _cache.invalidate(user_id, ("get_analytics",))
+    _aggregates.apply(user_id, old, {**old, "enrichment_status": "enriching"} if old else None)
+
     return _json({
         "status": "enriching",
         "contact_id": contact_id,
@@ -286,8 +1536,137 @@ def enrich_lead(contact_id: str, user_id: str) -> str:
     })
 
 
-@mcp.tool()
-def score_lead(contact_id: str, user_id: str) -> str:
+@_tool()
+async def enrich_leads(
+    user_id: str,
+    contact_ids: str = "",
+    filter: str = "",
+    refresh: bool = False,
+    wait: bool = False,
+    job_id: str = "",
+) -> str:
+    """Enrich many contacts with AI company research on the server's worker pool.
+    Contacts at the same company share one lookup, cached by company domain.
+
+    Args:
+        user_id: The user's UUID
+        contact_ids: Comma-separated contact UUIDs
+        filter: JSON filter instead of ids, as for bulk_update_contacts
+            (e.g. '{"enrichment_status": "pending"}')
+        refresh: Also re-enrich contacts that are already enriched
+        wait: Return once every result is written instead of right away
+        job_id: Report on an earlier call's job instead of starting one
+    """
+    if job_id:
+        job = _enricher.job(job_id)
+        if job is None or job.user_id != user_id:
+            return f"Enrichment job {job_id} not found"
+        return _json(job.report())
+    if _enricher.provider is None:
+        return "Error: no research provider configured (set PERPLEXITY_API_KEY or OPENROUTER_API_KEY)"
+
+    sb = await _get_supabase()
+    try:
+        ids = await _bulk_ids(sb, user_id, contact_ids, filter)
+    except ValueError as e:
+        return f"Error: {e}"
+    job, skipped = await _start_enrichment(sb, user_id, ids, refresh)
+    if wait:
+        await job.done.wait()
+    return _json({
+        **job.report(),
+        "matched": len(ids),
+        "already_enriched": len(skipped),
+        "not_found": len(ids) - job.total - len(skipped),
+    })
+
+
+SCORE_COLUMNS = (
+    "id, first_name, email, phone, company, title, enrichment_status, "
+    "deal_value, deal_stage, source, do_not_call, do_not_email, lead_score"
+)
+
+
+def _score_contacts(contacts: list[dict], activity_counts: dict) -> list[tuple[int, dict]]:
+    """Score contacts with the vectorized engine (needs numpy)."""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        raise RuntimeError("numpy not installed. Run: pip3 install numpy")
+    return score_contacts(contacts, activity_counts)
+
+
+def _score_activity(user_id: str, contact_id: str, score: int) -> dict:
+    """Activity row logged whenever a lead is scored."""
+    return {
+        "user_id": user_id,
+        "contact_id": contact_id,
+        "activity_type": "lead_scored",
+        "title": f"Lead scored: {score}/100",
+        "details": {"score": score, "source": "mcp"},
+    }
+
+
+async def _activity_counts(sb, user_id: str, contact_ids: list[str] | None = None) -> dict:
+    """Activity count per contact — one grouped RPC, paged scan as fallback."""
+    counts = {}
+    try:
+        for chunk in _chunks(contact_ids, ID_CHUNK_SIZE) if contact_ids else [None]:
+            rows = await _rpc_rows(
+                lambda: sb.rpc(
+                    "mcp_activity_counts",
+                    {"p_user_id": user_id, "p_contact_ids": chunk},
+                ).order("contact_id")
+            )
+            for r in rows:
+                counts[r["contact_id"]] = r["activity_count"]
+        return counts
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+
+    # Fallback: stream only the contact_id column of the user's activities
+    wanted = set(contact_ids) if contact_ids else None
+    counts = {}
+
+    def build():
+        return sb.table("activities").select("id, contact_id").eq("user_id", user_id)
+
+    async for page in _iter_pages(build):
+        for r in page:
+            cid = r["contact_id"]
+            if wanted is None or cid in wanted:
+                counts[cid] = counts.get(cid, 0) + 1
+    return counts
+
+
+async def _write_scores(sb, user_id: str, scores: list[tuple[str, int]]):
+    """Bulk-write lead scores — one RPC per chunk, grouped updates as fallback."""
+    try:
+        for chunk in _chunks(scores, INSERT_CHUNK_SIZE):
+            await sb.rpc("mcp_set_lead_scores", {
+                "p_user_id": user_id,
+                "p_contact_ids": [cid for cid, _ in chunk],
+                "p_scores": [score for _, score in chunk],
+            }).execute()
+        return
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+
+    # Fallback: one update per distinct score (at most 101 values)
+    by_score = {}
+    for cid, score in scores:
+        by_score.setdefault(score, []).append(cid)
+    for score, ids in by_score.items():
+        for chunk in _chunks(ids, ID_CHUNK_SIZE):
+            await sb.table("contacts").update(
+                {"lead_score": score}, returning="minimal"
+            ).eq("user_id", user_id).in_("id", chunk).execute()
+
+
+@_tool()
+async def score_lead(contact_id: str, user_id: str, sync: bool = False) -> str:
     """Calculate and update lead score (0-100) for a contact.
 
     Scoring weights: completeness (20), enrichment (15), deal signals (15),
@@ -296,13 +1675,14 @@ def score_lead(contact_id: str, user_id: str) -> str:
     Args:
         contact_id: The contact's UUID
         user_id: The user's UUID
+        sync: Wait for the activity log row to be written before returning
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     # Fetch contact
     contact = (
-        sb.table("contacts")
-        .select("*")
+        await sb.table("contacts")
+        .select(SCORE_COLUMNS)
         .eq("id", contact_id)
         .eq("user_id", user_id)
         .single()
@@ -314,7 +1694,7 @@ def score_lead(contact_id: str, user_id: str) -> str:
 
     # Count activities
     activities = (
-        sb.table("activities")
+        await sb.table("activities")
         .select("id", count="exact")
         .eq("contact_id", contact_id)
         .eq("user_id", user_id)
@@ -322,100 +1702,114 @@ def score_lead(contact_id: str, user_id: str) -> str:
     )
     activity_count = activities.count or 0
 
-    # Calculate score
-    score = 0
-
-    # Completeness (20)
-    if contact.get("email"):
-        score += 5
-    if contact.get("phone"):
-        score += 5
-    if contact.get("company"):
-        score += 5
-    if contact.get("title"):
-        score += 5
-
-    # Enrichment (15)
-    if contact.get("enrichment_status") == "enriched":
-        score += 15
-
-    # Deal signals (15)
-    deal_value = contact.get("deal_value") or 0
-    if deal_value > 0:
-        score += 10
-    if deal_value > 10000:
-        score += 5
-
-    # Engagement (20)
-    score += min(activity_count * 4, 20)
-
-    # Pipeline stage (15)
-    stage_bonus = {
-        "lead": 0, "contacted": 3, "qualified": 8,
-        "proposal": 12, "negotiation": 15,
-    }
-    stage = contact.get("deal_stage", "")
-    score += stage_bonus.get(stage, 0)
-
-    # Source quality (10)
-    source_bonus = {
-        "referral": 10, "inbound": 8, "linkedin": 6,
-        "website": 5, "import": 3, "manual": 2, "cold": 1, "mcp": 3,
-    }
-    source = contact.get("source", "")
-    score += source_bonus.get(source, 0)
-
-    # DNC penalty
-    if contact.get("do_not_call") and contact.get("do_not_email"):
-        score -= 20
-
-    score = max(0, min(score, 100))
+    score, breakdown = score_contact(contact, activity_count)
 
     # Update
-    sb.table("contacts").update(
+    await sb.table("contacts").update(
         {"lead_score": score}
     ).eq("id", contact_id).eq("user_id", user_id).execute()
 
     # Log
-    sb.table("activities").insert({
-        "user_id": user_id,
-        "contact_id": contact_id,
-        "activity_type": "lead_scored",
-        "title": f"Lead scored: {score}/100",
-        "details": {"score": score, "source": "mcp"},
-    }).execute()
+    await _activity_log.log(_score_activity(user_id, contact_id, score), sync=sync)
+
+    _cache.invalidate(user_id, ("get_contact",), subject=contact_id)
+    _cache.invalidate(user_id, ("get_analytics",))
+    _aggregates.apply(user_id, contact, {**contact, "lead_score": score})
 
     return _json({
         "contact_id": contact_id,
         "score": score,
-        "breakdown": {
-            "completeness": min(sum([
-                5 if contact.get("email") else 0,
-                5 if contact.get("phone") else 0,
-                5 if contact.get("company") else 0,
-                5 if contact.get("title") else 0,
-            ]), 20),
-            "enrichment": 15 if contact.get("enrichment_status") == "enriched" else 0,
-            "deal_signals": min(10 + (5 if deal_value > 10000 else 0), 15) if deal_value > 0 else 0,
-            "engagement": min(activity_count * 4, 20),
-            "stage": stage_bonus.get(stage, 0),
-            "source": source_bonus.get(source, 0),
-        },
+        "breakdown": breakdown,
     })
 
 
-@mcp.tool()
-def qualify_lead(contact_id: str, user_id: str) -> str:
+@_tool()
+async def score_leads_batch(
+    user_id: str,
+    contact_ids: list[str] | None = None,
+    stage: str = "",
+    page_size: int = PAGE_SIZE,
+    max_tokens: int = 0,
+) -> str:
+    """Rescore many contacts at once (e.g. a nightly rescoring job).
+
+    Fetches contacts in pages, counts activities for all of them in one grouped
+    query, scores in memory, then writes scores and activity logs in bulk.
+
+    Args:
+        user_id: The user's UUID
+        contact_ids: Contacts to score (default: every contact of the user)
+        stage: Only score contacts in this deal stage
+        page_size: Contacts fetched per round-trip (max QUOTAHIT_MAX_ROWS)
+        max_tokens: Response size budget; per-contact results are truncated to fit (0 = no limit)
+    """
+    sb = await _get_supabase()
+
+    # Fetch contacts
+    contacts = []
+    if contact_ids:
+        for chunk in _chunks(list(dict.fromkeys(contact_ids)), ID_CHUNK_SIZE):
+            query = (
+                sb.table("contacts")
+                .select(SCORE_COLUMNS)
+                .eq("user_id", user_id)
+                .in_("id", chunk)
+            )
+            if stage:
+                query = query.eq("deal_stage", stage)
+            contacts.extend((await query.execute()).data or [])
+    else:
+        def build():
+            query = sb.table("contacts").select(SCORE_COLUMNS).eq("user_id", user_id)
+            return query.eq("deal_stage", stage) if stage else query
+
+        async for page in _iter_pages(build, page_size):
+            contacts.extend(page)
+
+    if not contacts:
+        return _json({"scored": 0, "results": []})
+
+    # Activity counts for every contact in one grouped query
+    ids = [c["id"] for c in contacts]
+    counts = await _activity_counts(sb, user_id, ids if contact_ids else None)
+
+    # Score in memory
+    results = [
+        {"contact_id": c["id"], "score": score, "breakdown": breakdown}
+        for c, (score, breakdown) in zip(contacts, _score_contacts(contacts, counts))
+    ]
+
+    # Write back in bulk
+    await _write_scores(sb, user_id, [(r["contact_id"], r["score"]) for r in results])
+    for chunk in _chunks(results, INSERT_CHUNK_SIZE):
+        await sb.table("activities").insert(
+            [_score_activity(user_id, r["contact_id"], r["score"]) for r in chunk],
+            returning="minimal",
+        ).execute()
+
+    _cache.invalidate(user_id, ("get_contact", "get_analytics"))
+    for c, r in zip(contacts, results):
+        _aggregates.apply(user_id, c, {**c, "lead_score": r["score"]})
+
+    response = {"scored": len(results), "results": results}
+    if contact_ids:
+        found = set(ids)
+        response["not_found"] = [cid for cid in dict.fromkeys(contact_ids) if cid not in found]
+    return _json(response, max_tokens)
+
+
+@_tool()
+async def qualify_lead(contact_id: str, user_id: str) -> str:
     """Get qualification status or trigger BANT+ qualification for a contact.
 
     Args:
         contact_id: The contact's UUID
         user_id: The user's UUID
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     contact = (
-        sb.table("contacts")
+        await sb.table("contacts")
         .select("first_name, last_name, company, title, deal_stage, lead_score, custom_fields")
         .eq("id", contact_id)
         .eq("user_id", user_id)
@@ -446,19 +1840,19 @@ def qualify_lead(contact_id: str, user_id: str) -> str:
 # ─── Campaign Tools ─────────────────────────────────────────────────────────
 
 
-@mcp.tool()
-def list_campaigns(user_id: str, limit: int = 20) -> str:
+@_tool()
+async def list_campaigns(user_id: str, limit: int = 20) -> str:
     """List all calling/outreach campaigns.
 
     Args:
         user_id: The user's UUID
         limit: Max results
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     result = (
-        sb.table("campaigns")
-        .select("*")
+        await sb.table("campaigns")
+        .select("id, name, type, status, total_contacts, completed_contacts, created_at")
         .eq("user_id", user_id)
         .order("created_at", desc=True)
         .limit(limit)
@@ -483,12 +1877,22 @@ def list_campaigns(user_id: str, limit: int = 20) -> str:
     })
 
 
-@mcp.tool()
-def create_campaign(
+CAMPAIGN_COLUMNS = (
+    "id, user_id, name, status, total_contacts, completed_contacts, contact_filter, message, "
+    "checkpoint, runner_id, heartbeat_at, started_at, completed_at"
+)
+
+
+@_tool()
+async def create_campaign(
     name: str,
     user_id: str,
     campaign_type: str = "outbound",
     description: str = "",
+    body: str = "",
+    channel: str = "email",
+    subject: str = "",
+    contact_filter: str = "",
 ) -> str:
     """Create a new calling/outreach campaign.
 
@@ -497,16 +1901,35 @@ def create_campaign(
         user_id: The user's UUID
         campaign_type: Type (outbound, inbound, nurture, reactivation)
         description: Campaign description
+        body: Outreach message; {{first_name}}, {{last_name}}, {{name}}, {{company}}
+            and {{title}} are filled in per contact
+        channel: email, sms or whatsapp
+        subject: Email subject line (placeholders allowed)
+        contact_filter: JSON filter choosing the contacts, as for bulk_update_contacts
+            (e.g. '{"deal_stage": "lead", "lead_score": {"gte": 60}}'); default all contacts
     """
-    sb = _get_supabase()
+    if channel not in CHANNELS:
+        return f"Invalid channel '{channel}'. Valid: {', '.join(CHANNELS)}"
+    if contact_filter.strip():
+        try:
+            _parse_filter(contact_filter)
+        except ValueError as e:
+            return f"Error: {e}"
 
-    result = sb.table("campaigns").insert({
+    row = {
         "user_id": user_id,
         "name": name,
         "type": campaign_type,
         "description": description,
         "status": "draft",
-    }).execute()
+    }
+    if body.strip():
+        row["message"] = {"channel": channel, "subject": subject or None, "body": body}
+    if contact_filter.strip():
+        row["contact_filter"] = json.loads(contact_filter)
+
+    sb = await _get_supabase()
+    result = await sb.table("campaigns").insert(row).execute()
 
     campaign = result.data[0] if result.data else None
     if not campaign:
@@ -515,210 +1938,498 @@ def create_campaign(
     return _json({"created": True, "campaign": campaign})
 
 
-@mcp.tool()
-def execute_campaign(campaign_id: str, user_id: str) -> str:
-    """Start executing a campaign (changes status to active).
+async def _get_campaign(sb, user_id: str, campaign_id: str) -> dict | None:
+    response = (
+        await sb.table("campaigns")
+        .select(CAMPAIGN_COLUMNS)
+        .eq("id", campaign_id)
+        .eq("user_id", user_id)
+        .maybe_single()
+        .execute()
+    )
+    return response.data if response else None
+
+
+def _column_missing(error) -> bool:
+    """True if a PostgREST error means a selected column doesn't exist (migration not run)."""
+    return getattr(error, "code", "") in ("42703", "PGRST204")
+
+
+def _checkpoint_progress(campaign: dict) -> dict:
+    """Progress of a campaign not running in this process, from its last checkpoint."""
+    total = campaign.get("total_contacts") or 0
+    done = campaign.get("completed_contacts") or 0
+    checkpoint = campaign.get("checkpoint") or {}
+    report = {
+        "campaign_id": campaign["id"],
+        "status": campaign.get("status"),
+        "live": False,
+        "total_contacts": total,
+        "processed": done,
+        "percent": round(min(100.0, 100 * done / total), 1) if total else None,
+        "outcomes": checkpoint.get("outcomes") or {},
+        "started_at": campaign.get("started_at"),
+        "checkpointed_at": campaign.get("heartbeat_at"),
+        "completed_at": campaign.get("completed_at"),
+    }
+    if checkpoint.get("error"):
+        report["error"] = checkpoint["error"]
+    if campaign.get("status") != "active" or not campaign.get("heartbeat_at"):
+        return report
+    try:
+        started = datetime.fromisoformat(campaign["started_at"].replace("Z", "+00:00"))
+        heartbeat = datetime.fromisoformat(campaign["heartbeat_at"].replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return report
+    elapsed = (heartbeat - started).total_seconds()
+    if elapsed > 0 and done:
+        average = done / elapsed
+        report["average_per_second"] = round(average, 2)
+        report["eta_seconds"] = round(max(0, total - done) / average)
+    stale = (datetime.now(timezone.utc) - heartbeat).total_seconds() > CAMPAIGN_LEASE_SECONDS
+    if campaign.get("runner_id") and not stale:
+        report["runner_id"] = campaign["runner_id"]
+        report["note"] = "Running on another server; throughput is the average since the start"
+    else:
+        report["note"] = "No server is running this campaign; execute_campaign resumes it from the checkpoint"
+    return report
+
+
+@_tool()
+async def execute_campaign(
+    campaign_id: str,
+    user_id: str,
+    concurrency: int = 0,
+    rate: float = 0,
+    wait: bool = False,
+) -> str:
+    """Start a campaign, or resume it from its last checkpoint: queue its message for
+    every contact matching its filter, in the background (sent by the follow-up
+    dispatcher). Follow it with campaign_progress.
 
     Args:
         campaign_id: The campaign's UUID
         user_id: The user's UUID
+        concurrency: Contacts processed at once (default QUOTAHIT_CAMPAIGN_CONCURRENCY)
+        rate: Max contacts per second (default QUOTAHIT_CAMPAIGN_RATE, 0 = unlimited)
+        wait: Return only when the run has finished
     """
-    sb = _get_supabase()
+    run = _campaigns.run(campaign_id)
+    if run is not None and run.user_id == user_id and run.status == "running":
+        return _json({"started": False, "note": "Campaign is already running", **run.progress()})
 
-    result = (
-        sb.table("campaigns")
-        .update({"status": "active", "started_at": datetime.utcnow().isoformat()})
-        .eq("id", campaign_id)
-        .eq("user_id", user_id)
-        .execute()
+    sb = await _get_supabase()
+    try:
+        campaign = await _get_campaign(sb, user_id, campaign_id)
+    except Exception as e:
+        if not _column_missing(e):
+            raise
+        return "Error: executing campaigns needs migration 028_mcp_campaign_execution.sql"
+    if not campaign:
+        return f"Campaign {campaign_id} not found"
+    if campaign["status"] == "completed":
+        return _json({"started": False, "note": "Campaign already completed", **_checkpoint_progress(campaign)})
+    message = campaign.get("message") or {}
+    if not (message.get("body") or "").strip():
+        return "Error: campaign has no message to send; create it with a body"
+    if (message.get("channel") or "email") not in CHANNELS:
+        return f"Error: campaign channel '{message.get('channel')}' is not one of {', '.join(CHANNELS)}"
+    try:
+        ops = _parse_filter(json.dumps(campaign["contact_filter"])) if campaign.get("contact_filter") else []
+    except ValueError as e:
+        return f"Error: campaign contact_filter: {e}"
+
+    def build(columns=CAMPAIGN_CONTACT_COLUMNS, **kwargs):
+        return _apply_filter(sb.table("contacts").select(columns, **kwargs).eq("user_id", user_id), ops)
+
+    total = (await build("id", count="exact", head=True).execute()).count or 0
+    run = await _campaigns.start(
+        campaign,
+        lambda after_id: _iter_pages(build, after_id=after_id),
+        total,
+        concurrency=max(0, concurrency),
+        rate=max(0.0, rate),
     )
+    if run is None:
+        return _json({"started": False, "note": "Another server is running this campaign", **_checkpoint_progress(campaign)})
+    if wait:
+        await asyncio.wait({run.task})
+    return _json({"started": True, **run.progress()})
 
-    if not result.data:
-        return f"Campaign {campaign_id} not found"
 
-    return _json({
-        "started": True,
-        "campaign": result.data[0],
-        "note": "Campaign is now active. Contacts will be processed automatically.",
-    })
+@_tool()
+async def campaign_progress(campaign_id: str, user_id: str) -> str:
+    """Progress of a campaign: contacts processed and checkpointed, outcomes
+    (queued, opted_out, no_address, failed), live throughput and ETA.
+
+    Args:
+        campaign_id: The campaign's UUID
+        user_id: The user's UUID
+    """
+    run = _campaigns.run(campaign_id)
+    if run is not None and run.user_id == user_id:
+        return _json(run.progress())
+
+    sb = await _get_supabase()
+    try:
+        campaign = await _get_campaign(sb, user_id, campaign_id)
+    except Exception as e:
+        if not _column_missing(e):
+            raise
+        return "Error: campaign progress needs migration 028_mcp_campaign_execution.sql"
+    if not campaign:
+        return f"Campaign {campaign_id} not found"
+    return _json(_checkpoint_progress(campaign))
 
 
 # ─── Analytics Tools ────────────────────────────────────────────────────────
 
 
-@mcp.tool()
-def get_pipeline(user_id: str) -> str:
+AGGREGATION_MODES = ("auto", "pushdown", "scan")
+
+# Flipped off once mcp_contact_rollup turns out not to be deployed
+_pushdown_available = True
+
+
+async def _scan(build, sink, page_size: int = PAGE_SIZE) -> dict:
+    """Stream every row of a keyset-paged query into `sink`; return scan stats."""
+    start = time.perf_counter()
+    rows = pages = 0
+    async for page in _iter_pages(build, page_size):
+        pages += 1
+        rows += len(page)
+        for row in page:
+            sink(row)
+    return {
+        "rows_scanned": rows,
+        "pages": pages,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+async def _contact_stats(sb, user_id: str, mode: str, page_size: int):
+    """Aggregate a user's contacts in the database (push-down) or by streaming rows.
+
+    Both paths fill the same ContactStats, so they render identical payloads.
+    """
+    global _pushdown_available
+    if mode == "pushdown" or (mode == "auto" and _pushdown_available):
+        start = time.perf_counter()
+        try:
+            # Grouped on free-text source too, so the row count can pass max-rows
+            groups = await _rpc_rows(
+                lambda: sb.rpc("mcp_contact_rollup", {"p_user_id": user_id})
+                .order("deal_stage").order("source").order("score_bucket").order("enriched")
+            )
+        except Exception as e:
+            if mode == "pushdown" or not _rpc_missing(e):
+                raise
+            _pushdown_available = False
+        else:
+            stats = ContactStats()
+            for g in groups:
+                stats.add_group(
+                    stage=g["deal_stage"],
+                    source=g["source"],
+                    bucket=g["score_bucket"],
+                    enriched=g["enriched"],
+                    count=g["contacts"],
+                    value=float(g["total_value"] or 0),
+                )
+            return stats, {
+                "mode": "pushdown",
+                "groups": len(groups),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+
+    stats = ContactStats()
+    scan = await _scan(
+        lambda: sb.table("contacts").select(DASHBOARD_SELECT).eq("user_id", user_id),
+        stats.add,
+        page_size,
+    )
+    return stats, {"mode": "scan", **scan}
+
+
+async def _coalesced(tool: str, user_id: str, args: tuple, load):
+    """Run `load()` once for concurrent identical calls made since the user's last write."""
+    if not SINGLE_FLIGHT:
+        return await load()
+    return await _flights.run((tool, user_id, args, _cache.generation(user_id)), load)
+
+
+async def _dashboard_stats(user_id: str, mode: str, page_size: int):
+    """Materialized aggregates when current (mode=auto), else rebuild them."""
+    if mode == "auto":
+        stats = _aggregates.get(user_id)
+        if stats is not None:
+            return stats, _aggregates.info(user_id)
+
+    generation = _aggregates.generation(user_id)
+    sb = await _get_supabase()
+    stats, scan = await _contact_stats(sb, user_id, mode, page_size)
+    _aggregates.put(user_id, stats, generation)
+    return stats, scan
+
+
+@_tool()
+async def get_pipeline(user_id: str, mode: str = "auto", page_size: int = PAGE_SIZE) -> str:
     """Get current pipeline status — contacts by stage with total values.
 
     Args:
         user_id: The user's UUID
+        mode: auto (materialized aggregates, else database rollup or streaming), pushdown, or scan
+        page_size: Contacts fetched per round-trip when streaming
     """
-    sb = _get_supabase()
-
-    contacts = (
-        sb.table("contacts")
-        .select("deal_stage, deal_value")
-        .eq("user_id", user_id)
-        .execute()
-    ).data or []
+    if mode not in AGGREGATION_MODES:
+        return f"Invalid mode '{mode}'. Valid: {', '.join(AGGREGATION_MODES)}"
 
-    # Aggregate by stage
-    stages = {}
-    for c in contacts:
-        stage = c.get("deal_stage", "lead")
-        if stage not in stages:
-            stages[stage] = {"count": 0, "total_value": 0}
-        stages[stage]["count"] += 1
-        stages[stage]["total_value"] += c.get("deal_value") or 0
+    async def load():
+        stats, scan = await _dashboard_stats(user_id, mode, page_size)
+        return {**stats.pipeline(), "scan": scan}
 
-    return _json({
-        "total_contacts": len(contacts),
-        "total_pipeline_value": sum(s["total_value"] for s in stages.values()),
-        "by_stage": stages,
-    })
+    return _json(await _cache.get_or_load(
+        "get_pipeline", user_id, lambda: _coalesced("get_pipeline", user_id, (mode,), load), args=(mode,)
+    ))
 
 
-@mcp.tool()
-def get_analytics(user_id: str) -> str:
+@_tool()
+async def get_analytics(user_id: str, mode: str = "auto", page_size: int = PAGE_SIZE) -> str:
     """Get full dashboard analytics — KPIs, conversion rates, scoring distribution.
 
     Args:
         user_id: The user's UUID
+        mode: auto (materialized aggregates, else database rollup or streaming), pushdown, or scan
+        page_size: Contacts fetched per round-trip when streaming
     """
-    sb = _get_supabase()
-
-    contacts = (
-        sb.table("contacts")
-        .select("deal_stage, deal_value, lead_score, source, created_at, enrichment_status")
-        .eq("user_id", user_id)
-        .execute()
-    ).data or []
+    if mode not in AGGREGATION_MODES:
+        return f"Invalid mode '{mode}'. Valid: {', '.join(AGGREGATION_MODES)}"
 
-    total = len(contacts)
-    if total == 0:
-        return _json({"message": "No contacts yet", "total": 0})
-
-    # Score distribution
-    score_buckets = {"0-20": 0, "21-40": 0, "41-60": 0, "61-80": 0, "81-100": 0}
-    for c in contacts:
-        s = c.get("lead_score") or 0
-        if s <= 20:
-            score_buckets["0-20"] += 1
-        elif s <= 40:
-            score_buckets["21-40"] += 1
-        elif s <= 60:
-            score_buckets["41-60"] += 1
-        elif s <= 80:
-            score_buckets["61-80"] += 1
-        else:
-            score_buckets["81-100"] += 1
+    async def load():
+        stats, scan = await _dashboard_stats(user_id, mode, page_size)
+        return {**stats.analytics(), "scan": scan}
 
-    # By source
-    by_source = {}
-    for c in contacts:
-        src = c.get("source", "unknown")
-        by_source[src] = by_source.get(src, 0) + 1
+    return _json(await _cache.get_or_load(
+        "get_analytics", user_id, lambda: _coalesced("get_analytics", user_id, (mode,), load), args=(mode,)
+    ))
 
-    # Stage conversion
-    stage_order = ["lead", "contacted", "qualified", "proposal", "negotiation", "won"]
-    by_stage = {}
-    for c in contacts:
-        stage = c.get("deal_stage", "lead")
-        by_stage[stage] = by_stage.get(stage, 0) + 1
 
-    won = by_stage.get("won", 0)
-    won_value = sum(c.get("deal_value", 0) for c in contacts if c.get("deal_stage") == "won")
-    enriched = sum(1 for c in contacts if c.get("enrichment_status") == "enriched")
-
-    return _json({
-        "total_contacts": total,
-        "enriched": enriched,
-        "enrichment_rate": round(enriched / total * 100, 1) if total else 0,
-        "won_deals": won,
-        "won_value": won_value,
-        "win_rate": round(won / total * 100, 1) if total else 0,
-        "avg_deal_value": round(won_value / won, 2) if won else 0,
-        "score_distribution": score_buckets,
-        "by_source": by_source,
-        "by_stage": by_stage,
-    })
+FORECAST_MODES = ("point", "simulate")
+MAX_TRIALS = 1_000_000
 
 
-@mcp.tool()
-def get_forecast(user_id: str) -> str:
+@_tool()
+async def get_forecast(
+    user_id: str,
+    page_size: int = PAGE_SIZE,
+    mode: str = "point",
+    trials: int = 100_000,
+    target: float = 0,
+) -> str:
     """Revenue forecast based on pipeline stage probabilities.
 
+    mode="simulate" adds a Monte Carlo forecast: `trials` runs in which every
+    deal closes independently with its stage probability, reported as P10/P50/P90
+    revenue plus the probability of reaching `target`.
+
     Args:
         user_id: The user's UUID
+        page_size: Deals fetched per round-trip while streaming the pipeline
+        mode: point (weighted forecast only) or simulate (adds percentile bands)
+        trials: Number of Monte Carlo trials in simulate mode (max 1,000,000)
+        target: Revenue target for the hit probability in simulate mode
     """
-    sb = _get_supabase()
+    if mode not in FORECAST_MODES:
+        return f"Invalid mode '{mode}'. Valid: {', '.join(FORECAST_MODES)}"
+    if not 1 <= trials <= MAX_TRIALS:
+        return f"Error: trials must be between 1 and {MAX_TRIALS}"
+
+    async def load():
+        sb = await _get_supabase()
+
+        stats = ForecastStats(top_k=10)
+        values, probs = array("d"), array("d")
+
+        def sink(row):
+            stats.add(row)
+            if mode == "simulate":
+                values.append(row["deal_value"])
+                probs.append(STAGE_PROBABILITY.get(row.get("deal_stage", "lead"), 0.05))
+
+        scan = await _scan(
+            lambda: (
+                sb.table("contacts")
+                .select("id, deal_stage, deal_value, first_name, last_name, company")
+                .eq("user_id", user_id)
+                .not_.is_("deal_value", "null")
+                .gt("deal_value", 0)
+            ),
+            sink,
+            page_size,
+        )
 
-    contacts = (
-        sb.table("contacts")
-        .select("deal_stage, deal_value, first_name, last_name, company")
-        .eq("user_id", user_id)
-        .not_.is_("deal_value", "null")
-        .gt("deal_value", 0)
-        .execute()
-    ).data or []
+        response = stats.forecast()
+        if mode == "simulate":
+            try:
+                from quotahit_forecast import simulate_revenue
+            except ImportError:
+                raise RuntimeError("numpy not installed. Run: pip3 install numpy")
+            start = time.perf_counter()
+            response["simulation"] = simulate_revenue(values, probs, trials=trials, target=target)
+            response["simulation"]["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
 
-    # Stage → probability
-    stage_prob = {
-        "lead": 0.05,
-        "contacted": 0.10,
-        "qualified": 0.30,
-        "proposal": 0.60,
-        "negotiation": 0.80,
-        "won": 1.00,
-        "lost": 0.00,
-    }
+        return {**response, "scan": scan}
 
-    total_weighted = 0
-    total_pipeline = 0
-    deals = []
-
-    for c in contacts:
-        value = c.get("deal_value", 0)
-        stage = c.get("deal_stage", "lead")
-        prob = stage_prob.get(stage, 0.05)
-        weighted = value * prob
-        total_weighted += weighted
-        total_pipeline += value
-
-        deals.append({
-            "name": f"{c.get('first_name', '')} {c.get('last_name', '')}".strip(),
-            "company": c.get("company"),
-            "stage": stage,
-            "value": value,
-            "probability": prob,
-            "weighted_value": round(weighted, 2),
-        })
+    return _json(await _coalesced("get_forecast", user_id, (mode, trials, target), load))
 
-    deals.sort(key=lambda d: -d["weighted_value"])
 
-    return _json({
-        "total_pipeline": total_pipeline,
-        "weighted_forecast": round(total_weighted, 2),
-        "deal_count": len(deals),
-        "top_deals": deals[:10],
-    })
+_trend_pushdown_available = True
+
+
+def _parse_since(since: str, granularity: str, today: date) -> date:
+    """First day from an ISO date or a relative '90d' / '12w' (default per granularity)."""
+    if not since:
+        return today - timedelta(days=TRENDS_DEFAULT_DAYS[granularity] - 1)
+    unit = since[-1:].lower()
+    if unit in ("d", "w") and since[:-1].isdigit():
+        days = int(since[:-1]) * (7 if unit == "w" else 1)
+        return today - timedelta(days=max(days, 1) - 1)
+    try:
+        return date.fromisoformat(since[:10])
+    except ValueError:
+        raise ValueError(f"invalid since '{since}' (use an ISO date like 2025-01-31, or 90d / 12w)")
+
+
+async def _trend_range(sb, user_id: str, start: date, end: date | None, page_size: int):
+    """Daily buckets for rows created in [start, end) — database rollup, else streamed."""
+    global _trend_pushdown_available
+    builder = TrendBuilder()
+    if _trend_pushdown_available:
+        try:
+            # One row per day, metric and key: a long range runs past max-rows, so page it
+            groups = await _rpc_rows(
+                lambda: sb.rpc("mcp_trend_rollup", {
+                    "p_user_id": user_id,
+                    "p_from": day_start(start),
+                    "p_to": day_start(end) if end else None,
+                }).order("day").order("metric").order("key")
+            )
+        except Exception as e:
+            if not _rpc_missing(e):
+                raise
+            _trend_pushdown_available = False
+        else:
+            for g in groups:
+                builder.add_group(g["day"], g["metric"], g["key"], g["count"], g["value"])
+            return builder, "pushdown"
+
+    def created_in(query):
+        query = query.eq("user_id", user_id).gte("created_at", day_start(start))
+        return query.lt("created_at", day_start(end)) if end else query
+
+    await _scan(lambda: created_in(sb.table("contacts").select("id, created_at")), builder.add_contact, page_size)
+    await _scan(
+        lambda: created_in(
+            sb.table("activities")
+            .select(TREND_ACTIVITY_COLUMNS)
+            .in_("activity_type", list(TREND_ACTIVITY_TYPES))
+        ),
+        builder.add_activity,
+        page_size,
+    )
+
+    # Won deals logged before stage_changed carried a value: credit the contact's current one
+    values = {}
+    for chunk in _chunks(builder.unvalued_contacts(), ID_CHUNK_SIZE):
+        rows = (
+            await sb.table("contacts")
+            .select("id, deal_value")
+            .eq("user_id", user_id)
+            .in_("id", chunk)
+            .execute()
+        ).data or []
+        values.update((r["id"], r["deal_value"]) for r in rows)
+    builder.resolve_values(values)
+    return builder, "scan"
+
+
+@_tool()
+async def get_trends(user_id: str, granularity: str = "day", since: str = "", page_size: int = PAGE_SIZE) -> str:
+    """Pipeline trends over time — new contacts, stage transitions, won deals and
+    value, and the score distribution of leads scored, per day or week (UTC).
+
+    Served from per-user daily rollups: past days are computed once and kept,
+    so a repeat query only scans rows created since the last one.
+
+    Args:
+        user_id: The user's UUID
+        granularity: day or week (weeks start on Monday)
+        since: First day to report — an ISO date (2025-01-31) or relative (90d, 12w); default 30 days or 12 weeks
+        page_size: Rows fetched per round-trip when streaming
+    """
+    if granularity not in GRANULARITIES:
+        return f"Invalid granularity '{granularity}'. Valid: {', '.join(GRANULARITIES)}"
+    until = datetime.now(timezone.utc).date()
+    try:
+        start = period_start(_parse_since(since, granularity, until), granularity)
+    except ValueError as e:
+        return f"Error: {e}"
+    if start > until:
+        return f"Error: since {start} is in the future"
+    if (until - start).days >= TRENDS_MAX_DAYS:
+        return f"Error: at most {TRENDS_MAX_DAYS} days of trends per call"
+
+    async def load():
+        sb = await _get_supabase()
+        began, scanned_at = time.perf_counter(), time.time()
+        entry, ranges = _trends.plan(user_id, start)
+        built, modes, rows = [], set(), 0
+        for lo, hi in ranges:
+            builder, mode = await _trend_range(sb, user_id, lo, hi, page_size)
+            built.append((lo, hi, builder))
+            modes.add(mode)
+            rows += builder.rows
+        days = _trends.commit(user_id, entry, built, scanned_at)
+
+        totals = DayBucket()
+        for day, bucket in days.items():
+            if start <= day <= until:
+                totals.merge(bucket)
+        totals = totals.payload(start)
+        del totals["period"]
+        return {
+            "granularity": granularity,
+            "since": start.isoformat(),
+            "until": until.isoformat(),
+            "totals": totals,
+            "periods": series(days, start, until, granularity),
+            "rollup": {
+                **_trends.info(user_id),
+                "mode": "+".join(sorted(modes)),
+                "ranges_scanned": [[lo.isoformat(), hi.isoformat() if hi else None] for lo, hi in ranges],
+                "rows": rows,
+                "elapsed_ms": round((time.perf_counter() - began) * 1000, 1),
+            },
+        }
+
+    return _json(await _coalesced("get_trends", user_id, (granularity, start), load))
 
 
 # ─── Sequence Tools ─────────────────────────────────────────────────────────
 
 
-@mcp.tool()
-def list_sequences(user_id: str) -> str:
+@_tool()
+async def list_sequences(user_id: str) -> str:
     """List all follow-up sequences and their status.
 
     Args:
         user_id: The user's UUID
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     sequences = (
-        sb.table("follow_up_sequences")
-        .select("*")
+        await sb.table("follow_up_sequences")
+        .select("id, name, trigger, steps, is_active, created_at")
         .eq("user_id", user_id)
         .order("created_at", desc=True)
         .execute()
@@ -730,7 +2441,7 @@ def list_sequences(user_id: str) -> str:
             {
                 "id": s["id"],
                 "name": s.get("name"),
-                "trigger": s.get("trigger_event"),
+                "trigger": s.get("trigger"),
                 "steps": len(s.get("steps") or []),
                 "active": s.get("is_active", False),
                 "created": s.get("created_at"),
@@ -740,11 +2451,141 @@ def list_sequences(user_id: str) -> str:
     })
 
 
-@mcp.tool()
-def update_deal_stage(
+FOLLOWUP_COLUMNS = "channel, status, send_at, sent_at, error, attempts"
+FOLLOWUP_KEY_NAMESPACE = uuid.UUID("5f0c4e8e-2b1d-4c6a-9a43-6b7d0f1e9c21")
+
+
+async def _followup_status(sb, user_id: str, message_id: str) -> dict | None:
+    response = (
+        await sb.table("follow_up_messages")
+        .select(FOLLOWUP_COLUMNS)
+        .eq("id", message_id)
+        .eq("user_id", user_id)
+        .maybe_single()
+        .execute()
+    )
+    return response.data if response else None
+
+
+async def _send_pending(sb, user_id: str, message_id: str) -> str:
+    """Send one pending message now through the dispatcher and report where it ended up."""
+    try:
+        results = await _dispatcher.send_now([message_id])
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+        return "Error: sending follow-ups needs migration 027_mcp_followup_dispatch.sql"
+    if results:
+        return _json({"message_id": message_id, **{k: v for k, v in results[0].items() if k != "id" and v is not None}})
+    message = await _followup_status(sb, user_id, message_id) or {}
+    return _json({"message_id": message_id, **message, "note": "not sent here: claimed by another dispatcher or no longer pending"})
+
+
+@_tool()
+async def send_followup(
+    user_id: str,
+    contact_id: str = "",
+    body: str = "",
+    channel: str = "email",
+    subject: str = "",
+    send_at: str = "",
+    message_id: str = "",
+    idempotency_key: str = "",
+) -> str:
+    """Send a follow-up message to a contact now, or schedule it for the dispatcher.
+    With message_id, sends an existing pending message immediately instead.
+
+    Args:
+        user_id: The user's UUID
+        contact_id: The contact's UUID (new message)
+        body: Message text (new message)
+        channel: email, sms or whatsapp
+        subject: Email subject line
+        send_at: ISO 8601 time to send at instead of now (left to the background dispatcher)
+        message_id: UUID of a pending follow-up message to send now
+        idempotency_key: Caller's key for this message; repeating a call with the same
+            key returns the first call's message instead of sending another
+    """
+    sb = await _get_supabase()
+
+    if message_id:
+        message = await _followup_status(sb, user_id, message_id)
+        if not message:
+            return f"Follow-up message {message_id} not found"
+        if message["status"] != "pending":
+            return _json({"message_id": message_id, **message})
+        if message["channel"] not in _dispatcher.backends:
+            return f"Error: no backend configured for {message['channel']}"
+        return await _send_pending(sb, user_id, message_id)
+
+    if channel not in CHANNELS:
+        return f"Invalid channel '{channel}'. Valid: {', '.join(CHANNELS)}"
+    if not contact_id or not body.strip():
+        return "Error: contact_id and body are required (or pass message_id)"
+    if not send_at and channel not in _dispatcher.backends:
+        return f"Error: no backend configured for {channel}"
+    when = datetime.now(timezone.utc)
+    if send_at:
+        try:
+            when = datetime.fromisoformat(send_at.replace("Z", "+00:00"))
+        except ValueError:
+            return f"Error: send_at '{send_at}' is not an ISO 8601 timestamp"
+        if when.tzinfo is None:
+            return "Error: send_at needs a timezone offset (e.g. 2025-06-01T09:00:00Z)"
+
+    response = (
+        await sb.table("contacts")
+        .select("first_name, last_name, email, phone, do_not_email, do_not_call")
+        .eq("id", contact_id)
+        .eq("user_id", user_id)
+        .maybe_single()
+        .execute()
+    )
+    contact = response.data if response else None
+    if not contact:
+        return f"Contact {contact_id} not found"
+    if channel == "email" and contact.get("do_not_email"):
+        return f"Error: {_full_name(contact) or contact_id} has opted out of email"
+    if channel != "email" and contact.get("do_not_call"):
+        return f"Error: {_full_name(contact) or contact_id} has opted out of calls and texts"
+    if not contact.get("email" if channel == "email" else "phone"):
+        return f"Error: {_full_name(contact) or contact_id} has no {'email address' if channel == 'email' else 'phone number'}"
+
+    # The message id derives from the idempotency key, so a repeat hits the primary key
+    new_id = str(uuid.uuid5(FOLLOWUP_KEY_NAMESPACE, f"{user_id}:{idempotency_key}") if idempotency_key else uuid.uuid4())
+    metadata = {"contact_email": contact.get("email"), "contact_phone": contact.get("phone"), "source": "mcp"}
+    if idempotency_key:
+        metadata["idempotency_key"] = idempotency_key
+    try:
+        await sb.table("follow_up_messages").insert({
+            "id": new_id,
+            "user_id": user_id,
+            "contact_id": contact_id,
+            "channel": channel,
+            "subject": subject or None,
+            "body": body,
+            "send_at": when.isoformat(),
+            "metadata": metadata,
+        }, returning="minimal").execute()
+    except Exception as e:
+        if getattr(e, "code", "") != "23505":
+            raise
+        message = await _followup_status(sb, user_id, new_id) or {}
+        if message.get("status") == "pending" and not send_at and channel in _dispatcher.backends:
+            return await _send_pending(sb, user_id, new_id)  # first call stopped before sending
+        return _json({"message_id": new_id, "repeat": True, **message})
+
+    if send_at:
+        return _json({"message_id": new_id, "status": "pending", "send_at": when.isoformat()})
+    return await _send_pending(sb, user_id, new_id)
+
+
+@_tool()
+async def update_deal_stage(
     contact_id: str,
     user_id: str,
     new_stage: str,
+    sync: bool = False,
 ) -> str:
     """Move a deal to a new pipeline stage.
 
@@ -752,17 +2593,18 @@ def update_deal_stage(
         contact_id: The contact's UUID
         user_id: The user's UUID
         new_stage: Target stage (lead, contacted, qualified, proposal, negotiation, won, lost)
+        sync: Wait for the activity log row to be written before returning
     """
     valid_stages = ["lead", "contacted", "qualified", "proposal", "negotiation", "won", "lost"]
     if new_stage not in valid_stages:
         return f"Invalid stage '{new_stage}'. Valid: {', '.join(valid_stages)}"
 
-    sb = _get_supabase()
+    sb = await _get_supabase()
 
     # Get current stage
     contact = (
-        sb.table("contacts")
-        .select("deal_stage, first_name, last_name")
+        await sb.table("contacts")
+        .select(f"{DASHBOARD_SELECT}, first_name, last_name")
         .eq("id", contact_id)
         .eq("user_id", user_id)
         .single()
@@ -775,19 +2617,24 @@ def update_deal_stage(
     old_stage = contact.get("deal_stage", "lead")
 
     # Update
-    sb.table("contacts").update(
+    await sb.table("contacts").update(
         {"deal_stage": new_stage}
     ).eq("id", contact_id).eq("user_id", user_id).execute()
 
     # Log
     name = f"{contact.get('first_name', '')} {contact.get('last_name', '')}".strip()
-    sb.table("activities").insert({
+    await _activity_log.log({
         "user_id": user_id,
         "contact_id": contact_id,
         "activity_type": "stage_changed",
         "title": f"Stage: {old_stage} → {new_stage}",
         "description": f"{name} moved from {old_stage} to {new_stage} via MCP",
-    }).execute()
+        "details": {"from": old_stage, "to": new_stage, "deal_value": contact.get("deal_value")},
+    }, sync=sync)
+
+    _cache.invalidate(user_id, ("get_contact",), subject=contact_id)
+    _cache.invalidate(user_id, DASHBOARD_TOOLS)
+    _aggregates.apply(user_id, contact, {**contact, "deal_stage": new_stage})
 
     return _json({
         "updated": True,
@@ -797,6 +2644,282 @@ def update_deal_stage(
     })
 
 
+async def _set_stages(sb, user_id: str, ids: list[str], new_stage: str) -> list[dict]:
+    """Move one chunk of contacts to `new_stage`; returns each owned contact's previous
+    values (mcp_set_deal_stage's row shape), with `changed` False if it was already there."""
+    try:
+        return (
+            await sb.rpc("mcp_set_deal_stage", {
+                "p_user_id": user_id,
+                "p_contact_ids": ids,
+                "p_new_stage": new_stage,
+            }).execute()
+        ).data or []
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+
+    # Fallback: one read for the old values, one update for the contacts that move
+    rows = []
+    for chunk in _chunks(ids, ID_CHUNK_SIZE):
+        old = (
+            await sb.table("contacts")
+            .select(f"{DASHBOARD_SELECT}, first_name, last_name")
+            .eq("user_id", user_id)
+            .in_("id", chunk)
+            .execute()
+        ).data or []
+        moving = [r["id"] for r in old if r.get("deal_stage") != new_stage]
+        if moving:
+            await sb.table("contacts").update(
+                {"deal_stage": new_stage}, returning="minimal"
+            ).eq("user_id", user_id).in_("id", moving).execute()
+        for r in old:
+            stage = r.pop("deal_stage")
+            rows.append({**r, "old_stage": stage, "changed": stage != new_stage})
+    return rows
+
+
+@_tool()
+async def bulk_update_deal_stage(
+    new_stage: str,
+    user_id: str,
+    contact_ids: str = "",
+    filter: str = "",
+    sync: bool = False,
+) -> str:
+    """Move many deals to a pipeline stage at once, by id list or filter.
+
+    One set-based update per 1,000 contacts (capturing each old stage), and
+    all stage_changed activities written as one batch. Contacts already in
+    the stage are counted as unchanged; failures are listed per id.
+
+    Args:
+        new_stage: Target stage (lead, contacted, qualified, proposal, negotiation, won, lost)
+        user_id: The user's UUID
+        contact_ids: Comma-separated contact UUIDs
+        filter: JSON filter instead of ids, e.g. '{"deal_stage": "contacted", "lead_score": {"gte": 70}}'
+            (value = equals, list = any of, null = is null; ops: eq, neq, lt, lte, gt, gte, in, is)
+        sync: Wait for the activity rows to be written before returning
+    """
+    valid_stages = ["lead", "contacted", "qualified", "proposal", "negotiation", "won", "lost"]
+    if new_stage not in valid_stages:
+        return f"Invalid stage '{new_stage}'. Valid: {', '.join(valid_stages)}"
+
+    sb = await _get_supabase()
+    try:
+        ids = await _bulk_ids(sb, user_id, contact_ids, filter)
+    except ValueError as e:
+        return f"Error: {e}"
+
+    rows, errors = [], {}
+    for chunk in _chunks(ids, BULK_RPC_CHUNK):
+        try:
+            rows.extend(await _set_stages(sb, user_id, chunk, new_stage))
+        except Exception as e:
+            errors.update(dict.fromkeys(chunk, f"update failed: {e}"))
+
+    moved = [r for r in rows if r["changed"]]
+    if moved:
+        await _activity_log.log([
+            {
+                "user_id": user_id,
+                "contact_id": r["id"],
+                "activity_type": "stage_changed",
+                "title": f"Stage: {r['old_stage']} → {new_stage}",
+                "description": f"{_full_name(r)} moved from {r['old_stage']} to {new_stage} via MCP (bulk)",
+                "details": {"from": r["old_stage"], "to": new_stage, "deal_value": r.get("deal_value")},
+            }
+            for r in moved
+        ], sync=sync)
+
+        _cache.invalidate(user_id, DASHBOARD_TOOLS)
+        for r in moved:
+            _cache.invalidate(user_id, ("get_contact",), subject=r["id"])
+            old = {**r, "deal_stage": r["old_stage"]}
+            _aggregates.apply(user_id, old, {**old, "deal_stage": new_stage})
+
+    transitions = {}
+    for r in moved:
+        key = f"{r['old_stage']} → {new_stage}"
+        transitions[key] = transitions.get(key, 0) + 1
+
+    return _json(_bulk_report(
+        ids, {r["id"] for r in rows}, errors,
+        new_stage=new_stage,
+        updated=len(moved),
+        unchanged=len(rows) - len(moved),
+        transitions=transitions,
+    ))
+
+
+async def _update_rows(sb, user_id: str, patches: list[dict]) -> list[dict]:
+    """Apply one chunk of per-contact patches; returns [{"contact": new row, "old": dashboard
+    columns or None}] for the contacts that were updated."""
+    try:
+        return (
+            await sb.rpc("mcp_update_contacts", {"p_user_id": user_id, "p_updates": patches}).execute()
+        ).data or []
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+
+    # Fallback: one update per distinct patch (a uniform bulk update is a single group).
+    # Old values aren't captured here, so the caller rebuilds aggregates instead.
+    groups = {}
+    for item in patches:
+        data = {k: v for k, v in item.items() if k != "id"}
+        groups.setdefault(json.dumps(data, sort_keys=True, default=str), (data, []))[1].append(item["id"])
+    results = []
+    for data, ids in groups.values():
+        for chunk in _chunks(ids, ID_CHUNK_SIZE):
+            updated = (
+                await sb.table("contacts").update(data).eq("user_id", user_id).in_("id", chunk).execute()
+            ).data or []
+            results.extend({"contact": row, "old": None} for row in updated)
+    return results
+
+
+@_tool()
+async def bulk_update_contacts(
+    user_id: str,
+    updates: str,
+    contact_ids: str = "",
+    filter: str = "",
+) -> str:
+    """Update many contacts in one call — the same fields on every target, or
+    different values per contact.
+
+    Args:
+        user_id: The user's UUID
+        updates: JSON object of fields to set on every target (with contact_ids or
+            filter), e.g. '{"tags": ["q3"], "do_not_email": true}'; or a JSON array of
+            per-contact objects with an "id", e.g. '[{"id": "...", "title": "CTO"}]'
+        contact_ids: Comma-separated contact UUIDs (with an updates object)
+        filter: JSON filter instead of ids, as in bulk_update_deal_stage
+    """
+    try:
+        parsed = json.loads(updates)
+    except json.JSONDecodeError:
+        return "Error: updates must be valid JSON"
+
+    sb = await _get_supabase()
+    if isinstance(parsed, list):
+        if contact_ids or filter:
+            return "Error: per-contact updates carry their own ids; omit contact_ids and filter"
+        if not all(isinstance(p, dict) and p.get("id") for p in parsed):
+            return "Error: every per-contact update needs an \"id\""
+        patches = list({p["id"]: p for p in parsed}.values())
+        if len(patches) > BULK_MAX_CONTACTS:
+            return f"Error: at most {BULK_MAX_CONTACTS} contacts per call"
+    elif isinstance(parsed, dict):
+        try:
+            ids = await _bulk_ids(sb, user_id, contact_ids, filter)
+        except ValueError as e:
+            return f"Error: {e}"
+        patches = [{**parsed, "id": i} for i in ids]
+    else:
+        return "Error: updates must be a JSON object or array"
+
+    for p in patches:
+        p.pop("user_id", None)
+    columns = {k for p in patches for k in p} - {"id"}
+    unknown = sorted(columns - set(CONTACT_COLUMNS) | columns & {"created_at", "updated_at"})
+    if unknown:
+        return f"Error: unknown or read-only field(s): {', '.join(unknown)}"
+    if not columns:
+        return "Error: updates sets no fields"
+
+    ids = [p["id"] for p in patches]
+    results, errors = [], {}
+    for chunk in _chunks(patches, BULK_RPC_CHUNK):
+        try:
+            results.extend(await _update_rows(sb, user_id, chunk))
+        except Exception as e:
+            errors.update(dict.fromkeys((p["id"] for p in chunk), f"update failed: {e}"))
+
+    for r in results:
+        _cache.invalidate(user_id, ("get_contact",), subject=r["contact"]["id"])
+    if DASHBOARD_COLUMNS & columns and results:
+        _cache.invalidate(user_id, DASHBOARD_TOOLS)
+        if all(r["old"] is not None for r in results):
+            for r in results:
+                _aggregates.apply(user_id, r["old"], r["contact"])
+        else:
+            _aggregates.drop(user_id)
+    for store, fields in ((_search, SEARCH_FIELDS), (_dedupe, DEDUPE_FIELDS)):
+        if fields & columns:
+            for r in results:
+                store.apply(user_id, r["contact"])
+
+    return _json(_bulk_report(
+        ids, {r["contact"]["id"] for r in results}, errors,
+        updated=len(results),
+        fields=sorted(columns),
+    ))
+
+
+# ─── Server Tools ───────────────────────────────────────────────────────────
+
+
+@_tool()
+async def cache_stats() -> str:
+    """Cache counters — read-through cache (hits, misses, evictions, invalidations),
+    materialized pipeline aggregates (hits, builds, deltas, drift corrections) and
+    the write-behind activity log (queued, written, retries, dropped), the
+    contact search index (builds, updates, tenants, docs, search latency), the
+    duplicate-blocking index, the company research cache, single-flight
+    coalescing of concurrent identical dashboard reads (leaders, coalesced) and
+    the daily trend rollups (builds, refreshes, backfills, days stored)."""
+    return _json({
+        "read_through": _cache.stats(),
+        "aggregates": _aggregates.stats(),
+        "activity_log": _activity_log.stats(),
+        "search_index": _search.stats(),
+        "dedupe_index": _dedupe.stats(),
+        "company_research": _enricher.cache.stats(),
+        "single_flight": _flights.stats(),
+        "trends": _trends.stats(),
+    })
+
+
+@_tool()
+async def wire_stats() -> str:
+    """PostgREST traffic per tool — calls, HTTP requests, response body bytes
+    (decoded) and bytes on the wire, since the server started."""
+    wire = {}
+    for tool, entry in _metrics.snapshot()["tools"].items():
+        wire[tool] = {
+            "calls": entry["calls"],
+            "requests": entry["round_trips"],
+            "bytes": entry["upstream_bytes"],
+            "wire_bytes": entry["wire_bytes"],
+            "bytes_per_call": round(entry["upstream_bytes"] / entry["calls"]) if entry["calls"] else None,
+        }
+    return _json(dict(sorted(wire.items(), key=lambda kv: -kv[1]["bytes"])))
+
+
+@_tool()
+async def server_stats(prometheus: bool = False) -> str:
+    """Per-tool metrics since start — calls, errors, latency (avg/p50/p95/p99 ms),
+    Supabase round-trips per call (spot N+1 patterns), rows, response bytes,
+    the cold-start timing breakdown, follow-up dispatch, campaign engine and
+    enrichment pool counters.
+
+    Args:
+        prometheus: Return Prometheus text exposition format instead of JSON
+    """
+    if prometheus:
+        return _metrics.prometheus()
+    return _json({
+        **_metrics.snapshot(),
+        "startup": _startup,
+        "dispatch": _dispatcher.stats(),
+        "campaigns": _campaigns.stats(),
+        "enrichment": _enricher.stats(),
+    })
+
+
 # ─── MCP Prompts ────────────────────────────────────────────────────────────
 
 
@@ -939,7 +3062,151 @@ Return:
 }}"""
 
 
+_startup["register_s"] = round(time.perf_counter() - _T_IMPORTED, 3)
+
+
+# ─── Serving ────────────────────────────────────────────────────────────────
+
+
+class _HttpGate:
+    """ASGI middleware: bearer-token check, and in-flight POST tracking for graceful drain.
+
+    A tool call's response (JSON or an SSE stream) completes inside its POST,
+    so draining only has to wait for POSTs; long-lived GET streams are not counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.inflight = 0
+        self.draining = False
+
+    @staticmethod
+    async def _reject(send, status: int, body: bytes, headers: list):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if HTTP_TOKENS:
+            headers = dict(scope.get("headers") or ())
+            if _token_users(headers.get(b"authorization", b"").decode("latin-1")) is None:
+                return await self._reject(send, 401, b'{"error": "unauthorized"}', [(b"www-authenticate", b"Bearer")])
+        if scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        if self.draining:
+            return await self._reject(send, 503, b'{"error": "shutting down"}', [(b"retry-after", b"1")])
+        self.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inflight -= 1
+
+
+async def _serve_http(host: str, port: int, path: str, stateless: bool):
+    """Serve streamable HTTP until SIGINT/SIGTERM, then drain and flush.
+
+    Every client shares this process's Supabase connection pool, caches,
+    search indexes and activity log. On the first signal new POSTs get 503
+    and in-flight ones have SHUTDOWN_GRACE_SECONDS to finish; then the server
+    stops, the follow-up dispatcher hands back unsent claims, campaign runs
+    checkpoint and release their leases, queued enrichment finishes and queued
+    activity rows are flushed. A second signal exits at once.
+    """
+    global _serving_http
+    try:
+        import uvicorn
+        from mcp.server.transport_security import TransportSecuritySettings
+    except ImportError:
+        raise RuntimeError("uvicorn not installed. Run: pip3 install 'mcp[cli]' uvicorn")
+
+    loopback = host in ("127.0.0.1", "localhost", "::1")
+    if not loopback and not HTTP_TOKENS:
+        raise SystemExit(f"Refusing to serve on {host} without QUOTAHIT_HTTP_TOKENS")
+    if not loopback:
+        # Bearer tokens guard the endpoint; Host-header checks only suit localhost
+        mcp.settings.transport_security = TransportSecuritySettings(enable_dns_rebinding_protection=False)
+    mcp.settings.host, mcp.settings.port = host, port
+    mcp.settings.streamable_http_path = path
+    mcp.settings.stateless_http = stateless
+    gate = _HttpGate(mcp.streamable_http_app())
+
+    class DrainingServer(uvicorn.Server):
+        # uvicorn's own exit (patched by sse-starlette) closes every SSE stream
+        # immediately, which would cut off responses still being computed
+        async def _drain(self, sig, frame):
+            deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+            while gate.inflight and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            uvicorn.Server.handle_exit(self, sig, frame)
+
+        def handle_exit(self, sig, frame):
+            if gate.draining:
+                return uvicorn.Server.handle_exit(self, sig, frame)
+            gate.draining = True
+            loop.call_soon_threadsafe(loop.create_task, self._drain(sig, frame))
+
+        async def shutdown(self, sockets=None):
+            await super().shutdown(sockets)
+            # Flush here: after a signal, uvicorn re-raises it once serve() unwinds
+            await _dispatcher.stop(SHUTDOWN_GRACE_SECONDS)
+            await _campaigns.stop(SHUTDOWN_GRACE_SECONDS)
+            await _enricher.stop(SHUTDOWN_GRACE_SECONDS)
+            await _activity_log.flush()
+            await _exporter.stop()
+
+    _serving_http = True
+    loop = asyncio.get_running_loop()
+    _start_prewarm()
+    _start_dispatcher()
+    server = DrainingServer(uvicorn.Config(
+        gate,
+        host=host,
+        port=port,
+        log_level=mcp.settings.log_level.lower(),
+        timeout_graceful_shutdown=SHUTDOWN_GRACE_SECONDS,
+    ))
+    await _exporter.start()
+    try:
+        await server.serve()
+    finally:
+        await _dispatcher.stop(SHUTDOWN_GRACE_SECONDS)
+        await _campaigns.stop(SHUTDOWN_GRACE_SECONDS)
+        await _enricher.stop(SHUTDOWN_GRACE_SECONDS)
+        await _activity_log.flush()
+        await _exporter.stop()
+
+
 # ─── Entry Point ─────────────────────────────────────────────────────────────
 
+
+def main():
+    global PREWARM, DISPATCH, _tool_slots
+    import argparse
+
+    parser = argparse.ArgumentParser(description="QuotaHit MCP server")
+    parser.add_argument("--transport", choices=("stdio", "streamable-http"), default=TRANSPORT)
+    parser.add_argument("--host", default=HTTP_HOST)
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    parser.add_argument("--path", default=HTTP_PATH, help="streamable HTTP endpoint path")
+    parser.add_argument("--stateless", action="store_true", help="no client sessions, so any replica can serve any request")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_TOOLS, help="tool calls executed at once")
+    parser.add_argument("--prewarm", action="store_true", default=PREWARM, help="connect to Supabase during the handshake")
+    parser.add_argument("--dispatch", action="store_true", default=DISPATCH, help="send due follow-up messages in the background")
+    args = parser.parse_args()
+
+    PREWARM = args.prewarm
+    DISPATCH = args.dispatch
+    _tool_slots = asyncio.Semaphore(max(1, args.concurrency))
+    if args.transport == "stdio":
+        mcp.run(transport="stdio")
+    else:
+        asyncio.run(_serve_http(args.host, args.port, args.path, args.stateless))
+
+
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    main()
@@ -0,0 +1,229 @@
+"""
+QuotaHit server metrics — per-tool latency, errors, round-trips and payloads.
+
+Every tool call records its latency into a fixed-bucket histogram, plus
+whether it raised (errors) or returned a plain-text failure instead of JSON
+(error_responses). Supabase HTTP responses are attributed to the tool that
+made them: round-trips, rows (from PostgREST's Content-Range), body bytes and
+bytes on the wire. Recording is a few dict updates per event, cheap enough to
+leave on.
+
+Snapshots are available as a dict (server_stats tool) or in Prometheus text
+exposition format, written to a file and/or served on a local port.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_COUNTERS = (
+    "calls", "errors", "error_responses", "round_trips",
+    "rows", "response_bytes", "upstream_bytes", "wire_bytes",
+)
+
+
+def _rows(content_range: str | None) -> int:
+    """Row count from a PostgREST Content-Range header ("0-24/*", "*/0", "0-24/1200")."""
+    if not content_range:
+        return 0
+    span = content_range.split("/", 1)[0]
+    if "-" not in span:
+        return 0
+    start, _, end = span.partition("-")
+    try:
+        return int(end) - int(start) + 1
+    except ValueError:
+        return 0
+
+
+class _ToolMetrics:
+    __slots__ = ("counts", "buckets", "seconds", "max_round_trips")
+
+    def __init__(self):
+        self.counts = dict.fromkeys(_COUNTERS, 0)
+        self.buckets = [0] * len(BUCKETS)
+        self.seconds = 0.0
+        self.max_round_trips = 0
+
+    def quantile(self, q: float) -> float | None:
+        """Latency quantile in ms, interpolated within its histogram bucket."""
+        total = sum(self.buckets)
+        if not total:
+            return None
+        rank, seen, lower = q * total, 0, 0.0
+        for bound, count in zip(BUCKETS, self.buckets):
+            if count and seen + count >= rank:
+                upper = bound if bound != float("inf") else lower * 2 or 1.0
+                return round((lower + (upper - lower) * (rank - seen) / count) * 1000, 2)
+            seen += count
+            lower = bound
+        return None
+
+
+class Metrics:
+    """Per-tool counters and latency histograms."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._tools = {}  # tool -> _ToolMetrics
+
+    def _get(self, tool: str) -> _ToolMetrics:
+        entry = self._tools.get(tool)
+        if entry is None:
+            entry = self._tools[tool] = _ToolMetrics()
+        return entry
+
+    def call(self, tool: str, seconds: float, response=None, error: bool = False, round_trips: int = 0):
+        """Record one finished tool call."""
+        entry = self._get(tool)
+        counts = entry.counts
+        counts["calls"] += 1
+        entry.seconds += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry.buckets[i] += 1
+                break
+        if error:
+            counts["errors"] += 1
+        elif isinstance(response, str):
+            counts["response_bytes"] += len(response.encode())
+            if not response.startswith(("{", "[", "#")):  # JSON, or Prometheus text
+                counts["error_responses"] += 1
+        entry.max_round_trips = max(entry.max_round_trips, round_trips)
+
+    def http_response(self, tool: str, content_range: str | None, body_bytes: int, wire_bytes: int):
+        """Record one Supabase HTTP response made on behalf of `tool`."""
+        counts = self._get(tool).counts
+        counts["round_trips"] += 1
+        counts["rows"] += _rows(content_range)
+        counts["upstream_bytes"] += body_bytes
+        counts["wire_bytes"] += wire_bytes
+
+    def tool_counts(self, tool: str) -> dict:
+        return dict(self._get(tool).counts)
+
+    def snapshot(self) -> dict:
+        tools = {}
+        for tool, entry in sorted(self._tools.items()):
+            counts, calls = entry.counts, entry.counts["calls"]
+            tools[tool] = {
+                **counts,
+                "latency_ms": {
+                    "avg": round(entry.seconds / calls * 1000, 2) if calls else None,
+                    "p50": entry.quantile(0.5),
+                    "p95": entry.quantile(0.95),
+                    "p99": entry.quantile(0.99),
+                },
+                "round_trips_per_call": round(counts["round_trips"] / calls, 2) if calls else None,
+                "max_round_trips": entry.max_round_trips,
+                "rows_per_call": round(counts["rows"] / calls, 1) if calls else None,
+            }
+        return {"uptime_s": round(time.time() - self.started, 1), "tools": tools}
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP quotahit_{name} {help_text}")
+            lines.append(f"# TYPE quotahit_{name} {kind}")
+
+        items = sorted(self._tools.items())
+        family("tool_duration_seconds", "histogram", "Tool call latency.")
+        for tool, entry in items:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, entry.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'quotahit_tool_duration_seconds_bucket{{tool="{tool}",le="{le}"}} {cumulative}')
+            lines.append(f'quotahit_tool_duration_seconds_sum{{tool="{tool}"}} {entry.seconds:.6f}')
+            lines.append(f'quotahit_tool_duration_seconds_count{{tool="{tool}"}} {entry.counts["calls"]}')
+
+        for counter, help_text in (
+            ("calls", "Tool calls."),
+            ("errors", "Tool calls that raised."),
+            ("error_responses", "Tool calls that returned a plain-text failure."),
+            ("round_trips", "Supabase HTTP requests."),
+            ("rows", "Rows returned by PostgREST."),
+            ("response_bytes", "Bytes returned to the MCP client."),
+            ("upstream_bytes", "Decoded Supabase response body bytes."),
+            ("wire_bytes", "Supabase response bytes on the wire."),
+        ):
+            family(f"tool_{counter}_total", "counter", help_text)
+            for tool, entry in items:
+                lines.append(f'quotahit_tool_{counter}_total{{tool="{tool}"}} {entry.counts[counter]}')
+
+        family("uptime_seconds", "gauge", "Seconds since the server started.")
+        lines.append(f"quotahit_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter:
+    """Publish Metrics.prometheus() to a file (rewritten atomically) and/or a local HTTP port."""
+
+    def __init__(self, metrics: Metrics, path: str = "", port: int = 0, interval: float = 15):
+        self.metrics = metrics
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self._server = None
+        self._writer = None
+
+    async def start(self):
+        if self.port and self._server is None:
+            self._server = await asyncio.start_server(self._serve, "127.0.0.1", self.port)
+        if self.path and self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def write(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.metrics.prometheus())
+        os.replace(tmp, self.path)
+
+    async def _write_loop(self):
+        while True:
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.path, e)
+            await asyncio.sleep(self.interval)
+
+    async def _serve(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if request.split(b" ")[1:2] in ([b"/metrics"], [b"/"]):
+                body, status = self.metrics.prometheus().encode(), b"200 OK"
+            else:
+                body, status = b"not found\n", b"404 Not Found"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+            if self.path:
+                try:
+                    self.write()
+                except OSError:
+                    pass
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,133 @@
+"""
+QuotaHit lead-scoring engine — vectorized over columnar NumPy arrays.
+
+The lead-scoring rules for the MCP server's score_leads_batch, expressed as
+boolean masks and stage/source lookup tables, so a million rows score in a
+single pass without any per-row Python. score_lead scores one row with
+`score_contact`, the same rules in plain Python, so it works without numpy
+(imported lazily by the vectorized functions only).
+
+Scoring weights: completeness (20), enrichment (15), deal signals (15),
+engagement (20), pipeline stage (15), source quality (10), minus 20 when the
+contact is both do-not-call and do-not-email. Final score is clamped to 0-100.
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+STAGE_BONUS = {
+    "lead": 0, "contacted": 3, "qualified": 8,
+    "proposal": 12, "negotiation": 15,
+}
+
+SOURCE_BONUS = {
+    "referral": 10, "inbound": 8, "linkedin": 6,
+    "website": 5, "import": 3, "manual": 2, "cold": 1, "mcp": 3,
+}
+
+# Breakdown components, in the order score_lead reports them
+COMPONENTS = ("completeness", "enrichment", "deal_signals", "engagement", "stage", "source")
+
+# Category code 0 is "unknown / no bonus"; known names get codes 1..n
+_STAGE_CODES = {name: i for i, name in enumerate(STAGE_BONUS, start=1)}
+_SOURCE_CODES = {name: i for i, name in enumerate(SOURCE_BONUS, start=1)}
+
+
+def score_contact(contact: dict, activity_count: int = 0) -> tuple[int, dict]:
+    """Score one contact dict in plain Python; same result as `score_contacts`."""
+    deal_value = float(contact.get("deal_value") or 0)
+    breakdown = {
+        "completeness": 5 * sum(bool(contact.get(f)) for f in ("email", "phone", "company", "title")),
+        "enrichment": 15 if contact.get("enrichment_status") == "enriched" else 0,
+        "deal_signals": (10 + 5 * (deal_value > 10000)) if deal_value > 0 else 0,
+        "engagement": min(activity_count * 4, 20),
+        "stage": STAGE_BONUS.get(contact.get("deal_stage"), 0),
+        "source": SOURCE_BONUS.get(contact.get("source"), 0),
+    }
+    total = sum(breakdown[name] for name in COMPONENTS)
+    if contact.get("do_not_call") and contact.get("do_not_email"):
+        total -= 20
+    return max(0, min(total, 100)), breakdown
+
+
+def to_columns(contacts: list[dict], activity_counts: dict | None = None) -> dict:
+    """Convert contact dicts into the columnar arrays `score_columns` expects.
+
+    `activity_counts` maps contact id -> number of activities (missing = 0).
+    """
+    import numpy as np
+
+    n = len(contacts)
+    counts = activity_counts or {}
+
+    def flags(field):
+        return np.fromiter((bool(c.get(field)) for c in contacts), dtype=bool, count=n)
+
+    return {
+        "has_email": flags("email"),
+        "has_phone": flags("phone"),
+        "has_company": flags("company"),
+        "has_title": flags("title"),
+        "enriched": np.fromiter(
+            (c.get("enrichment_status") == "enriched" for c in contacts), dtype=bool, count=n
+        ),
+        "deal_value": np.fromiter(
+            (float(c.get("deal_value") or 0) for c in contacts), dtype=np.float64, count=n
+        ),
+        "activity_count": np.fromiter(
+            (counts.get(c.get("id"), 0) for c in contacts), dtype=np.int64, count=n
+        ),
+        "stage": np.fromiter(
+            (_STAGE_CODES.get(c.get("deal_stage"), 0) for c in contacts), dtype=np.int8, count=n
+        ),
+        "source": np.fromiter(
+            (_SOURCE_CODES.get(c.get("source"), 0) for c in contacts), dtype=np.int8, count=n
+        ),
+        "dnc": np.fromiter(
+            (bool(c.get("do_not_call") and c.get("do_not_email")) for c in contacts),
+            dtype=bool,
+            count=n,
+        ),
+    }
+
+
+def score_columns(cols: dict) -> "tuple[np.ndarray, dict]":
+    """Score every row at once. Returns (scores, {component: array})."""
+    import numpy as np
+
+    stage_table = np.array([0, *STAGE_BONUS.values()], dtype=np.int16)
+    source_table = np.array([0, *SOURCE_BONUS.values()], dtype=np.int16)
+    deal_value = cols["deal_value"]
+    breakdown = {
+        "completeness": 5 * (
+            cols["has_email"].astype(np.int16)
+            + cols["has_phone"]
+            + cols["has_company"]
+            + cols["has_title"]
+        ),
+        "enrichment": np.where(cols["enriched"], 15, 0).astype(np.int16),
+        "deal_signals": np.where(
+            deal_value > 0, 10 + 5 * (deal_value > 10000), 0
+        ).astype(np.int16),
+        "engagement": np.minimum(cols["activity_count"] * 4, 20).astype(np.int16),
+        "stage": stage_table[cols["stage"]],
+        "source": source_table[cols["source"]],
+    }
+
+    total = sum(breakdown[name] for name in COMPONENTS) - 20 * cols["dnc"]
+    scores = np.clip(total, 0, 100).astype(np.int16)
+    return scores, breakdown
+
+
+def score_contacts(contacts: list[dict], activity_counts: dict | None = None) -> list[tuple[int, dict]]:
+    """Score contact dicts and return [(score, breakdown_dict), ...] in input order."""
+    if not contacts:
+        return []
+    scores, breakdown = score_columns(to_columns(contacts, activity_counts))
+    parts = [breakdown[name].tolist() for name in COMPONENTS]
+    return [
+        (score, dict(zip(COMPONENTS, values)))
+        for score, values in zip(scores.tolist(), zip(*parts))
+    ]
@@ -0,0 +1,245 @@
+"""
+QuotaHit contact search — per-user in-memory n-gram index.
+
+Each contact's name, email and company are lowercased and broken into
+trigrams (plus word- and field-prefix keys for one- and two-character
+typeahead terms). Posting lists are compact `array("I")` doc numbers; an
+edited contact gets a new doc number and its old one is tombstoned until
+the next compaction.
+
+Terms of three or more characters match substrings like the old
+`ilike '%term%'` filter: candidates are the intersection of the term's
+trigram postings, verified against the stored fields. Shorter terms match
+word prefixes. Results are ranked field prefix > word prefix > substring
+(then index order) and produced lazily, so a typeahead page only verifies
+the hits it returns.
+"""
+
+import asyncio
+import re
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+SEARCH_COLUMNS = "id, first_name, last_name, email, company"
+
+_SEPARATOR = re.compile(r"[\W_]")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase with every non-alphanumeric character mapped to a space."""
+    return _SEPARATOR.sub(" ", text.lower())
+
+
+def _fields(contact: dict) -> tuple[str, ...]:
+    name = f"{contact.get('first_name') or ''} {contact.get('last_name') or ''}".strip()
+    return tuple(
+        f.lower() for f in (name, contact.get("email") or "", contact.get("company") or "") if f
+    )
+
+
+def _keys(fields: tuple[str, ...]) -> set[str]:
+    keys = set()
+    for field in fields:
+        norm = _normalize(field)
+        keys.add("^" + norm[:1])
+        keys.add("^" + norm[:2])
+        padded = f" {norm} "
+        keys.update([padded[i:i + 3] for i in range(len(padded) - 2)])
+        keys.update([" " + word[0] for word in norm.split()])
+    return keys
+
+
+def _has(postings, doc: int) -> bool:
+    """Membership test on a sorted posting array."""
+    i = bisect_left(postings, doc)
+    return i < len(postings) and postings[i] == doc
+
+
+def _intersect(docs: list[int], postings) -> list[int]:
+    """Sorted `docs` that also appear in `postings` (both ascending)."""
+    if len(docs) * 16 < len(postings):
+        return [d for d in docs if _has(postings, d)]
+    keep = set(docs).intersection(postings)
+    return [d for d in docs if d in keep]
+
+
+class SearchIndex:
+    """n-gram index over one user's contacts."""
+
+    def __init__(self):
+        self._docs = []  # doc number -> (contact_id, fields) or None once replaced
+        self._by_id = {}  # contact_id -> doc number
+        self._postings = {}  # key -> array("I") of doc numbers
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, contact: dict):
+        """Index (or re-index) a contact row with SEARCH_COLUMNS."""
+        self.remove(contact["id"])
+        fields = _fields(contact)
+        doc = len(self._docs)
+        self._docs.append((contact["id"], fields))
+        self._by_id[contact["id"]] = doc
+        for key in _keys(fields):
+            postings = self._postings.get(key)
+            if postings is None:
+                postings = self._postings[key] = array("I")
+            postings.append(doc)
+
+    def remove(self, contact_id: str):
+        doc = self._by_id.pop(contact_id, None)
+        if doc is not None:
+            self._docs[doc] = None
+            self.dead += 1
+            if self.dead > 1000 and self.dead > len(self._by_id):
+                self._compact()
+
+    def _compact(self):
+        live = [entry for entry in self._docs if entry is not None]
+        self.__init__()
+        for contact_id, fields in live:
+            doc = len(self._docs)
+            self._docs.append((contact_id, fields))
+            self._by_id[contact_id] = doc
+            for key in _keys(fields):
+                self._postings.setdefault(key, array("I")).append(doc)
+
+    @staticmethod
+    def _live(entries: list, docs, verify_term: str = ""):
+        for doc in docs:
+            entry = entries[doc]
+            if entry is not None and (not verify_term or any(verify_term in f for f in entry[1])):
+                yield entry[0]
+
+    def search(self, term: str):
+        """Yield matching contact ids, best first."""
+        term = term.strip().lower()
+        norm = _normalize(term)
+        if not norm.strip():
+            return
+
+        # A write between two hits may compact the index and renumber its docs;
+        # the old list and postings keep this search's doc numbers meaningful
+        entries = self._docs
+        field_prefix = self._postings.get("^" + norm[:2], ())
+        word_prefix = self._postings.get(" " + norm[:2], ())
+        if len(norm) <= 2:
+            # Typeahead: the prefix keys are exact, no verification needed
+            yield from self._live(entries, field_prefix)
+            yield from self._live(entries, (d for d in word_prefix if not _has(field_prefix, d)))
+            return
+
+        postings = sorted((self._postings.get(g, ()) for g in {norm[i:i + 3] for i in range(len(norm) - 2)}), key=len)
+        candidates = list(postings[0])
+        for other in postings[1:]:
+            if not candidates:
+                return
+            candidates = _intersect(candidates, other)
+
+        # Each tier is only computed once the caller has consumed the previous one
+        first = _intersect(candidates, field_prefix)
+        yield from self._live(entries, first, term)
+        taken = set(first)
+        second = [d for d in _intersect(candidates, word_prefix) if d not in taken]
+        yield from self._live(entries, second, term)
+        taken.update(second)
+        yield from self._live(entries, (d for d in candidates if d not in taken), term)
+
+
+class SearchIndexStore:
+    """Per-user index cache, LRU-bounded by total indexed contacts.
+
+    Holds SearchIndex (or any index with add/remove/len, such as DedupeIndex).
+
+    Indexes are rebuilt after `refresh_seconds` to pick up writes made
+    outside this server. Writes that land while an index is being built are
+    queued and replayed onto it, so a build never misses them.
+    """
+
+    def __init__(self, refresh_seconds: float = 300, max_docs: int = 500_000):
+        self.refresh_seconds = refresh_seconds
+        self.max_docs = max_docs
+        self._entries = OrderedDict()  # user_id -> (built_at, SearchIndex)
+        self._pending = {}  # user_id -> [(contact_id, row | None)] during a build
+        self._locks = {}  # user_id -> asyncio.Lock held while building
+        self._counters = {"hits": 0, "builds": 0, "refreshes": 0, "updates": 0, "evictions": 0, "searches": 0}
+        self._search_ms = 0.0
+
+    def get(self, user_id: str) -> SearchIndex | None:
+        """The user's index, or None if missing or due for a refresh."""
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[0] >= self.refresh_seconds:
+            return None
+        self._entries.move_to_end(user_id)
+        self._counters["hits"] += 1
+        return entry[1]
+
+    def lock(self, user_id: str) -> asyncio.Lock:
+        """Lock serializing builds for one user (concurrent misses wait, then hit)."""
+        return self._locks.setdefault(user_id, asyncio.Lock())
+
+    def begin(self, user_id: str):
+        """Start recording writes for a user whose index is being built."""
+        self._pending[user_id] = []
+
+    def abort(self, user_id: str):
+        self._pending.pop(user_id, None)
+        self._locks.pop(user_id, None)
+
+    def finish(self, user_id: str, index: SearchIndex) -> SearchIndex:
+        """Store a built index after replaying writes made during the build."""
+        for contact_id, row in self._pending.pop(user_id, ()):
+            if row is not None:
+                index.add(row)
+            else:
+                index.remove(contact_id)
+        self._locks.pop(user_id, None)
+
+        previous = self._entries.pop(user_id, None)
+        self._counters["refreshes" if previous else "builds"] += 1
+        self._entries[user_id] = (time.monotonic(), index)
+        self._evict()
+        return index
+
+    def _evict(self):
+        total = sum(len(index) for _, index in self._entries.values())
+        while total > self.max_docs and len(self._entries) > 1:
+            _, (_, index) = self._entries.popitem(last=False)
+            total -= len(index)
+            self._counters["evictions"] += 1
+
+    def tracks(self, user_id: str) -> bool:
+        return user_id in self._entries or user_id in self._pending
+
+    def apply(self, user_id: str, row: dict | None = None, removed_id: str | None = None):
+        """Apply one contact write: index `row` (with SEARCH_COLUMNS) or drop `removed_id`."""
+        contact_id = row["id"] if row is not None else removed_id
+        if user_id in self._pending:
+            self._pending[user_id].append((contact_id, row))
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if row is not None:
+            entry[1].add(row)
+        else:
+            entry[1].remove(contact_id)
+        self._counters["updates"] += 1
+
+    def record(self, elapsed_ms: float):
+        self._counters["searches"] += 1
+        self._search_ms += elapsed_ms
+
+    def stats(self) -> dict:
+        searches = self._counters["searches"]
+        return {
+            **self._counters,
+            "avg_search_ms": round(self._search_ms / searches, 3) if searches else None,
+            "users": len(self._entries),
+            "docs": sum(len(index) for _, index in self._entries.values()),
+            "max_docs": self.max_docs,
+            "refresh_seconds": self.refresh_seconds,
+        }
@@ -0,0 +1,104 @@
+"""
+QuotaHit response serialization — compact JSON with optional size budgets.
+
+Uses orjson when it is installed and the stdlib encoder otherwise; both
+produce the same text. datetime/date/time, UUID and Decimal values are
+encoded natively (ISO 8601, canonical string, number) instead of via str().
+
+A budget (bytes, or tokens at ~4 bytes per token) shrinks oversized payloads
+without touching the caller's data: long arrays are cut to the largest common
+length that fits, each ending in a "... truncated, N more" marker; if arrays
+alone are not enough, long strings are clipped the same way.
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+BYTES_PER_TOKEN = 4
+
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)  # UUID (stdlib path) and anything else
+
+
+def encode(data, pretty: bool = False) -> bytes:
+    """UTF-8 JSON; compact unless `pretty` (2-space indent)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, default=_default, option=option)
+    return json.dumps(
+        data,
+        default=_default,
+        ensure_ascii=False,
+        indent=2 if pretty else None,
+        separators=(",", ": ") if pretty else (",", ":"),
+    ).encode()
+
+
+def _clip(value, max_items: int | None, max_chars: int | None):
+    """Copy of `value` with arrays/strings over the limits cut and marked."""
+    nested = (dict, list, tuple, str) if max_chars is not None else (dict, list, tuple)
+    if isinstance(value, dict):
+        return {
+            k: _clip(v, max_items, max_chars) if isinstance(v, nested) else v
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        items = [
+            _clip(v, max_items, max_chars) if isinstance(v, nested) else v
+            for v in value[:max_items]
+        ]
+        if max_items is not None and len(value) > max_items:
+            items.append(f"... truncated, {len(value) - max_items} more")
+        return items
+    if isinstance(value, str) and max_chars is not None and len(value) > max_chars:
+        return f"{value[:max_chars]}... [truncated, {len(value) - max_chars} more chars]"
+    return value
+
+
+def _fit(data, budget: int, pretty: bool, limit_of) -> bytes | None:
+    """Encoding at the largest limit that fits `budget` (None if even 0 is too big).
+
+    Gallops up from 1 and then bisects, so only encodings about the size of
+    the answer are built, whatever the size of `data`.
+    """
+    good, good_out, bad = -1, None, 1
+    while True:
+        out = encode(_clip(data, *limit_of(bad)), pretty)
+        if len(out) > budget:
+            break
+        good, good_out, bad = bad, out, bad * 2
+    while bad - good > 1:
+        mid = (good + bad) // 2
+        out = encode(_clip(data, *limit_of(mid)), pretty)
+        if len(out) <= budget:
+            good, good_out = mid, out
+        else:
+            bad = mid
+    return good_out
+
+
+def dumps(data, pretty: bool = False, max_bytes: int = 0, max_tokens: int = 0) -> str:
+    """Serialize `data`, truncating arrays (then strings) to fit the tighter budget."""
+    budgets = [b for b in (max_bytes, max_tokens * BYTES_PER_TOKEN) if b > 0]
+    out = encode(data, pretty)
+    if not budgets or len(out) <= min(budgets):
+        return out.decode()
+
+    budget = min(budgets)
+    out = _fit(data, budget, pretty, lambda k: (k, None))
+    if out is None:
+        out = _fit(data, budget, pretty, lambda n: (0, n)) or encode(_clip(data, 0, 0), pretty)
+    return out.decode()
@@ -0,0 +1,93 @@
+"""
+QuotaHit single-flight — concurrent identical reads share one in-flight load.
+
+When several agents ask for the same user's dashboard at the same moment,
+the first call (the leader) runs the query and every identical call that
+arrives before it finishes (followers) awaits the leader's result instead of
+issuing its own. Nothing is kept once the flight lands, so coalescing adds no
+staleness; callers put a data generation in the key so a read that starts
+after a write never joins a flight that started before it.
+
+Flights are concurrent.futures.Future objects guarded by a threading.Lock,
+so followers may await from any event loop or thread. If the leader is
+cancelled, its followers retry and one of them leads the next flight.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+class _Abandoned(Exception):
+    """The leader was cancelled before its load finished."""
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one `loader()` call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> concurrent.futures.Future
+        self._counters = {"leaders": 0, "coalesced": 0, "errors": 0, "abandoned": 0}
+        self._per_tool = {}  # key[0] -> {"leaders", "coalesced"}
+
+    def _join(self, key):
+        """Return (flight, is_leader), starting a flight if none is in the air."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = concurrent.futures.Future()
+            outcome = "leaders" if leader else "coalesced"
+            self._counters[outcome] += 1
+            self._per_tool.setdefault(key[0], {"leaders": 0, "coalesced": 0})[outcome] += 1
+        return flight, leader
+
+    def _land(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def run(self, key, loader):
+        """Await `loader()`, or the in-flight call already running for `key`.
+
+        `key` is a hashable tuple whose first element names the tool (for
+        per-tool counters). Followers get the leader's exact result object, or
+        its exception re-raised.
+        """
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                try:
+                    # shield: a cancelled follower must not cancel the shared flight
+                    return await asyncio.shield(asyncio.wrap_future(flight))
+                except _Abandoned:
+                    continue
+
+            try:
+                value = await loader()
+            except asyncio.CancelledError:
+                self._land(key, flight)
+                with self._lock:
+                    self._counters["abandoned"] += 1
+                flight.set_exception(_Abandoned())
+                raise
+            except BaseException as exc:
+                self._land(key, flight)
+                with self._lock:
+                    self._counters["errors"] += 1
+                flight.set_exception(exc)
+                raise
+            self._land(key, flight)
+            flight.set_result(value)
+            return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self._counters["leaders"] + self._counters["coalesced"]
+            return {
+                **self._counters,
+                "coalesce_rate": round(self._counters["coalesced"] / calls * 100, 1) if calls else 0,
+                "in_flight": len(self._flights),
+                "by_tool": {tool: dict(c) for tool, c in self._per_tool.items()},
+            }
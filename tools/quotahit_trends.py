@@ -0,0 +1,253 @@
+"""
+QuotaHit trend rollups — per-user daily buckets, rebuilt only where new rows land.
+
+get_trends reports, per UTC day or ISO week: new contacts, stage transitions
+(from stage_changed activities), deals won and their value, and the score
+distribution of leads scored (from lead_scored activities). Each user's
+rollup is a map of day -> DayBucket plus two watermarks:
+
+  frozen_before  days before it are complete and never recomputed. A refresh
+                 scans only rows created on or after it, rebuilds those days
+                 wholesale, then advances it to the day `settle_seconds` ago.
+  covered_from   earliest day loaded. Asking for an older `since` scans just
+                 the missing range [since, covered_from).
+
+So once a user's history is loaded, a 12-month trend scans only the open
+days. Rows backdated into a frozen day are not picked up until the rollup
+is dropped and rebuilt.
+"""
+
+import re
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+from quotahit_aggregates import SCORE_BUCKETS, score_bucket
+
+GRANULARITIES = ("day", "week")
+
+# Activities that feed the rollup
+TREND_ACTIVITY_TYPES = ("stage_changed", "lead_scored")
+TREND_ACTIVITY_COLUMNS = "id, contact_id, activity_type, title, details, created_at"
+
+# Legacy stage_changed rows only carry the transition in their title
+_STAGE_TITLE = re.compile(r"^Stage: (.*) → (.*)$")
+
+
+def parse_time(value: str) -> datetime:
+    """PostgREST timestamptz text as an aware datetime."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def day_of(value: str) -> date:
+    """UTC calendar day of a timestamptz string."""
+    return parse_time(value).astimezone(timezone.utc).date()
+
+
+def day_start(day: date) -> str:
+    """ISO timestamp of a UTC day's first instant (for created_at filters)."""
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def period_start(day: date, granularity: str) -> date:
+    """First day of the period `day` falls in (weeks start on Monday)."""
+    return day - timedelta(days=day.weekday()) if granularity == "week" else day
+
+
+def parse_transition(activity: dict) -> tuple | None:
+    """(from_stage, to_stage) of a stage_changed activity, or None if unreadable."""
+    details = activity.get("details") or {}
+    if details.get("to"):
+        return details.get("from"), details["to"]
+    match = _STAGE_TITLE.match(activity.get("title") or "")
+    return match.groups() if match else None
+
+
+class DayBucket:
+    """Counts for one UTC day (or, once merged, one reporting period)."""
+
+    __slots__ = ("new_contacts", "transitions", "won_deals", "won_value", "scores")
+
+    def __init__(self):
+        self.new_contacts = 0
+        self.transitions = {}  # "from → to" -> count
+        self.won_deals = 0
+        self.won_value = 0.0
+        self.scores = dict.fromkeys(SCORE_BUCKETS, 0)
+
+    def merge(self, other: "DayBucket"):
+        self.new_contacts += other.new_contacts
+        for key, n in other.transitions.items():
+            self.transitions[key] = self.transitions.get(key, 0) + n
+        self.won_deals += other.won_deals
+        self.won_value += other.won_value
+        for bucket, n in other.scores.items():
+            self.scores[bucket] += n
+
+    def payload(self, period: date) -> dict:
+        return {
+            "period": period.isoformat(),
+            "new_contacts": self.new_contacts,
+            "stage_transitions": dict(sorted(self.transitions.items(), key=lambda kv: (-kv[1], kv[0]))),
+            "won_deals": self.won_deals,
+            "won_value": round(self.won_value, 2),
+            "score_distribution": dict(self.scores),
+        }
+
+
+class TrendBuilder:
+    """Folds the rows of one created_at range into fresh day buckets.
+
+    Accepts raw contact and activity rows (streaming) or grouped rows from
+    the mcp_trend_rollup function (push-down); both fill the same buckets.
+    """
+
+    def __init__(self):
+        self.days = {}  # date -> DayBucket
+        self.rows = 0
+        self._unvalued = {}  # contact_id -> [day, ...] for won deals without a logged value
+
+    def _day(self, day: date) -> DayBucket:
+        bucket = self.days.get(day)
+        if bucket is None:
+            bucket = self.days[day] = DayBucket()
+        return bucket
+
+    def add_contact(self, row: dict):
+        self.rows += 1
+        self._day(day_of(row["created_at"])).new_contacts += 1
+
+    def add_activity(self, row: dict):
+        self.rows += 1
+        day = day_of(row["created_at"])
+        if row["activity_type"] == "lead_scored":
+            score = (row.get("details") or {}).get("score")
+            if score is not None:
+                self._day(day).scores[score_bucket(score)] += 1
+            return
+
+        transition = parse_transition(row)
+        if transition is None:
+            return
+        bucket = self._day(day)
+        key = f"{transition[0] or 'unknown'} → {transition[1]}"
+        bucket.transitions[key] = bucket.transitions.get(key, 0) + 1
+        if transition[1] == "won":
+            bucket.won_deals += 1
+            value = (row.get("details") or {}).get("deal_value")
+            if value is not None:
+                bucket.won_value += float(value)
+            elif row.get("contact_id"):
+                self._unvalued.setdefault(row["contact_id"], []).append(day)
+
+    def add_group(self, day: str, metric: str, key: str | None, count: int, value):
+        """Fold one mcp_trend_rollup row."""
+        self.rows += 1
+        bucket = self._day(date.fromisoformat(day))
+        if metric == "new_contacts":
+            bucket.new_contacts += count
+        elif metric == "transition":
+            bucket.transitions[key] = bucket.transitions.get(key, 0) + count
+        elif metric == "won":
+            bucket.won_deals += count
+            bucket.won_value += float(value or 0)
+        elif metric == "score":
+            bucket.scores[key] += count
+
+    def unvalued_contacts(self) -> list[str]:
+        """Contacts whose won transition predates logged deal values."""
+        return list(self._unvalued)
+
+    def resolve_values(self, values: dict):
+        """Credit won deals with their contacts' current deal_value."""
+        for contact_id, days in self._unvalued.items():
+            for day in days:
+                self.days[day].won_value += float(values.get(contact_id) or 0)
+        self._unvalued.clear()
+
+
+class TrendStore:
+    """Per-user daily rollups with frozen history, LRU-bounded by user."""
+
+    def __init__(self, settle_seconds: float = 300, max_users: int = 1000):
+        self.settle_seconds = settle_seconds
+        self.max_users = max_users
+        self._entries = OrderedDict()  # user_id -> {"days", "covered_from", "frozen_before"}
+        self._counters = {"builds": 0, "refreshes": 0, "backfills": 0, "days_rebuilt": 0, "evictions": 0}
+
+    def plan(self, user_id: str, since: date) -> tuple[dict | None, list]:
+        """The user's rollup (None if not loaded) and the (start, end) day ranges
+        to scan before it can answer from `since`; end=None means open-ended."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None, [(since, None)]
+        ranges = []
+        if since < entry["covered_from"]:
+            ranges.append((since, entry["covered_from"]))
+        ranges.append((entry["frozen_before"], None))
+        return entry, ranges
+
+    def commit(self, user_id: str, entry: dict | None, built: list, scanned_at: float) -> dict:
+        """Replace the scanned ranges' days with `built` [(start, end, TrendBuilder)];
+        `scanned_at` is the epoch time the scan started. Returns the user's days."""
+        if entry is None:
+            entry = {"days": {}, "covered_from": built[0][0], "frozen_before": built[0][0]}
+            self._counters["builds"] += 1
+        frozen = (datetime.fromtimestamp(scanned_at - self.settle_seconds, timezone.utc)).date()
+        for start, end, builder in built:
+            days = entry["days"]
+            for day in [d for d in days if d >= start and (end is None or d < end)]:
+                del days[day]
+            days.update(builder.days)
+            self._counters["days_rebuilt"] += len(builder.days)
+            entry["covered_from"] = min(entry["covered_from"], start)
+            if end is None:
+                entry["frozen_before"] = max(entry["frozen_before"], frozen)
+                self._counters["refreshes"] += 1
+            else:
+                self._counters["backfills"] += 1
+
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+        return entry["days"]
+
+    def drop(self, user_id: str):
+        """Forget a user's rollup (the next read rebuilds it)."""
+        self._entries.pop(user_id, None)
+
+    def info(self, user_id: str) -> dict:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return {}
+        return {
+            "covered_from": entry["covered_from"].isoformat(),
+            "frozen_before": entry["frozen_before"].isoformat(),
+            "days_stored": len(entry["days"]),
+        }
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "users": len(self._entries),
+            "days_stored": sum(len(e["days"]) for e in self._entries.values()),
+            "max_users": self.max_users,
+            "settle_seconds": self.settle_seconds,
+        }
+
+
+def series(days: dict, since: date, until: date, granularity: str) -> list[dict]:
+    """Zero-filled periods from `since` through `until`, oldest first."""
+    periods = OrderedDict()
+    day = since
+    while day <= until:
+        start = period_start(day, granularity)
+        period = periods.get(start)
+        if period is None:
+            period = periods[start] = DayBucket()
+        bucket = days.get(day)
+        if bucket is not None:
+            period.merge(bucket)
+        day += timedelta(days=1)
+    return [bucket.payload(start) for start, bucket in periods.items()]
@@ -0,0 +1,63 @@
+"""
+Shared fixtures: the MCP server module wired to an in-memory FakeSupabase.
+
+Run from the repository root with `python -m pytest tools/tests`. The fake
+caps every select and RPC result at max_rows (1000, PostgREST's default), so
+any query that relies on a single unpaged response shows up as wrong numbers.
+"""
+
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quotahit_fakedb as fakedb  # noqa: E402
+import quotahit_mcp as q  # noqa: E402
+from quotahit_activity import ActivityLogger  # noqa: E402
+from quotahit_aggregates import AggregateStore  # noqa: E402
+from quotahit_cache import ReadThroughCache  # noqa: E402
+from quotahit_search import SearchIndexStore  # noqa: E402
+from quotahit_singleflight import SingleFlight  # noqa: E402
+from quotahit_trends import TrendStore  # noqa: E402
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """quotahit_mcp with empty caches, indexes and rollups; no database yet."""
+    monkeypatch.setattr(q, "_supabase", None)
+    monkeypatch.setattr(q, "_cache", ReadThroughCache(q.CACHE_TTLS, q.CACHE_MAX_ENTRIES))
+    monkeypatch.setattr(q, "_flights", SingleFlight())
+    monkeypatch.setattr(q, "_aggregates", AggregateStore(q.AGG_RECONCILE_SECONDS, q.AGG_MAX_USERS))
+    monkeypatch.setattr(q, "_trends", TrendStore(q.TRENDS_SETTLE_SECONDS, q.TRENDS_MAX_USERS))
+    monkeypatch.setattr(q, "_search", SearchIndexStore(q.SEARCH_REFRESH_SECONDS, q.SEARCH_MAX_DOCS))
+    monkeypatch.setattr(q, "_dedupe", SearchIndexStore(q.SEARCH_REFRESH_SECONDS, q.SEARCH_MAX_DOCS))
+    monkeypatch.setattr(q, "_activity_log", ActivityLogger(q._get_supabase, on_written=q._activities_written))
+    monkeypatch.setattr(q, "_pushdown_available", True)
+    monkeypatch.setattr(q, "_trend_pushdown_available", True)
+    return q
+
+
+@pytest.fixture(scope="session")
+def book():
+    """Synthetic tables where BENCH_USER has 3,000 contacts: well past the row cap."""
+    return fakedb.generate(3000)
+
+
+@pytest.fixture
+def connect(server, book):
+    """connect(max_rows=1000, rpc=True) -> a FakeSupabase over a copy of `book`,
+    installed as the server's client; rpc=False drops the SQL functions."""
+
+    def connect(max_rows: int = 1000, rpc: bool = True, tables: dict | None = None):
+        fake = fakedb.FakeSupabase(
+            copy.deepcopy(book if tables is None else tables),
+            functions=None if rpc else {},
+            max_rows=max_rows,
+        )
+        server._supabase = fake
+        return fake
+
+    return connect
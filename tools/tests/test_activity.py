@@ -0,0 +1,58 @@
+"""ActivityLogger: a row the database rejects costs only that row."""
+
+import asyncio
+
+from quotahit_activity import ActivityLogger
+from quotahit_fakedb import BENCH_USER
+
+
+def _row(n: int, **extra) -> dict:
+    return {"user_id": BENCH_USER, "activity_type": "note", "title": f"Row {n}", **extra}
+
+
+def test_rejected_row_is_isolated(connect):
+    db = connect()
+    existing = db.rows("activities")[0]["id"]
+    before = len(db.rows("activities"))
+    written = []
+
+    async def get_client():
+        return db
+
+    # A retried rejection would sleep for minutes at this backoff
+    log = ActivityLogger(get_client, batch_size=16, retry_backoff=60, on_written=written.extend)
+    rows = [_row(n) for n in range(16)]
+    rows[5]["id"] = existing  # primary-key violation: retrying can't fix it
+
+    async def run():
+        await log.log(rows)
+        await log.flush()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    stats = log.stats()
+    assert stats["rejected"] == 1 and stats["retries"] == 0 and stats["dropped"] == 0
+    assert stats["written"] == 15
+    assert len(db.rows("activities")) == before + 15
+    assert sorted(r["title"] for r in written) == sorted(r["title"] for i, r in enumerate(rows) if i != 5)
+
+
+def test_transient_error_is_retried(connect):
+    db = connect()
+    failures = [ConnectionError("reset")]
+
+    async def get_client():
+        if failures:
+            raise failures.pop()
+        return db
+
+    log = ActivityLogger(get_client, retry_backoff=0.001)
+
+    async def run():
+        await log.log([_row(n) for n in range(3)])
+        await log.flush()
+
+    asyncio.run(run())
+
+    stats = log.stats()
+    assert stats["retries"] == 1 and stats["written"] == 3 and stats["rejected"] == 0
@@ -0,0 +1,24 @@
+"""AggregateStore: per-user write generations stay bounded without losing races."""
+
+from quotahit_aggregates import AggregateStore, ContactStats
+
+
+def test_generations_are_bounded():
+    store = AggregateStore(max_users=4)
+    for n in range(100):
+        store.apply(f"user-{n}")
+    assert store.stats()["generations"] == 4
+
+
+def test_build_racing_a_forgotten_write_is_due_for_reconcile():
+    store = AggregateStore(max_users=4)
+    generation = store.generation("racer")
+    store.apply("racer", new={"deal_stage": "lead"})
+    for n in range(10):  # push "racer" out of the generation map
+        store.apply(f"user-{n}")
+
+    store.put("racer", ContactStats(), generation)
+
+    assert store.get("racer") is None  # stored, but already due for reconciliation
+    store.put("racer", ContactStats(), store.generation("racer"))
+    assert store.get("racer") is not None
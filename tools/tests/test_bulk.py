@@ -0,0 +1,110 @@
+"""bulk_update_deal_stage and bulk_update_contacts, with and without the SQL functions."""
+
+import asyncio
+import json
+
+import pytest
+
+from quotahit_fakedb import BENCH_USER
+
+FILTER = json.dumps({"deal_stage": "contacted", "lead_score": {"gte": 70}})
+
+
+def _call(tool, **kwargs):
+    reply = asyncio.run(tool(user_id=BENCH_USER, **kwargs))
+    return json.loads(reply) if reply.startswith("{") else reply
+
+
+def _pipeline(server) -> dict:
+    payload = _call(server.get_pipeline)
+    return {k: v for k, v in payload.items() if k != "scan"}  # how it was computed, not what
+
+
+def _rebuilt_pipeline(server) -> dict:
+    server._aggregates.drop(BENCH_USER)
+    server._cache.invalidate(BENCH_USER, server.DASHBOARD_TOOLS)
+    return _pipeline(server)
+
+
+@pytest.mark.parametrize("rpc", [True, False])
+def test_stage_by_filter(connect, server, book, rpc):
+    db = connect(rpc=rpc)
+    targets = {
+        c["id"] for c in book["contacts"]
+        if c["user_id"] == BENCH_USER and c["deal_stage"] == "contacted" and (c["lead_score"] or 0) >= 70
+    }
+    _pipeline(server)  # materialize aggregates so the bulk write applies deltas
+
+    report = _call(server.bulk_update_deal_stage, new_stage="qualified", filter=FILTER, sync=True)
+
+    assert report == {
+        "matched": len(targets), "new_stage": "qualified", "updated": len(targets), "unchanged": 0,
+        "transitions": {"contacted → qualified": len(targets)}, "failed": 0,
+    }
+    rows = {r["id"]: r for r in db.rows("contacts") if r["id"] in targets}
+    assert all(r["deal_stage"] == "qualified" for r in rows.values())
+    logged = [
+        a for a in db.rows("activities")
+        if a["activity_type"] == "stage_changed" and a["details"].get("to") == "qualified" and a["contact_id"] in targets
+    ]
+    assert len(logged) == len(targets) and {a["contact_id"] for a in logged} == targets
+    assert _pipeline(server) == _rebuilt_pipeline(server)
+
+
+def test_stage_by_ids_reports_unchanged_and_missing(connect, server, book):
+    connect()
+    mine = [c for c in book["contacts"] if c["user_id"] == BENCH_USER]
+    won = next(c["id"] for c in mine if c["deal_stage"] == "won")
+    lead = next(c["id"] for c in mine if c["deal_stage"] == "lead")
+    foreign = next(c["id"] for c in book["contacts"] if c["user_id"] != BENCH_USER)
+
+    report = _call(
+        server.bulk_update_deal_stage, new_stage="won", contact_ids=f"{won},{lead},missing,{foreign},{lead}",
+    )
+
+    assert report["matched"] == 4 and report["updated"] == 1 and report["unchanged"] == 1
+    assert report["errors"] == [{"id": "missing", "error": "not found"}, {"id": foreign, "error": "not found"}]
+
+
+def test_stage_rejects_bad_targets(connect, server):
+    connect()
+    assert _call(server.bulk_update_deal_stage, new_stage="won") == (
+        "Error: provide exactly one of contact_ids or filter"
+    )
+    assert _call(server.bulk_update_deal_stage, new_stage="won", filter='{"password": 1}') == (
+        "Error: unknown filter column 'password'"
+    )
+    assert _call(server.bulk_update_deal_stage, new_stage="done", contact_ids="x").startswith("Invalid stage")
+
+
+@pytest.mark.parametrize("rpc", [True, False])
+def test_per_contact_updates(connect, server, book, rpc):
+    db = connect(rpc=rpc)
+    first, second = [c for c in book["contacts"] if c["user_id"] == BENCH_USER][:2]
+    _pipeline(server)
+    _call(server.list_contacts, search="zebulon")  # build the search index before the write
+
+    report = _call(server.bulk_update_contacts, updates=json.dumps([
+        {"id": first["id"], "first_name": "Zebulon", "deal_value": 123456},
+        {"id": second["id"], "title": "CTO"},
+        {"id": "missing", "title": "CTO"},
+    ]))
+
+    assert report["updated"] == 2 and report["failed"] == 1
+    assert report["fields"] == ["deal_value", "first_name", "title"]
+    rows = {r["id"]: r for r in db.rows("contacts")}
+    assert rows[first["id"]]["first_name"] == "Zebulon" and rows[first["id"]]["deal_value"] == 123456
+    assert rows[second["id"]]["title"] == "CTO" and rows[second["id"]]["first_name"] == second["first_name"]
+
+    found = _call(server.list_contacts, search="zebulon")
+    assert [c["id"] for c in found["contacts"]] == [first["id"]]
+    assert _pipeline(server) == _rebuilt_pipeline(server)
+
+
+def test_uniform_update_rejects_read_only_fields(connect, server, book):
+    connect()
+    contact = next(c for c in book["contacts"] if c["user_id"] == BENCH_USER)
+
+    reply = _call(server.bulk_update_contacts, updates='{"created_at": "2020-01-01"}', contact_ids=contact["id"])
+
+    assert reply == "Error: unknown or read-only field(s): created_at"
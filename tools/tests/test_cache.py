@@ -0,0 +1,39 @@
+"""ReadThroughCache: per-user generations stay bounded without losing races."""
+
+import asyncio
+
+from quotahit_cache import ReadThroughCache
+
+
+def _cache() -> ReadThroughCache:
+    return ReadThroughCache({"get_pipeline": 60}, max_entries=4)
+
+
+def test_generations_are_bounded():
+    cache = _cache()
+    for n in range(100):
+        cache.invalidate(f"user-{n}", ("get_pipeline",))
+    assert cache.stats()["generations"] == 4
+
+
+def test_load_racing_a_forgotten_invalidation_is_not_cached():
+    cache = _cache()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        if len(loads) == 1:
+            cache.invalidate("racer", ("get_pipeline",))
+            for n in range(10):  # push "racer" out of the generation map
+                cache.invalidate(f"user-{n}", ("get_pipeline",))
+        return {"n": len(loads)}
+
+    async def run():
+        first = await cache.get_or_load("get_pipeline", "racer", load)
+        second = await cache.get_or_load("get_pipeline", "racer", load)
+        third = await cache.get_or_load("get_pipeline", "racer", load)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == {"n": 1} and second == {"n": 2}  # the raced result was discarded
+    assert third == second  # later loads cache normally
@@ -0,0 +1,114 @@
+"""CampaignEngine: checkpoints, a lost lease, and resuming from the checkpoint."""
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from quotahit_campaigns import CampaignEngine, outreach
+from quotahit_fakedb import BENCH_USER
+
+
+class Processor:
+    """outreach() that records each contact and, once `hold_after` contacts have
+    started, waits for `release` before processing more."""
+
+    def __init__(self, hold_after: int | None = None):
+        self.seen = []
+        self.hold_after = hold_after
+        self.held = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self, campaign: dict, contact: dict):
+        self.seen.append(contact["id"])
+        if self.hold_after is not None and len(self.seen) > self.hold_after:
+            self.held.set()
+            await self.release.wait()
+        await asyncio.sleep(0)
+        return await outreach(campaign, contact)
+
+
+def _engine(server, process) -> CampaignEngine:
+    return CampaignEngine(server._get_supabase, process, checkpoint_every=100, checkpoint_seconds=0.01, lease_seconds=60)
+
+
+def _campaign(db) -> dict:
+    campaign = next(c for c in db.rows("campaigns") if c["user_id"] == BENCH_USER)
+    campaign.update(status="draft", contact_filter=None, completed_contacts=0)
+    return campaign
+
+
+def _execute(server, campaign: dict, **kwargs) -> dict:
+    return json.loads(asyncio.run(server.execute_campaign(campaign["id"], BENCH_USER, **kwargs)))
+
+
+def test_resumes_from_checkpoint_after_a_lost_lease(connect, server, monkeypatch):
+    db = connect()
+    campaign = _campaign(db)
+    first, second = Processor(hold_after=1000), Processor()
+
+    async def lose_lease():
+        monkeypatch.setattr(server, "_campaigns", _engine(server, first))
+        await server.execute_campaign(campaign["id"], BENCH_USER)
+        run = server._campaigns.run(campaign["id"])
+        await first.held.wait()
+        while run.committed < 900:  # let the checkpoint catch up with the held contacts
+            await asyncio.sleep(0.005)
+        campaign["runner_id"] = "another-server"  # taken over mid-run
+        first.release.set()
+        await asyncio.wait({run.task})
+        return run
+
+    lost = asyncio.run(lose_lease())
+
+    assert lost.status == "paused" and lost.lease_lost
+    assert campaign["runner_id"] == "another-server"  # no final write under a lost lease
+    checkpointed = campaign["completed_contacts"]
+    assert 900 <= checkpointed < 3000 and checkpointed == sum(campaign["checkpoint"]["outcomes"].values())
+
+    # The other server crashes; once its lease is stale the campaign can be resumed
+    campaign["heartbeat_at"] = (datetime.now(timezone.utc) - timedelta(seconds=120)).isoformat()
+    monkeypatch.setattr(server, "_campaigns", _engine(server, second))
+    done = _execute(server, campaign, wait=True)
+
+    assert done["status"] == "completed" and done["resumed_from"] == checkpointed
+    assert len(second.seen) == 3000 - checkpointed  # nothing below the checkpoint is redone
+    assert campaign["status"] == "completed" and campaign["completed_contacts"] == 3000
+    assert campaign["runner_id"] is None
+
+    outcomes = campaign["checkpoint"]["outcomes"]
+    queued = [m for m in db.rows("follow_up_messages") if m["metadata"].get("campaign_id") == campaign["id"]]
+    assert sum(outcomes.values()) == 3000
+    assert len(queued) == outcomes["queued"]  # contacts processed twice queued only once
+    assert len({m["contact_id"] for m in queued}) == len(queued)
+
+
+def test_live_lease_is_not_taken(connect, server, monkeypatch):
+    db = connect()
+    campaign = _campaign(db)
+    campaign.update(status="active", runner_id="another-server", heartbeat_at=datetime.now(timezone.utc).isoformat())
+    process = Processor()
+    monkeypatch.setattr(server, "_campaigns", _engine(server, process))
+
+    reply = _execute(server, campaign)
+
+    assert reply["started"] is False and reply["note"] == "Another server is running this campaign"
+    assert process.seen == [] and campaign["runner_id"] == "another-server"
+
+
+def test_stop_checkpoints_and_releases_the_lease(connect, server, monkeypatch):
+    db = connect()
+    campaign = _campaign(db)
+    process = Processor(hold_after=300)
+    monkeypatch.setattr(server, "_campaigns", _engine(server, process))
+
+    async def run():
+        await server.execute_campaign(campaign["id"], BENCH_USER)
+        await process.held.wait()
+        await server._campaigns.stop(5)
+        return server._campaigns.run(campaign["id"])
+
+    stopped = asyncio.run(run())
+
+    assert stopped.status == "stopped"
+    assert campaign["status"] == "active" and campaign["runner_id"] is None  # resumable at once
+    assert campaign["completed_contacts"] == stopped.completed >= 300
@@ -0,0 +1,107 @@
+"""Keyset cursors: round-trip, full coverage in sort order, stability across inserts."""
+
+import asyncio
+import json
+from collections import Counter
+
+import pytest
+
+from quotahit_fakedb import BENCH_USER
+
+
+def _page(server, sort_by: str = "created_at", cursor: str = "", limit: int = 100, **kwargs) -> dict:
+    reply = asyncio.run(server.list_contacts(
+        user_id=BENCH_USER, sort_by=sort_by, limit=limit, cursor=cursor, fields="id", **kwargs,
+    ))
+    return json.loads(reply)
+
+
+def _walk(server, sort_by: str, cursor: str = "", **kwargs) -> list[str]:
+    ids = []
+    while True:
+        page = _page(server, sort_by, cursor, **kwargs)
+        ids += [c["id"] for c in page["contacts"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def _expected(book, column: str) -> list[str]:
+    """`column DESC NULLS LAST, id DESC`, the order _keyset_order asks for."""
+    contacts = [c for c in book["contacts"] if c["user_id"] == BENCH_USER]
+    key = lambda c: (c[column] is not None, c[column] if c[column] is not None else 0, c["id"])  # noqa: E731
+    return [c["id"] for c in sorted(contacts, key=key, reverse=True)]
+
+
+def test_cursor_round_trip(server):
+    row = {"id": "c1", "lead_score": 42}
+    cursor = server._encode_cursor("lead_score", row, "lead_score")
+
+    assert server._decode_cursor(cursor, "lead_score") == (42, "c1")
+    with pytest.raises(ValueError, match="issued for sort 'lead_score'"):
+        server._decode_cursor(cursor, "deal_value")
+    with pytest.raises(ValueError, match="invalid cursor"):
+        server._decode_cursor("not a cursor", "lead_score")
+
+
+@pytest.mark.parametrize("sort_by", ["created_at", "lead_score", "last_contacted"])
+def test_cursor_walk_covers_every_row_in_order(connect, server, book, sort_by):
+    connect()
+    # lead_score has ties and NULLs; last_contacted is NULL for a third of the book
+    assert _walk(server, sort_by) == _expected(book, server.SORT_COLUMNS[sort_by])
+
+
+def test_cursor_is_stable_across_inserts(connect, server, book):
+    connect()
+    first = _page(server, "created_at")
+    asyncio.run(server.create_contact("Inserted", BENCH_USER, sync=True))  # sorts ahead of page one
+
+    rest = _walk(server, "created_at", first["next_cursor"])
+
+    assert [c["id"] for c in first["contacts"]] + rest == _expected(book, "created_at")
+
+
+def test_cursor_from_another_sort_is_rejected(connect, server):
+    connect()
+    cursor = _page(server, "lead_score")["next_cursor"]
+
+    reply = asyncio.run(server.list_contacts(user_id=BENCH_USER, sort_by="deal_value", cursor=cursor))
+
+    assert reply == "Error: cursor was issued for sort 'lead_score', not 'deal_value'"
+
+
+def test_search_cursor_pages_match_one_page(connect, server):
+    connect()
+    whole = _page(server, search="an", limit=100)
+    assert whole["next_cursor"]
+
+    ids, cursor = [], ""
+    for _ in range(5):
+        page = _page(server, search="an", limit=20, cursor=cursor)
+        ids += [c["id"] for c in page["contacts"]]
+        cursor = page["next_cursor"]
+
+    assert ids == [c["id"] for c in whole["contacts"]]
+
+
+def test_activity_cursor_walks_newest_first(connect, server, book):
+    connect()
+    activities = [a for a in book["activities"] if a["user_id"] == BENCH_USER]
+    [(contact_id, _)] = Counter(a["contact_id"] for a in activities).most_common(1)
+    expected = sorted(
+        (a for a in activities if a["contact_id"] == contact_id),
+        key=lambda a: (a["created_at"], a["id"]), reverse=True,
+    )
+    assert len(expected) > 2
+
+    ids, cursor = [], ""
+    while True:
+        page = json.loads(asyncio.run(server.get_contact(
+            contact_id, BENCH_USER, activities_limit=2, activities_cursor=cursor,
+        )))
+        ids += [a["id"] for a in page["activities"]]
+        cursor = page["activities_next_cursor"]
+        if not cursor:
+            break
+
+    assert ids == [a["id"] for a in expected]
@@ -0,0 +1,32 @@
+"""get_pipeline / get_analytics: mcp_contact_rollup push-down against the streaming scan."""
+
+import asyncio
+import copy
+import json
+
+import pytest
+
+from quotahit_fakedb import BENCH_USER, rpc_contact_rollup
+
+
+def _dashboard(server, tool: str, mode: str) -> dict:
+    payload = json.loads(asyncio.run(getattr(server, tool)(BENCH_USER, mode=mode)))
+    assert payload.pop("scan")["mode"] == mode
+    return payload
+
+
+@pytest.mark.parametrize("tool", ["get_pipeline", "get_analytics"])
+def test_pushdown_matches_scan(connect, server, tool):
+    connect()
+    assert _dashboard(server, tool, "pushdown") == _dashboard(server, tool, "scan")
+
+
+@pytest.mark.parametrize("tool", ["get_pipeline", "get_analytics"])
+def test_pushdown_pages_past_row_cap(connect, server, book, tool):
+    tables = copy.deepcopy(book)
+    for n, contact in enumerate(tables["contacts"]):
+        contact["source"] = f"list-{n % 500}"  # many distinct sources: one rollup row each
+    fake = connect(tables=tables)
+    assert len(rpc_contact_rollup(fake, BENCH_USER)) > 1000
+
+    assert _dashboard(server, tool, "pushdown") == _dashboard(server, tool, "scan")
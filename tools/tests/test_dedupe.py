@@ -0,0 +1,123 @@
+"""DedupeIndex blocking and grouping, and merge_fields."""
+
+from quotahit_dedupe import DedupeIndex, merge_fields, normalize_email, normalize_phone
+
+
+def _contact(cid: str, first: str, last: str, email=None, phone=None, company=None) -> dict:
+    return {"id": cid, "first_name": first, "last_name": last, "email": email, "phone": phone, "company": company}
+
+
+def _index(*contacts, max_block: int = 100) -> DedupeIndex:
+    index = DedupeIndex(max_block)
+    for c in contacts:
+        index.add(c)
+    return index
+
+
+def test_normalized_blocking_keys():
+    assert normalize_email("Jane.Doe+news@GoogleMail.com") == "janedoe@gmail.com"
+    assert normalize_email("not-an-address") == ""
+    assert normalize_phone("(415) 555-0123 ext. 9") == "+14155550123"
+    assert normalize_phone("0044 20 7946 0958") == "+442079460958"
+    assert normalize_phone("12") == ""
+
+
+def test_pairs_join_transitively_into_one_group():
+    index = _index(
+        _contact("a", "Jane", "Doe", email="jane.doe+x@gmail.com"),
+        _contact("b", "Jane", "Doe", email="janedoe@gmail.com", phone="415 555 0123"),
+        _contact("c", "J", "Doe", phone="+1 (415) 555-0123"),  # shares only b's phone
+        _contact("d", "Jane", "Doe", email="jd@gmail.com"),  # free-mail domain: no block with a/b
+        _contact("e", "Sam", "Roe", email="sam@acme.io"),
+    )
+
+    groups, stats = index.duplicates(min_score=0.3)
+
+    assert stats["groups_found"] == 1 and stats["comparisons"] == 2  # a-b by email, b-c by phone
+    [group] = groups
+    assert {c["id"] for c in group["contacts"]} == {"a", "b", "c"}
+    assert group["suggested_primary"] == "b"  # the most complete record
+    assert [p["reasons"][0] for p in group["pairs"]] == ["email", "phone"]
+
+
+def test_pair_sharing_several_blocks_is_compared_once():
+    index = _index(
+        _contact("a", "Ann", "Lee", email="ann@acme.io", phone="4155550100"),
+        _contact("b", "Ann", "Lee", email="ann@acme.io", phone="4155550100"),
+    )
+
+    [group], stats = index.duplicates(min_score=0.5)
+
+    assert stats["blocks"] == 3 and stats["comparisons"] == 1
+    assert group["score"] == 1.0
+    assert group["pairs"][0]["reasons"] == ["email", "phone", "domain", "name"]
+
+
+def test_company_domain_and_similar_name_match():
+    index = _index(
+        _contact("a", "Katherine", "Smith", email="katherine@acme.io"),
+        _contact("b", "Kath", "Smith", email="ksmith@acme.io"),  # a prefix of the first name
+        _contact("c", "Bob", "Smith", email="bob@acme.io"),
+    )
+
+    groups, _ = index.duplicates(min_score=0.45)
+
+    assert [{c["id"] for c in g["contacts"]} for g in groups] == [{"a", "b"}]
+
+
+def test_oversized_block_is_skipped():
+    switchboard = [_contact(f"c{n}", f"Name{n}", f"Last{n}", phone="4155550199") for n in range(5)]
+    index = _index(*switchboard, max_block=3)
+
+    groups, stats = index.duplicates(min_score=0.3)
+
+    assert groups == [] and stats["skipped_blocks"] == 1 and stats["comparisons"] == 0
+
+
+def test_matches_and_reindexing():
+    index = _index(
+        _contact("a", "Jane", "Doe", email="jane@acme.io"),
+        _contact("b", "Sam", "Roe", email="sam@acme.io"),
+    )
+    probe = _contact("new", "Jane", "Doe", email="JANE@acme.io")
+
+    assert [m["id"] for m in index.matches(probe, 0.5)] == ["a"]
+
+    index.add(_contact("a", "Jane", "Doe", email="jane.doe@other.io"))  # edited: old keys are gone
+    assert index.matches(probe, 0.5) == []
+    index.remove("a")
+    assert len(index) == 1
+
+
+def test_merge_fields():
+    primary = {
+        "id": "p", "email": "jane@acme.io", "phone": "", "title": None,
+        "lead_score": 40, "deal_value": 1000, "tags": ["vip"], "custom_fields": {"tier": "gold"},
+        "notes": "Met at expo", "do_not_call": False, "enrichment_status": "pending",
+        "last_contacted_at": "2025-03-01T00:00:00+00:00",
+    }
+    duplicates = [
+        {
+            "id": "d1", "phone": "+14155550123", "title": "CTO", "lead_score": 70, "deal_value": 500,
+            "tags": ["vip", "expo"], "custom_fields": {"tier": "silver", "region": "west"},
+            "notes": "Asked for pricing", "do_not_call": True,
+            "enrichment_status": "enriched", "enrichment_data": {"size": 50}, "enriched_at": "2025-02-01",
+            "last_contacted_at": "2025-04-01T00:00:00+00:00",
+        },
+        {"id": "d2", "title": "VP", "notes": "Met at expo", "tags": None},
+    ]
+
+    assert merge_fields(primary, duplicates) == {
+        "phone": "+14155550123",
+        "title": "CTO",  # first duplicate that has one
+        "lead_score": 70,
+        "last_contacted_at": "2025-04-01T00:00:00+00:00",
+        "do_not_call": True,
+        "tags": ["vip", "expo"],
+        "custom_fields": {"tier": "gold", "region": "west"},  # the primary's values win
+        "notes": "Met at expo\n\nAsked for pricing",
+        "enrichment_status": "enriched",
+        "enrichment_data": {"size": 50},
+        "enriched_at": "2025-02-01",
+    }
+    assert merge_fields(primary, [{"id": "d", "email": "other@acme.io"}]) == {}
@@ -0,0 +1,162 @@
+"""Follow-up dispatcher and send_followup against a fake channel backend."""
+
+import asyncio
+import copy
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import quotahit_fakedb as fakedb
+from quotahit_dispatch import CHANNELS, ChannelBackend, Dispatcher, SendError
+
+
+class RecordingChannel(ChannelBackend):
+    """Records every send and the message row's status at that moment;
+    raises the queued `failures` (one per send) before succeeding."""
+
+    channels = CHANNELS
+    concurrency = 4
+
+    def __init__(self, db, failures=()):
+        self.db = db
+        self.failures = list(failures)
+        self.sent = []
+        self.seen = []  # (status, claim_id) of the row while send() runs
+
+    async def send(self, message: dict) -> str | None:
+        row = self.db.table_data("follow_up_messages").bucket("id", message["id"])[0]
+        self.seen.append((row["status"], row["claim_id"]))
+        await asyncio.sleep(0.001)
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append(message["id"])
+        return f"recorded-{message['id']}"
+
+
+def _messages(book, count: int):
+    tables = copy.deepcopy(book)
+    fakedb.followups(tables, count)
+    db = fakedb.FakeSupabase(tables)
+    return db, {m["id"]: m for m in db.rows("follow_up_messages")}
+
+
+def _dispatcher(db, backend, **kwargs) -> Dispatcher:
+    async def get_client():
+        return db
+
+    options = {"batch_size": 20, "poll_interval": 0.01, "mark_interval": 0.01, "retry_backoff": 60, **kwargs}
+    return Dispatcher(get_client, dict.fromkeys(CHANNELS, backend), **options)
+
+
+def test_concurrent_claims_are_disjoint(book):
+    db, _ = _messages(book, 100)
+    a, b = (_dispatcher(db, RecordingChannel(db)) for _ in range(2))
+
+    async def claims():
+        return await asyncio.gather(a._claim(60, list(CHANNELS)), b._claim(60, list(CHANNELS)))
+
+    first, second = asyncio.run(claims())
+    assert len(first) + len(second) == 100
+    assert not {m["id"] for m in first} & {m["id"] for m in second}
+
+
+def test_two_dispatchers_never_send_the_same_message(book):
+    db, messages = _messages(book, 300)
+    backends = [RecordingChannel(db), RecordingChannel(db)]
+    dispatchers = [_dispatcher(db, backend) for backend in backends]
+
+    async def run():
+        for d in dispatchers:
+            d.start()
+        deadline = time.monotonic() + 10
+        while any(m["status"] != "sent" for m in messages.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        for d in dispatchers:
+            await d.stop()
+
+    asyncio.run(run())
+    sent = backends[0].sent + backends[1].sent
+    assert sorted(sent) == sorted(messages)  # every message exactly once
+    assert backends[0].sent and backends[1].sent  # both dispatchers took part
+    assert all(m["status"] == "sent" and m["claim_id"] is None for m in messages.values())
+
+
+def test_send_sees_sending_then_records_sent(book):
+    db, messages = _messages(book, 1)
+    (message_id, row), = messages.items()
+    backend = RecordingChannel(db)
+    dispatcher = _dispatcher(db, backend)
+
+    results = asyncio.run(dispatcher.send_now([message_id]))
+
+    assert backend.seen == [("sending", dispatcher.claim_id)]
+    assert [r["status"] for r in results] == ["sent"]
+    assert row["status"] == "sent" and row["sent_at"] and row["attempts"] == 1
+    assert row["claim_id"] is None
+
+
+def test_transient_failures_back_off_then_fail(book):
+    db, messages = _messages(book, 1)
+    (message_id, row), = messages.items()
+    backend = RecordingChannel(db, [SendError("busy")] * 3)
+    dispatcher = _dispatcher(db, backend, max_attempts=3, retry_backoff=60)
+
+    delays = []
+    for _ in range(2):
+        before = datetime.now(timezone.utc)
+        asyncio.run(dispatcher.send_now([message_id]))
+        assert row["status"] == "pending" and row["error"] == "busy" and row["claim_id"] is None
+        delays.append((datetime.fromisoformat(row["send_at"]) - before).total_seconds())
+
+    assert delays[0] == pytest.approx(60, abs=5)  # retry_backoff * 2 ** (attempt - 1)
+    assert delays[1] == pytest.approx(120, abs=5)
+
+    asyncio.run(dispatcher.send_now([message_id]))
+    assert row["status"] == "failed" and row["attempts"] == 3
+    assert backend.sent == []
+
+
+def test_permanent_failure_fails_at_once(book):
+    db, messages = _messages(book, 1)
+    (message_id, row), = messages.items()
+    backend = RecordingChannel(db, [SendError("bad address", permanent=True)])
+
+    asyncio.run(_dispatcher(db, backend).send_now([message_id]))
+
+    assert row["status"] == "failed" and row["error"] == "bad address" and row["attempts"] == 1
+
+
+def test_send_followup_twice_sends_once(connect, server, book, monkeypatch):
+    db = connect()
+    backend = RecordingChannel(db)
+    monkeypatch.setattr(server, "_dispatcher", _dispatcher(db, backend))
+    contact = next(
+        c for c in book["contacts"]
+        if c["user_id"] == fakedb.BENCH_USER and c.get("email") and not c.get("do_not_email")
+    )
+
+    def send():
+        return json.loads(asyncio.run(server.send_followup(
+            fakedb.BENCH_USER, contact["id"], "Thanks for the call.", idempotency_key="call-42",
+        )))
+
+    first, second = send(), send()
+
+    assert first["status"] == "sent"
+    assert second["repeat"] is True and second["status"] == "sent"
+    assert second["message_id"] == first["message_id"]
+    assert backend.sent == [first["message_id"]]
+
+    again = json.loads(asyncio.run(server.send_followup(fakedb.BENCH_USER, message_id=first["message_id"])))
+    assert again["status"] == "sent" and backend.sent == [first["message_id"]]
+
+
+def test_send_followup_missing_contact(connect, server, monkeypatch):
+    db = connect()
+    monkeypatch.setattr(server, "_dispatcher", _dispatcher(db, RecordingChannel(db)))
+
+    reply = asyncio.run(server.send_followup(fakedb.BENCH_USER, "no-such-contact", "Hello"))
+
+    assert reply == "Contact no-such-contact not found"
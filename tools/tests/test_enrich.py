@@ -0,0 +1,100 @@
+"""Enricher: one research call per company in flight, and honest write accounting."""
+
+import asyncio
+from collections import Counter
+
+from quotahit_enrich import CompanyCache, Enricher, StubResearch, company_key
+from quotahit_fakedb import BENCH_USER
+
+
+def _colleagues(book, companies: int = 3) -> list[dict]:
+    """Every BENCH_USER contact at the `companies` largest company domains."""
+    contacts = [c for c in book["contacts"] if c["user_id"] == BENCH_USER and company_key(c)]
+    top = {k for k, _ in Counter(company_key(c) for c in contacts).most_common(companies)}
+    return [c for c in contacts if company_key(c) in top]
+
+
+def _enricher(provider, write, **kwargs) -> Enricher:
+    options = {"workers": 8, "batch_size": 25, "flush_interval": 0.01, "retry_backoff": 0.001, "save_interval": 0}
+    return Enricher(provider, CompanyCache(), write, **{**options, **kwargs})
+
+
+def test_colleagues_share_one_research_call(connect, server, book):
+    db = connect()
+    contacts = _colleagues(book)
+    provider = StubResearch(latency=0.02)
+    enricher = _enricher(provider, server._write_enrichment)
+
+    async def run():
+        first = await enricher.submit(BENCH_USER, contacts)
+        await first.done.wait()
+        again = await enricher.submit(BENCH_USER, contacts)
+        await again.done.wait()
+        await enricher.stop()
+        await server._activity_log.flush()  # the write callback logs enrichment activities
+        return first.report(), again.report()
+
+    first, again = asyncio.run(run())
+
+    assert sorted(provider.calls.values()) == [1, 1, 1]
+    assert first["researched"] == 3 and first["researched"] + first["coalesced"] + first["cache_hits"] == len(contacts)
+    assert first["coalesced"] > 0  # workers waited on a colleague's lookup in flight
+    assert again["cache_hits"] == len(contacts) and again["researched"] == 0
+    assert first["written"] == first["enriched"] == len(contacts) and first["write_failed"] == 0
+
+    rows = {r["id"]: r for r in db.rows("contacts")}
+    assert all(rows[c["id"]]["enrichment_status"] == "enriched" for c in contacts)
+    assert all(rows[c["id"]]["enrichment_data"]["industry"] for c in contacts)
+
+
+def test_failed_research_is_shared_by_its_waiters(book):
+    contacts = _colleagues(book, companies=1)
+    provider = StubResearch(latency=0.02, failure_rate=1.0)
+    patches = []
+
+    async def write(user_id, batch):
+        patches.extend(batch)
+
+    enricher = _enricher(provider, write)
+
+    async def run():
+        job = await enricher.submit(BENCH_USER, contacts)
+        await job.done.wait()
+        await enricher.stop()
+        return job.report()
+
+    report = asyncio.run(run())
+
+    # Failures aren't cached: each wave of 8 workers makes one call that all of them share
+    [calls] = provider.calls.values()
+    assert calls == enricher.stats()["research_errors"] == -(-len(contacts) // 8) < len(contacts)
+    assert report["failed"] == len(contacts) == report["written"]
+    assert {p["enrichment_status"] for p in patches} == {"failed"}
+    assert {e["error"] for e in report["errors"]} == {"research failed: Stub research failure"}
+    assert len(enricher.cache) == 0  # failures are not cached
+
+
+def test_failed_write_is_not_counted_as_written(book):
+    contacts = _colleagues(book, companies=1)
+    attempts = []
+
+    async def write(user_id, batch):
+        attempts.append(len(batch))
+        raise ConnectionError("database unavailable")
+
+    enricher = _enricher(StubResearch(latency=0), write, batch_size=1000, max_retries=2)
+
+    async def run():
+        job = await enricher.submit(BENCH_USER, contacts)
+        await asyncio.wait_for(job.done.wait(), 5)  # done, though nothing was written
+        await enricher.stop()
+        return job.report()
+
+    report = asyncio.run(run())
+
+    assert report["status"] == "done" and report["written"] == 0
+    assert report["write_failed"] == len(contacts)
+    assert {e["error"] for e in report["errors"]} == {"enrichment status write failed"}
+    stats = enricher.stats()
+    assert stats["write_failed"] == len(contacts) and stats["written"] == 0
+    assert stats["write_retries"] == 2 * len(attempts) // 3  # each batch: 1 try + 2 retries
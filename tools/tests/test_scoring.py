@@ -0,0 +1,55 @@
+"""score_leads_batch over a book larger than PostgREST's row cap; score_lead without numpy."""
+
+import asyncio
+import json
+import sys
+
+from quotahit_fakedb import BENCH_USER
+from quotahit_scoring import score_contact, score_contacts
+
+
+def _scores(server) -> dict:
+    out = json.loads(asyncio.run(server.score_leads_batch(BENCH_USER)))
+    return {r["contact_id"]: r["score"] for r in out["results"]}
+
+
+def test_batch_scores_ignore_row_cap(connect, server, book):
+    engaged = {a["contact_id"] for a in book["activities"] if a["user_id"] == BENCH_USER}
+    assert len(engaged) > 1000  # mcp_activity_counts has more rows than one response holds
+
+    connect(max_rows=0)
+    uncapped = _scores(server)
+    connect(max_rows=1000)
+    capped = _scores(server)
+
+    assert len(capped) == 3000
+    assert capped == uncapped
+
+
+def test_batch_scores_match_streaming_fallback(connect, server):
+    connect()
+    grouped = _scores(server)
+    connect(rpc=False)
+    streamed = _scores(server)
+
+    assert grouped == streamed
+
+
+def test_one_row_scoring_matches_engine(book):
+    counts = {}
+    for a in book["activities"]:
+        counts[a["contact_id"]] = counts.get(a["contact_id"], 0) + 1
+    contacts = book["contacts"]
+
+    assert [score_contact(c, counts.get(c["id"], 0)) for c in contacts] == score_contacts(contacts, counts)
+
+
+def test_score_lead_without_numpy(connect, server, book, monkeypatch):
+    connect()
+    contact = next(c for c in book["contacts"] if c["user_id"] == BENCH_USER)
+    monkeypatch.setitem(sys.modules, "numpy", None)  # `import numpy` now raises ImportError
+    monkeypatch.delitem(sys.modules, "quotahit_scoring")  # as if never imported with numpy
+
+    out = json.loads(asyncio.run(server.score_lead(contact["id"], BENCH_USER)))
+
+    assert out["contact_id"] == contact["id"] and 0 <= out["score"] <= 100
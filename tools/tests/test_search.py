@@ -0,0 +1,37 @@
+"""SearchIndex: hits stay correct when writes compact the index mid-search."""
+
+from quotahit_search import SearchIndex
+
+
+def _contact(n: int) -> dict:
+    first = "Ann" if n % 2 == 0 else "Bob"
+    return {"id": f"c{n}", "first_name": first, "last_name": f"Tester{n}", "email": None, "company": None}
+
+
+def _index(count: int) -> SearchIndex:
+    index = SearchIndex()
+    for n in range(count):
+        index.add(_contact(n))
+    return index
+
+
+def _interleave(term: str):
+    """Consume search(term) while re-indexing contact c0 until the index compacts."""
+    index = _index(400)
+    hits = index.search(term)
+    seen = [next(hits) for _ in range(10)]
+    for _ in range(1001):  # dead docs outnumber live ones: compaction renumbers every doc
+        index.add(_contact(0))
+    assert index.dead == 0  # it compacted
+    return index, seen + list(hits)
+
+
+def test_typeahead_survives_compaction():
+    _, hits = _interleave("an")
+    assert sorted(hits) == sorted(f"c{n}" for n in range(0, 400, 2))
+
+
+def test_substring_search_survives_compaction():
+    index, hits = _interleave("ann")
+    assert sorted(hits) == sorted(f"c{n}" for n in range(0, 400, 2))
+    assert sorted(index.search("ann")) == sorted(hits)  # and the new numbering is right too
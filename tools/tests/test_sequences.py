@@ -0,0 +1,14 @@
+"""list_sequences reads the columns migration 008 defines."""
+
+import asyncio
+import json
+
+from quotahit_fakedb import BENCH_USER, TRIGGERS
+
+
+def test_list_sequences_reports_trigger(connect, server):
+    connect()
+    out = json.loads(asyncio.run(server.list_sequences(BENCH_USER)))
+
+    assert out["count"] == 8
+    assert all(s["trigger"] in TRIGGERS for s in out["sequences"])
@@ -0,0 +1,181 @@
+"""SingleFlight: coalescing, error propagation, cancellation, and the dashboard tools."""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from quotahit_fakedb import BENCH_USER
+from quotahit_singleflight import SingleFlight
+
+
+class Loader:
+    """Counts calls; each call waits for `release` (if set), then returns a fresh
+    object or raises `error`."""
+
+    def __init__(self, error: Exception | None = None):
+        self.calls = 0
+        self.error = error
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        else:
+            await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return {"call": self.calls}
+
+
+def test_concurrent_calls_share_one_load():
+    flights, load = SingleFlight(), Loader()
+
+    async def run():
+        return await asyncio.gather(*(flights.run(("get_pipeline", "u"), load) for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert load.calls == 1
+    assert all(r is results[0] for r in results)  # the leader's exact object
+    stats = flights.stats()
+    assert stats["leaders"] == 1 and stats["coalesced"] == 9 and stats["in_flight"] == 0
+    assert stats["by_tool"] == {"get_pipeline": {"leaders": 1, "coalesced": 9}}
+
+
+def test_distinct_keys_and_later_calls_load_again():
+    flights, load = SingleFlight(), Loader()
+
+    async def run():
+        await asyncio.gather(flights.run(("t", "u", 1), load), flights.run(("t", "u", 2), load))
+        await flights.run(("t", "u", 1), load)  # nothing is kept once a flight lands
+
+    asyncio.run(run())
+    assert load.calls == 3
+
+
+def test_errors_reach_every_follower_and_are_not_kept():
+    flights, load = SingleFlight(), Loader(ValueError("boom"))
+
+    async def run():
+        return await asyncio.gather(*(flights.run(("t",), load) for _ in range(5)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+
+    assert load.calls == 1
+    assert all(isinstance(e, ValueError) and str(e) == "boom" for e in errors)
+    assert flights.stats()["errors"] == 1
+
+    load.error = None
+    assert asyncio.run(flights.run(("t",), load)) == {"call": 2}
+
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    flights, load = SingleFlight(), Loader()
+
+    async def run():
+        load.release = asyncio.Event()
+        leader = asyncio.create_task(flights.run(("t",), load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run(("t",), load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        load.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == {"call": 2}  # the follower led a new flight
+    stats = flights.stats()
+    assert stats["abandoned"] == 1 and stats["leaders"] == 2 and stats["in_flight"] == 0
+
+
+def test_cancelled_follower_leaves_the_flight_running():
+    flights, load = SingleFlight(), Loader()
+
+    async def run():
+        load.release = asyncio.Event()
+        leader = asyncio.create_task(flights.run(("t",), load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run(("t",), load))
+        await asyncio.sleep(0)
+        follower.cancel()
+        await asyncio.sleep(0)
+        load.release.set()
+        return await leader, follower.cancelled()
+
+    assert asyncio.run(run()) == ({"call": 1}, True)
+
+
+def test_followers_on_other_threads_get_the_result():
+    flights, load = SingleFlight(), Loader()
+    started, results = threading.Event(), []
+
+    async def lead():
+        load.release = asyncio.Event()
+        task = asyncio.create_task(flights.run(("t",), load))
+        await asyncio.sleep(0)
+        started.set()
+        while flights.stats()["coalesced"] < 3:
+            await asyncio.sleep(0.001)
+        load.release.set()
+        return await task
+
+    def follow():
+        started.wait()
+        results.append(asyncio.run(flights.run(("t",), load)))
+
+    threads = [threading.Thread(target=follow) for _ in range(3)]
+    for t in threads:
+        t.start()
+    value = asyncio.run(lead())
+    for t in threads:
+        t.join(5)
+
+    assert load.calls == 1 and results == [value] * 3
+
+
+def test_concurrent_dashboard_reads_scan_once(connect, server):
+    db = connect()
+    db.rtt_ms = 1  # every query yields, so the reads overlap
+
+    async def pipelines():
+        return await asyncio.gather(*(server.get_pipeline(BENCH_USER, mode="scan") for _ in range(5)))
+
+    trips = db.round_trips
+    replies = asyncio.run(pipelines())
+    one_scan = db.round_trips - trips
+
+    assert len(set(replies)) == 1
+    assert server._flights.stats()["coalesced"] == 4
+
+    server._cache.invalidate(BENCH_USER, server.DASHBOARD_TOOLS)
+    trips = db.round_trips
+    asyncio.run(server.get_pipeline(BENCH_USER, mode="scan"))
+    assert db.round_trips - trips == one_scan  # the five concurrent reads cost one scan
+
+
+def test_read_after_write_does_not_join_an_older_flight(connect, server, book):
+    db = connect()
+    db.rtt_ms = 5  # a scan takes four round-trips, the write two
+    contact = next(c for c in book["contacts"] if c["user_id"] == BENCH_USER and c["deal_stage"] != "won")
+
+    async def read_write_read():
+        before = asyncio.create_task(server.get_pipeline(BENCH_USER, mode="scan"))
+        await asyncio.sleep(0.002)  # the first read is in flight
+        await server.update_deal_stage(contact["id"], BENCH_USER, "won")
+        assert not before.done()  # so the second read could have joined it
+        after = await server.get_pipeline(BENCH_USER, mode="scan")
+        await before
+        await server._activity_log.flush()
+        return json.loads(after)
+
+    after = asyncio.run(read_write_read())
+
+    assert server._flights.stats()["coalesced"] == 0
+    server._cache.invalidate(BENCH_USER, server.DASHBOARD_TOOLS)
+    fresh = json.loads(asyncio.run(server.get_pipeline(BENCH_USER, mode="scan")))
+    assert after["by_stage"] == fresh["by_stage"]  # the write is in the second read
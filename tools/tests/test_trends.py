@@ -0,0 +1,76 @@
+"""get_trends: push-down vs streaming parity past the row cap, and incremental refresh."""
+
+import asyncio
+import json
+from datetime import date
+
+from quotahit_fakedb import BENCH_USER, rpc_trend_rollup
+from quotahit_trends import day_start
+
+SINCE = date(2025, 1, 1).isoformat()  # the synthetic book's first day
+
+
+def _trends(server, granularity: str = "day", since: str = SINCE) -> dict:
+    return json.loads(asyncio.run(server.get_trends(BENCH_USER, granularity, since)))
+
+
+def _without_rollup(payload: dict) -> dict:
+    return {k: v for k, v in payload.items() if k != "rollup"}
+
+
+def test_pushdown_pages_past_row_cap(connect, server, monkeypatch):
+    fake = connect(max_rows=0)
+    groups = rpc_trend_rollup(fake, BENCH_USER, day_start(date.fromisoformat(SINCE)))
+    assert len(groups) > 1000  # more rows than one capped response holds
+
+    uncapped = _trends(server)
+    assert uncapped["rollup"]["mode"] == "pushdown"
+
+    for max_rows in (1000, 250):  # QUOTAHIT_MAX_ROWS matches the server's db-max-rows
+        monkeypatch.setattr(server, "MAX_ROWS", max_rows)
+        server._trends.drop(BENCH_USER)
+        connect(max_rows=max_rows)
+        assert _without_rollup(_trends(server)) == _without_rollup(uncapped)
+
+
+def test_pushdown_matches_scan(connect, server):
+    for granularity in ("day", "week"):
+        server._trends.drop(BENCH_USER)
+        server._trend_pushdown_available = True  # the scan run below switches it off
+        connect()
+        pushdown = _trends(server, granularity)
+        server._trends.drop(BENCH_USER)
+        connect(rpc=False)
+        scan = _trends(server, granularity)
+
+        assert pushdown["rollup"]["mode"] == "pushdown"
+        assert scan["rollup"]["mode"] == "scan"
+        assert _without_rollup(pushdown) == _without_rollup(scan)
+
+
+def test_totals_match_source_rows(connect, server, book):
+    connect()
+    totals = _trends(server, "week")["totals"]
+
+    contacts = [c for c in book["contacts"] if c["user_id"] == BENCH_USER]
+    won = [
+        a for a in book["activities"]
+        if a["user_id"] == BENCH_USER and a["activity_type"] == "stage_changed" and a["details"]["to"] == "won"
+    ]
+    assert totals["new_contacts"] == len(contacts)
+    assert totals["won_deals"] == len(won)
+    assert totals["won_value"] == round(sum(a["details"]["deal_value"] for a in won), 2)
+
+
+def test_refresh_scans_only_open_days(connect, server):
+    connect()
+    first = _trends(server)
+    frozen = first["rollup"]["frozen_before"]
+    assert first["rollup"]["ranges_scanned"] == [[SINCE, None]]
+
+    asyncio.run(server.create_contact("Trend", BENCH_USER, sync=True))
+    again = _trends(server)
+
+    assert again["rollup"]["ranges_scanned"] == [[frozen, None]]
+    assert again["totals"]["new_contacts"] == first["totals"]["new_contacts"] + 1
+    assert again["periods"][-1]["new_contacts"] == 1